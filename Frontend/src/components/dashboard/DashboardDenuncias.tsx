@@ -279,10 +279,33 @@ export default function DashboardDenuncias() {
     useEffect(() => {
         console.log("Ejecutando useEffect para fetchData")
         fetchData()
-        const interval = setInterval(fetchReportesAtencion, 30000)
-        return () => clearInterval(interval)
+        // Los reportes nuevos y cambios de estado llegan por Server-Sent Events;
+        // "resync" indica que hubo cambios que no llegaron por el stream
+        const source = new EventSource(`${axiosInstance.defaults.baseURL}reportes-atencion/stream/`)
+        source.addEventListener("reporte", (event) => {
+            const reporte: ReporteAtencion = JSON.parse((event as MessageEvent).data)
+            setReportesAtencion((reportes) =>
+                reportes.some((r) => r.id === reporte.id)
+                    ? reportes.map((r) => (r.id === reporte.id ? reporte : r))
+                    : [reporte, ...reportes]
+            )
+        })
+        source.addEventListener("reporte_eliminado", (event) => {
+            const { id } = JSON.parse((event as MessageEvent).data)
+            setReportesAtencion((reportes) => reportes.filter((r) => r.id !== id))
+        })
+        source.addEventListener("reportes_estado", (event) => {
+            const { ids, estado } = JSON.parse((event as MessageEvent).data)
+            setReportesAtencion((reportes) => reportes.map((r) => (ids.includes(r.id) ? { ...r, estado } : r)))
+        })
+        source.addEventListener("resync", fetchReportesAtencion)
+        return () => source.close()
     }, [fetchData])
 
+    useEffect(() => {
+        setAlertasNoLeidas(reportesAtencion.filter((r) => r.estado === "nuevo").length)
+    }, [reportesAtencion])
+
     useEffect(() => {
         if (selectedDenuncia) {
             setEstadoLocal(selectedDenuncia.estado)
@@ -10,9 +10,12 @@ import Slider from "react-slick"
 import "slick-carousel/slick/slick-theme.css"
 import "slick-carousel/slick/slick.css"
 import axiosInstance from "../../../services/axiosInstance"
-import type { ReceptionQR, TotemQR } from "../../../types/types"
+import type { ImageUpload, ReceptionQR, TotemQR } from "../../../types/types"
 import "./InfoPunto.css"
 
+// Ancho con que se muestra la galería dentro del panel; el navegador elige la variante según esto
+const GALLERY_SIZES = "(max-width: 600px) 100vw, 450px"
+
 // Define LazyLoadTypes explicitly to avoid type mismatch
 type LazyLoadTypes = "ondemand" | "progressive" | "anticipated"
 
@@ -35,6 +38,8 @@ const InfoPunto: React.FC<InfoPuntoProps> = ({ open, punto, role, onClose, onSav
   const [errors, setErrors] = useState<{ name?: string }>({})
   const [isDeleting, setIsDeleting] = useState(false)
   const [images, setImages] = useState<string[]>([])
+  // Variantes redimensionadas de cada imagen, por URL original
+  const [imageVariants, setImageVariants] = useState<Record<string, ImageUpload>>({})
   const [newImagePreviews, setNewImagePreviews] = useState<string[]>([])
   const [openImageModal, setOpenImageModal] = useState(false)
   const [selectedImage, setSelectedImage] = useState<string | null>(null)
@@ -75,24 +80,40 @@ const InfoPunto: React.FC<InfoPuntoProps> = ({ open, punto, role, onClose, onSav
     return { opening: null, closing: null }
   }
 
-  const checkImageUrl = (url: string) => {
-    return new Promise((resolve) => {
-      const img = new Image()
-      img.onload = () => {
-        if (img.width > 0 && img.height > 0) {
-          resolve(true)
-        } else {
-          console.warn(`Imagen con dimensiones inválidas: ${url}`)
-          resolve(false)
-        }
-      }
-      img.onerror = () => {
-        console.warn(`Error al cargar la imagen: ${url}`)
-        resolve(false)
-      }
-      img.crossOrigin = "anonymous"
-      img.src = url
-    })
+  const renderGalleryImage = (url: string, alt: string) => {
+    const upload = imageVariants[url]
+    const full = upload?.variants.full || upload?.variants.medium || upload?.variants.thumb
+    const openImage = () => {
+      setSelectedImage(full?.webp || url)
+      setOpenImageModal(true)
+    }
+    // Dimensiones conocidas de antemano y placeholder desenfocado mientras llega la imagen
+    const loadingProps = {
+      width: upload?.width ?? undefined,
+      height: upload?.height ?? undefined,
+      style: upload?.placeholder
+        ? { backgroundImage: `url(${upload.placeholder})`, backgroundSize: "cover", height: "auto" }
+        : undefined,
+    }
+    if (!upload?.srcset.webp) {
+      return <img src={url || "/placeholder.svg"} alt={alt} className="carousel-image" onClick={openImage} {...loadingProps} />
+    }
+    return (
+      <picture>
+        <source type="image/webp" srcSet={upload.srcset.webp} sizes={GALLERY_SIZES} />
+        <img
+          src={(upload.variants.medium || upload.variants.thumb)?.jpeg}
+          srcSet={upload.srcset.jpeg}
+          sizes={GALLERY_SIZES}
+          alt={alt}
+          className="carousel-image"
+          loading="lazy"
+          decoding="async"
+          onClick={openImage}
+          {...loadingProps}
+        />
+      </picture>
+    )
   }
 
   useEffect(() => {
@@ -162,20 +183,14 @@ const InfoPunto: React.FC<InfoPuntoProps> = ({ open, punto, role, onClose, onSav
 
       const response = await axiosInstance.get("images/", config)
 
-      const fetchedImages = response.data.map((img: any) => img.image)
+      const fetchedImages: ImageUpload[] = response.data
+      setImageVariants(Object.fromEntries(fetchedImages.map((img) => [img.image, img])))
 
-      const validImages = []
-      for (const imgUrl of fetchedImages) {
-        const isValid = await checkImageUrl(imgUrl)
-        if (isValid) {
-          validImages.push(imgUrl)
-        } else {
-          console.warn(`Imagen no válida o no accesible: ${imgUrl}`)
-        }
+      // El servidor ya verificó cada archivo al subirlo: no hace falta cargarlas para comprobarlas
+      for (const img of fetchedImages.filter((img) => !img.available)) {
+        console.warn(`Imagen no válida o no accesible: ${img.image}`)
       }
-
-      setImages(validImages)
-      console.log("Imágenes cargadas y verificadas:", validImages)
+      setImages(fetchedImages.filter((img) => img.available).map((img) => img.image))
     } catch (error) {
       console.error("Error fetching images:", error)
     }
@@ -386,15 +401,7 @@ const InfoPunto: React.FC<InfoPuntoProps> = ({ open, punto, role, onClose, onSav
                             {images.map((url, index) => (
                               <div key={url || `image-${index}`} className="carousel-image-container">
                                 <div className="carousel-image-wrapper">
-                                  <img
-                                    src={url || "/placeholder.svg"}
-                                    alt={`Imagen existente ${index + 1}`}
-                                    className="carousel-image"
-                                    onClick={() => {
-                                      setSelectedImage(url)
-                                      setOpenImageModal(true)
-                                    }}
-                                  />
+                                  {renderGalleryImage(url, `Imagen existente ${index + 1}`)}
                                 </div>
                               </div>
                             ))}
@@ -558,15 +565,7 @@ const InfoPunto: React.FC<InfoPuntoProps> = ({ open, punto, role, onClose, onSav
                             {images.map((url, index) => (
                               <div key={url || `image-${index}`} className="carousel-image-container">
                                 <div className="carousel-image-wrapper">
-                                  <img
-                                    src={url || "/placeholder.svg"}
-                                    alt={`Imagen ${index + 1}`}
-                                    className="carousel-image"
-                                    onClick={() => {
-                                      setSelectedImage(url)
-                                      setOpenImageModal(true)
-                                    }}
-                                  />
+                                  {renderGalleryImage(url, `Imagen ${index + 1}`)}
                                 </div>
                               </div>
                             ))}
@@ -1,5 +1,5 @@
 import axios, { AxiosInstance } from 'axios';
-import { Path, ReceptionQR, TotemQR } from '../types/types';
+import { ImageUpload, Path, ReceptionQR, TotemQR } from '../types/types';
 import axiosInstance from './axiosInstance';
 
 // Create a custom Axios instance
@@ -191,7 +191,7 @@ export const fetchImages = async (
   const response = await api.get('images/', {
     params: { point_id: pointId, point_type: pointType, campus },
   });
-  return response.data.map((img: any) => img.image);
+  return response.data.filter((img: ImageUpload) => img.available).map((img: ImageUpload) => img.image);
 };
 
 export const generateQrCode = async (
@@ -203,18 +203,67 @@ export const generateQrCode = async (
   return response.data;
 };
 
+// Fotos sobre este tamaño se suben por partes y pueden reanudarse si la conexión se corta
+const RESUMABLE_UPLOAD_THRESHOLD = 4 * 1024 * 1024;
+const UPLOAD_CHUNK_RETRIES = 3;
+
+const uploadResumable = async (file: File, pointId: number, pointType: string, campus: string): Promise<string> => {
+  const { data: session } = await axiosInstance.post('image-upload/sessions/', {
+    point_id: pointId,
+    point_type: pointType,
+    campus,
+    filename: file.name,
+    size: file.size,
+  });
+  const url = `image-upload/sessions/${session.id}/`;
+  let offset: number = session.offset;
+  let retries = 0;
+  while (true) {
+    try {
+      const response = await axiosInstance.put(url, file.slice(offset, offset + session.chunk_size), {
+        headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': offset.toString() },
+      });
+      // 201 al completar; 200 si el último PUT se repitió y la imagen ya existía
+      if (response.data.image) {
+        return response.data.image;
+      }
+      offset = response.data.offset;
+      retries = 0;
+    } catch (error: any) {
+      if (error.response?.status === 409) {
+        offset = error.response.data.offset;
+      } else if (!error.response && retries < UPLOAD_CHUNK_RETRIES) {
+        // Sin respuesta (red caída): se consulta hasta dónde llegó y se sigue desde ahí
+        retries += 1;
+        offset = (await axiosInstance.get(url)).data.offset;
+      } else {
+        throw error;
+      }
+    }
+  }
+};
+
 export const uploadImages = async (files: File[], pointId: number, pointType: string, campus: string): Promise<string[]> => {
   const newImageUrls: string[] = [];
-  for (const file of files) {
+  const smallFiles = files.filter((file) => file.size <= RESUMABLE_UPLOAD_THRESHOLD);
+  if (smallFiles.length > 0) {
     const formData = new FormData();
-    formData.append('file', file);
+    smallFiles.forEach((file) => formData.append('files', file));
     formData.append('point_id', pointId.toString());
     formData.append('point_type', pointType);
     formData.append('campus', campus);
-    const response = await axiosInstance.post('image-upload/', formData, {
+    const response = await axiosInstance.post('image-upload/batch/', formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
+      // 400 con archivos rechazados: se informan y se siguen usando los que sí se subieron
+      validateStatus: (status) => status === 201 || status === 400,
     });
-    newImageUrls.push(response.data.image);
+    if (response.data.rejected?.length) {
+      console.warn('Imágenes rechazadas:', response.data.rejected);
+    }
+    newImageUrls.push(...(response.data.uploaded || []).map((img: { image: string }) => img.image));
+  }
+  for (const file of files.filter((file) => file.size > RESUMABLE_UPLOAD_THRESHOLD)) {
+    newImageUrls.push(await uploadResumable(file, pointId, pointType, campus));
   }
   return newImageUrls;
 };
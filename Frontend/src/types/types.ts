@@ -34,4 +34,27 @@ export interface Path {
   name: string;
   points: { latitude: number; longitude: number }[];
   campus: string;
-}
\ No newline at end of file
+}
+export interface ImageVariant {
+  width: number;
+  height: number;
+  webp: string;
+  jpeg: string;
+}
+
+export interface ImageUpload {
+  id: number;
+  point_id: number;
+  point_type: "totem" | "reception";
+  campus: string;
+  image: string;
+  uploaded_at: string;
+  variants: Partial<Record<"thumb" | "medium" | "full", ImageVariant>>; // Vacío si no se generaron
+  srcset: { webp?: string; jpeg?: string };
+  available: boolean; // El servidor pudo leer el archivo como imagen, o aún no la procesa
+  width: number | null;
+  height: number | null;
+  size: number | null;
+  sha256: string;
+  placeholder: string; // data URI de baja resolución para mostrar mientras carga
+}
@@ -117,4 +117,34 @@ SIMPLE_JWT = {
 JIRA_API_URL = config('JIRA_API_URL')
 JIRA_EMAIL = config('JIRA_EMAIL')
 JIRA_API_TOKEN = config('JIRA_API_TOKEN')
-JIRA_PROJECT_KEY = config('JIRA_PROJECT_KEY')
\ No newline at end of file
+JIRA_PROJECT_KEY = config('JIRA_PROJECT_KEY')
+# Cliente HTTP compartido hacia Jira: timeouts (s), conexiones keep-alive y circuit breaker
+JIRA_CONNECT_TIMEOUT = config('JIRA_CONNECT_TIMEOUT', default=3.05, cast=float)
+JIRA_READ_TIMEOUT = config('JIRA_READ_TIMEOUT', default=10, cast=float)
+JIRA_POOL_SIZE = config('JIRA_POOL_SIZE', default=4, cast=int)
+JIRA_BREAKER_THRESHOLD = config('JIRA_BREAKER_THRESHOLD', default=5, cast=int)
+JIRA_BREAKER_RESET = config('JIRA_BREAKER_RESET', default=60, cast=float)
+
+# Días que se guardan las eliminaciones para la sincronización ?since= (prune_tombstones)
+TOMBSTONE_RETENTION_DAYS = config('TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+# Procesos para dibujar QRs en los lotes por campus (tasks/qr_batch.py) y segundos
+# sin latido tras los que un lote 'running' se marca como fallido
+QR_BATCH_WORKERS = config('QR_BATCH_WORKERS', default=2, cast=int)
+QR_BATCH_HEARTBEAT_TIMEOUT = config('QR_BATCH_HEARTBEAT_TIMEOUT', default=600, cast=int)
+
+# Subida de imágenes de puntos (tasks/uploads.py)
+IMAGE_UPLOAD_MAX_BYTES = config('IMAGE_UPLOAD_MAX_BYTES', default=15 * 1024 * 1024, cast=int)
+IMAGE_UPLOAD_MAX_FILES = config('IMAGE_UPLOAD_MAX_FILES', default=10, cast=int)
+IMAGE_UPLOAD_MAX_PIXELS = config('IMAGE_UPLOAD_MAX_PIXELS', default=40_000_000, cast=int)
+# Tamaño máximo de cada parte en las subidas reanudables y carpeta de los archivos parciales
+IMAGE_UPLOAD_CHUNK_SIZE = config('IMAGE_UPLOAD_CHUNK_SIZE', default=2 * 1024 * 1024, cast=int)
+IMAGE_UPLOAD_TEMP_DIR = config('IMAGE_UPLOAD_TEMP_DIR', default=os.path.join(BASE_DIR, 'tmp', 'uploads'))
+# Archivos sobre este tamaño se reciben en un temporal en disco en vez de memoria
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+
+# Envío de MEDIA por el servidor web: '' (lo envía Django), 'x-sendfile' (Apache,
+# lighttpd) o 'x-accel-redirect' (nginx, con una location internal en MEDIA_ACCEL_PREFIX
+# que apunte a MEDIA_ROOT)
+MEDIA_SENDFILE = config('MEDIA_SENDFILE', default='')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
\ No newline at end of file
@@ -2,23 +2,24 @@ from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
 from rest_framework.routers import DefaultRouter
-from tasks.views import TotemQRViewSet, ReceptionQRViewSet, PathViewSet, PerfilUsuarioViewSet, ImageUploadView, ImageListView, home, DenunciaViewSet, UserProfileViewSet, ReporteAtencionViewSet
+from tasks.views import TotemQRViewSet, ReceptionQRViewSet, PathViewSet, PerfilUsuarioViewSet, ImageUploadView, ImageListView, home, DenunciaViewSet, UserProfileViewSet, ReporteAtencionViewSet, CampusViewSet, QRBatchJobViewSet, serve_media
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from django.conf.urls.static import static
 
 router = DefaultRouter()
 router.register(r'totems', TotemQRViewSet, basename='totemqr')
 router.register(r'recepciones', ReceptionQRViewSet, basename='receptionqr')
 router.register(r'caminos', PathViewSet, basename='path')
+router.register(r'campus', CampusViewSet, basename='campus')
 router.register(r'usuario', PerfilUsuarioViewSet, basename='ususario')
 router.register(r'denuncias', DenunciaViewSet, basename='denuncias')
 router.register(r'image-upload', ImageUploadView, basename='image-upload')
 router.register(r'images', ImageListView, basename='image-list')
 router.register(r'user', UserProfileViewSet, basename='user')
 router.register(r'reportes-atencion', ReporteAtencionViewSet, basename='reporteatencion')
+router.register(r'qr-batches', QRBatchJobViewSet, basename='qr-batch')
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -39,4 +40,5 @@ urlpatterns = [
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.+)$", serve_media, name='media'),
+]
\ No newline at end of file
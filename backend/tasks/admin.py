@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import TotemQR, ReceptionQR, Path, PathPoint, UserProfile, Denuncia
+from django.db.models import Count
+from django.utils import timezone
+from .models import TotemQR, ReceptionQR, Path, PathPoint, UserProfile, Denuncia, JiraOutbox
 
 # Inline para PathPoint dentro de Path
 class PathPointInline(admin.TabularInline):
@@ -12,8 +14,11 @@ class PathAdmin(admin.ModelAdmin):
     inlines = [PathPointInline]
     list_display = ('name', 'point_count')  # Mostrar nombre y cantidad de puntos
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_points=Count('points'))
+
     def point_count(self, obj):
-        return obj.points.count()
+        return obj.num_points
     point_count.short_description = 'Cantidad de puntos'
 
 @admin.register(Denuncia)
@@ -22,6 +27,16 @@ class DenunciaAdmin(admin.ModelAdmin):
     list_filter = ('tipo_incidente', 'campus')
     search_fields = ('descripcion', 'lugar_incidente')
 
+@admin.register(JiraOutbox)
+class JiraOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'denuncia', 'status', 'attempts', 'next_attempt_at', 'updated_at')
+    list_filter = ('status',)
+    actions = ['retry']
+
+    @admin.action(description='Reintentar envío a Jira')
+    def retry(self, request, queryset):
+        queryset.update(status='pending', next_attempt_at=timezone.now())
+
 
 # Registro simple para los otros modelos
 admin.site.register(TotemQR)
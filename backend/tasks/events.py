@@ -0,0 +1,158 @@
+import asyncio
+import json
+import threading
+from asgiref.sync import sync_to_async
+from .models import DataVersion
+
+# Versión global de los reportes de atención; la comparten todos los procesos
+REPORTES_KEY = 'reportes-atencion'
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 100
+RETRY_MS = 5000
+
+
+def reportes_campus_key(campus):
+    return f"{REPORTES_KEY}:{campus or ''}"
+
+
+class EventBroker:
+    """Reparte eventos entre los streams SSE abiertos en este proceso.
+
+    Los publicadores corren en hilos síncronos (señales, vistas WSGI) y los
+    suscriptores en el event loop de ASGI, por eso la entrega usa
+    call_soon_threadsafe sobre el loop de cada suscriptor.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        # Sondeo de la versión global, uno por proceso (ver watch)
+        self.poller = None
+        self.version = None
+        self.published = 0
+
+    def subscribe(self, loop=None):
+        loop = loop or asyncio.get_running_loop()
+        subscription = (loop, asyncio.Queue(maxsize=QUEUE_SIZE))
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+            if event['event'] != 'resync':
+                self.published += 1
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_deliver, queue, event)
+            except RuntimeError:
+                # El loop ya se cerró; el stream se limpia en su finally
+                pass
+
+    def watch(self, version):
+        """Arranca, si no corre ya, el sondeo de la versión global en el loop actual.
+
+        El broker solo ve los cambios hechos en este proceso. Cada HEARTBEAT_SECONDS
+        una única consulta compara la versión global con los eventos publicados aquí;
+        si otro proceso hizo cambios, se reparte `resync` a todos los streams.
+        """
+        with self.lock:
+            if self.version is None:
+                self.version = version
+            if self.poller is not None and not self.poller.done() and not self.poller.get_loop().is_closed():
+                return
+            self.poller = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            with self.lock:
+                if not self.subscribers:
+                    # Sin streams abiertos no se consulta; el próximo vuelve a arrancarlo
+                    self.poller = self.version = None
+                    return
+            await self.poll()
+
+    async def poll(self):
+        current = await sync_to_async(DataVersion.get)(REPORTES_KEY)
+        with self.lock:
+            previous, published = self.version, self.published
+            self.version, self.published = current, 0
+        if previous is not None and current - previous > published:
+            self.publish({'event': 'resync', 'campus': None, 'version': current, 'data': {}})
+
+
+def _deliver(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # Cliente demasiado lento: se descarta lo pendiente y se le pide resincronizar
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({'event': 'resync', 'campus': None, 'data': {}})
+
+
+broker = EventBroker()
+
+
+def publish_reporte(pk, campus, reporte=None):
+    # Se llama tras el commit; reporte=None indica que se eliminó. La versión
+    # sirve de id del evento para reanudar con Last-Event-ID
+    from .serializers import ReporteAtencionSerializer
+    event = {'campus': campus, 'version': DataVersion.get(REPORTES_KEY)}
+    if reporte is None:
+        event.update(event='reporte_eliminado', data={'id': pk})
+    else:
+        event.update(event='reporte', data=ReporteAtencionSerializer(reporte).data)
+    broker.publish(event)
+
+
+def publish_reportes_estado(ids, estado):
+    # Cambio masivo de estado: un solo evento con los ids en lugar de uno por reporte
+    broker.publish({
+        'event': 'reportes_estado',
+        'campus': None,
+        'version': DataVersion.get(REPORTES_KEY),
+        'data': {'ids': ids, 'estado': estado},
+    })
+
+
+def format_event(event, event_id=None):
+    lines = []
+    event_id = event.get('version', event_id)
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'], default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+async def reporte_stream(campus=None, version=0, resync=False):
+    """Stream SSE de cambios en reportes de atención, opcionalmente de un campus.
+
+    Los cambios de otros procesos llegan como `resync` desde el sondeo del broker
+    (EventBroker.watch); el stream en sí no consulta la base.
+    """
+    subscription = broker.subscribe()
+    broker.watch(version)
+    queue = subscription[1]
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        if resync:
+            yield format_event({'event': 'resync', 'data': {}}, version)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+                continue
+            if campus and event['campus'] not in (None, campus):
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
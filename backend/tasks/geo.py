@@ -0,0 +1,262 @@
+import math
+from collections import defaultdict
+from .models import DataVersion, ReceptionQR
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+# ~110 m de lado: una recepción suele quedar en la celda del totem o en sus vecinas
+DEFAULT_CELL_SIZE = 0.001
+MIN_CELL_SIZE = 0.0001
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    # Distancia en metros sobre la esfera
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def encode_polyline(coordinates, precision=5):
+    # Algoritmo de "Encoded Polyline" de Google: deltas enteros en base64 de 5 bits
+    factor = 10 ** precision
+    output = []
+    previous_lat = previous_lon = 0
+    for lat, lon in coordinates:
+        lat, lon = round(lat * factor), round(lon * factor)
+        for delta in (lat - previous_lat, lon - previous_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                output.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            output.append(chr(value + 63))
+        previous_lat, previous_lon = lat, lon
+    return ''.join(output)
+
+
+def decode_polyline(encoded, precision=5):
+    factor = 10 ** precision
+    coordinates = []
+    index = lat = lon = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coordinates.append((lat / factor, lon / factor))
+    return coordinates
+
+
+def simplify(coordinates, tolerance):
+    """Douglas-Peucker con tolerancia en metros; conserva siempre los extremos."""
+    if tolerance <= 0 or len(coordinates) < 3:
+        return list(coordinates)
+    # Proyección equirectangular local, suficiente a la escala de un campus
+    cos_lat = math.cos(math.radians(coordinates[0][0]))
+    points = [(lon * cos_lat * METERS_PER_DEGREE, lat * METERS_PER_DEGREE) for lat, lon in coordinates]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        (x1, y1), (x2, y2) = points[start], points[end]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        farthest, max_distance = None, tolerance
+        for i in range(start + 1, end):
+            px, py = points[i]
+            if length_sq == 0:
+                distance = math.hypot(px - x1, py - y1)
+            else:
+                t = max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+                distance = math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+            if distance > max_distance:
+                farthest, max_distance = i, distance
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((start, farthest))
+            stack.append((farthest, end))
+    return [coordinate for coordinate, kept in zip(coordinates, keep) if kept]
+
+
+class GridIndex:
+    """Índice espacial de grilla regular para búsquedas de vecinos más cercanos."""
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = defaultdict(dict)
+        self.items = {}
+        # Extensión de la grilla ocupada (no se reduce al eliminar, solo acota la búsqueda)
+        self.bounds = None
+
+    @classmethod
+    def build(cls, items):
+        # Tamaño de celda según la densidad: en promedio un punto por celda
+        items = list(items)
+        if len(items) > 1:
+            lats = [lat for _, lat, _, _ in items]
+            lons = [lon for _, _, lon, _ in items]
+            lat_span, lon_span = max(lats) - min(lats), max(lons) - min(lons)
+            # El segundo término cubre puntos alineados, donde el área es casi nula
+            cell_size = max(math.sqrt(lat_span * lon_span / len(items)), max(lat_span, lon_span) / len(items), MIN_CELL_SIZE)
+            index = cls(cell_size=cell_size)
+        else:
+            index = cls()
+        for key, lat, lon, data in items:
+            index.insert(key, lat, lon, data)
+        return index
+
+    def __len__(self):
+        return len(self.items)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def insert(self, key, lat, lon, data=None):
+        if key in self.items:
+            self.remove(key)
+        cell = self._cell(lat, lon)
+        self.items[key] = (lat, lon, cell, data)
+        self.cells[cell][key] = (lat, lon, data)
+        if self.bounds is None:
+            self.bounds = (cell[0], cell[0], cell[1], cell[1])
+        else:
+            min_row, max_row, min_col, max_col = self.bounds
+            self.bounds = (min(min_row, cell[0]), max(max_row, cell[0]), min(min_col, cell[1]), max(max_col, cell[1]))
+
+    def remove(self, key):
+        lat, lon, cell, data = self.items.pop(key)
+        del self.cells[cell][key]
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def nearest(self, lat, lon, k=1, predicate=None):
+        """Devuelve hasta k tuplas (distancia_m, key, data) ordenadas por distancia.
+
+        Recorre anillos de celdas alrededor de la celda de consulta y se detiene
+        cuando ninguna celda no visitada puede contener un punto más cercano que
+        el k-ésimo encontrado.
+        """
+        if not self.cells or k <= 0:
+            return []
+        row, col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self.bounds
+        max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        # Lado mínimo de una celda en metros; se toma el coseno un grado más cerca del
+        # polo para que la cota siga siendo válida en todo el entorno del campus
+        cell_m = self.cell_size * METERS_PER_DEGREE * math.cos(math.radians(min(abs(lat) + 1, 89)))
+
+        found = []
+        visited = 0
+        for ring in range(max_ring + 1):
+            if len(found) >= k and found[k - 1][0] <= (ring - 1) * cell_m:
+                break
+            if visited == len(self.items):
+                break
+            # Grilla dispersa: es más barato revisar de una vez las celdas ocupadas restantes
+            sparse = 8 * ring > len(self.cells)
+            if sparse:
+                cells = [cell for cell in self.cells if max(abs(cell[0] - row), abs(cell[1] - col)) >= ring]
+            else:
+                cells = self._ring(row, col, ring)
+            for cell in cells:
+                bucket = self.cells.get(cell)
+                if not bucket:
+                    continue
+                visited += len(bucket)
+                for key, (plat, plon, data) in bucket.items():
+                    if predicate is not None and not predicate(data):
+                        continue
+                    found.append((haversine(lat, lon, plat, plon), key, data))
+            found.sort(key=lambda item: item[0])
+            del found[k:]
+            if sparse:
+                break
+        return found
+
+    def _ring(self, row, col, ring):
+        if ring == 0:
+            yield (row, col)
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield (row - ring, c)
+            yield (row + ring, c)
+        for r in range(row - ring + 1, row + ring):
+            yield (r, col - ring)
+            yield (r, col + ring)
+
+
+def linear_nearest(points, lat, lon, k=1, predicate=None):
+    # Recorrido completo, usado como referencia en el benchmark
+    found = [
+        (haversine(lat, lon, plat, plon), key, data)
+        for key, plat, plon, data in points
+        if predicate is None or predicate(data)
+    ]
+    found.sort(key=lambda item: item[0])
+    return found[:k]
+
+
+_reception_indexes = {}
+
+
+def reception_data(reception):
+    return {
+        'id': reception.id,
+        'name': reception.name,
+        'latitude': reception.latitude,
+        'longitude': reception.longitude,
+        'status': reception.status,
+    }
+
+
+def reception_index(campus, operative_only=True, version=None):
+    # Índice de recepciones por campus, con su propia versión de datos: los cambios
+    # de totems o caminos no lo afectan y los de recepciones hechos en este proceso
+    # se aplican en el lugar (apply_reception_change). Solo se reconstruye si la
+    # versión no coincide, p. ej. tras una escritura en otro proceso.
+    if version is None:
+        version = DataVersion.get(DataVersion.receptions_key(campus))
+    cache_key = (campus, operative_only)
+    cached = _reception_indexes.get(cache_key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    receptions = ReceptionQR.objects.filter(campus=campus)
+    if operative_only:
+        receptions = receptions.filter(status='Operativo')
+    index = GridIndex.build(
+        (reception['id'], reception['latitude'], reception['longitude'], reception)
+        for reception in receptions.values('id', 'name', 'latitude', 'longitude', 'status')
+    )
+    _reception_indexes[cache_key] = (version, index)
+    return index
+
+
+def apply_reception_change(campus, pk, reception, version):
+    """Actualiza las celdas de los índices del campus tras guardar o eliminar una recepción.
+
+    reception es None si se eliminó o pasó a otro campus; version es la que quedó
+    tras el cambio. Solo se tocan los índices que estaban en la versión anterior:
+    si hubo otros cambios entremedio, se reconstruyen en la próxima consulta.
+    """
+    for operative_only in (True, False):
+        cache_key = (campus, operative_only)
+        cached = _reception_indexes.get(cache_key)
+        if cached is None or cached[0] != version - 1:
+            continue
+        index = cached[1]
+        if pk in index.items:
+            index.remove(pk)
+        if reception is not None and (not operative_only or reception['status'] == 'Operativo'):
+            index.insert(pk, reception['latitude'], reception['longitude'], reception)
+        _reception_indexes[cache_key] = (version, index)
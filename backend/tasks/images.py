@@ -0,0 +1,251 @@
+import base64
+import hashlib
+import logging
+import math
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from .models import ImageUpload
+
+logger = logging.getLogger(__name__)
+
+# Ancho máximo de cada variante; las imágenes más chicas no se agrandan
+VARIANTS = (
+    ('thumb', 320),
+    ('medium', 960),
+    ('full', 1920),
+)
+# WebP para navegadores actuales y JPEG como respaldo en <picture>
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+IMAGE_FORMATS = tuple(extension for extension, _, _ in FORMATS)
+VARIANTS_DIR = 'images/variants'
+# Se incrementa si cambian VARIANTS o FORMATS, para no reutilizar variantes anteriores
+VARIANTS_VERSION = 1
+# Lado máximo en píxeles del placeholder que va dentro de la respuesta
+PLACEHOLDER_SIZE = 16
+# Campos de ImageUpload que se calculan al procesar el original
+METADATA_FIELDS = ['width', 'height', 'size', 'sha256', 'placeholder']
+# Ancho al que se decodifica el original: el de la variante más grande
+DECODE_MAX_WIDTH = VARIANTS[-1][1]
+# Orientaciones EXIF que intercambian ancho y alto
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def blob_variants_dir(digest):
+    # Variantes de un blob: el mismo nombre siempre tiene los mismos bytes mientras
+    # no cambie VARIANTS_VERSION
+    return f"{VARIANTS_DIR}/{digest}/v{VARIANTS_VERSION}"
+
+
+def variant_name(upload, variant, extension):
+    if upload.blob_id is not None:
+        return f"{blob_variants_dir(upload.blob.sha256)}/{variant}.{extension}"
+    return f"{VARIANTS_DIR}/{upload.pk}/{variant}.{extension}"
+
+
+def normalized(source):
+    """Imagen con la orientación EXIF aplicada y sin metadatos, lista para codificar.
+
+    Solo se conserva el perfil ICC para no alterar los colores; EXIF (GPS,
+    cámara, fecha), XMP y comentarios no se copian a las variantes.
+    """
+    img = ImageOps.exif_transpose(source)
+    icc_profile = source.info.get('icc_profile')
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+    img.info = {'icc_profile': icc_profile} if icc_profile else {}
+    return img
+
+
+def encode(img, format, options):
+    if format == 'JPEG' and img.mode == 'RGBA':
+        # JPEG no tiene transparencia: se aplana sobre blanco
+        background = Image.new('RGB', img.size, 'white')
+        background.paste(img, mask=img.getchannel('A'))
+        background.info = img.info
+        img = background
+    buffer = BytesIO()
+    params = dict(options)
+    if img.info.get('icc_profile'):
+        params['icc_profile'] = img.info['icc_profile']
+    img.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def placeholder(img):
+    # LQIP: WebP de pocos píxeles en data URI; el cliente lo muestra escalado y
+    # desenfocado mientras llega la imagen, sin otra petición
+    small = img.copy()
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    small.info = {}
+    return 'data:image/webp;base64,' + base64.b64encode(encode(small, 'WEBP', {'quality': 40})).decode()
+
+
+def oriented_size(img):
+    """(ancho, alto) de img una vez aplicada la orientación EXIF, sin decodificarla."""
+    width, height = img.size
+    if img.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def read_image(upload, max_width=DECODE_MAX_WIDTH):
+    """Original de upload ya normalizado y sus metadatos (campos METADATA_FIELDS).
+
+    La imagen devuelta se decodifica a no menos de max_width de ancho (o a su
+    tamaño si es menor): los JPEG se escalan en el propio decodificador con
+    draft() y el resto se reduce apenas se lee. Los metadatos son los del original.
+    """
+    with upload.image.open('rb') as stored:
+        if upload.blob_id is not None:
+            size, sha256 = upload.blob.size, upload.blob.sha256
+        else:
+            digest = hashlib.sha256()
+            for chunk in stored.chunks():
+                digest.update(chunk)
+            size, sha256 = stored.size, digest.hexdigest()
+            stored.seek(0)
+        source = Image.open(stored)
+        width, height = oriented_size(source)
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise ValueError(f"{width}x{height} supera IMAGE_UPLOAD_MAX_PIXELS")
+        if max_width and width > max_width:
+            scale = max_width / width
+            source.draft(None, (math.ceil(source.width * scale), math.ceil(source.height * scale)))
+        source.load()
+    img = normalized(source)
+    if max_width and img.width >= 2 * max_width:
+        info = img.info
+        img = img.reduce(img.width // max_width)
+        img.info = info
+    metadata = {'width': width, 'height': height, 'size': size, 'sha256': sha256, 'placeholder': placeholder(img)}
+    return img, metadata
+
+
+def build_variants(upload, img):
+    """Genera las variantes redimensionadas de img (el original normalizado) y las guarda.
+
+    Devuelve el diccionario que se guarda en ImageUpload.variants:
+    {variante: {'width', 'height', 'webp': nombre, 'jpeg': nombre}}. Las variantes
+    que saldrían del mismo tamaño que una anterior se omiten.
+    """
+    variants = {}
+    previous_width = None
+    for variant, max_width in VARIANTS:
+        width = min(max_width, img.width)
+        if width == previous_width:
+            break
+        height = max(1, round(img.height * width / img.width))
+        entry = {'width': width, 'height': height}
+        resized = None
+        for extension, format, options in FORMATS:
+            name = variant_name(upload, variant, extension)
+            if upload.blob_id is not None and default_storage.exists(name):
+                # Nombre por hash de contenido, servido como immutable: ya tiene estos
+                # mismos bytes y reescribirlo lo dejaría un momento ausente o truncado
+                entry[extension] = name
+                continue
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            if resized is None:
+                resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+                resized.info = img.info
+            entry[extension] = default_storage.save(name, ContentFile(encode(resized, format, options)))
+        variants[variant] = entry
+        previous_width = width
+    return variants
+
+
+def is_qr(upload):
+    # Los QRs no se redimensionan: se sirven tal cual o al vuelo (tasks/qr.py)
+    return upload.qr_hash is not None or upload.image.name.startswith('images/points/qr_')
+
+
+def copy_shared(upload):
+    """Copia variantes y metadatos de otra subida del mismo blob, si ya se calcularon."""
+    if upload.blob_id is None:
+        return False
+    fields = ['variants', *METADATA_FIELDS]
+    shared = (
+        ImageUpload.objects.filter(blob_id=upload.blob_id, width__isnull=False).exclude(pk=upload.pk).exclude(variants={})
+        .values(*fields).first()
+    )
+    if not shared:
+        return False
+    for field, value in shared.items():
+        setattr(upload, field, value)
+    upload.processed_at = timezone.now()
+    upload.save(update_fields=[*fields, 'processed_at'])
+    return True
+
+
+def process_image(upload, with_variants=True):
+    """Calcula y guarda los metadatos de upload y, si corresponde, sus variantes.
+
+    Las fallas no impiden la subida: la imagen queda sin variantes ni metadatos,
+    y por lo tanto marcada como no disponible.
+    """
+    if copy_shared(upload):
+        return upload
+    fields = ['variants', *METADATA_FIELDS, 'processed_at']
+    upload.processed_at = timezone.now()
+    try:
+        img, metadata = read_image(upload)
+        variants = build_variants(upload, img) if with_variants else upload.variants
+    except (OSError, Image.DecompressionBombError, SyntaxError, ValueError):
+        logger.exception("No se pudo procesar la imagen %s", upload.pk)
+        # El archivo no se puede leer (o dejó de existir desde que se procesó)
+        for field in METADATA_FIELDS:
+            setattr(upload, field, None if field in ('width', 'height', 'size') else '')
+        upload.save(update_fields=[*METADATA_FIELDS, 'processed_at'])
+        return upload
+    upload.variants = variants
+    for field, value in metadata.items():
+        setattr(upload, field, value)
+    upload.save(update_fields=fields)
+    return upload
+
+
+def process_pending(limit=10):
+    """Procesa hasta limit imágenes subidas que esperan sus variantes (processed_at nulo).
+
+    Lo llama `manage.py process_images`, fuera de las peticiones. Cada imagen se
+    toma con SELECT ... FOR UPDATE SKIP LOCKED en su propia transacción, así que
+    varios workers se reparten la cola y una caída deja la imagen pendiente.
+    """
+    processed = []
+    pending = ImageUpload.objects.filter(processed_at__isnull=True).order_by('uploaded_at').values_list('pk', flat=True)[:limit]
+    for pk in list(pending):
+        with transaction.atomic():
+            upload = (
+                ImageUpload.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('blob').filter(pk=pk, processed_at__isnull=True).first()
+            )
+            if upload is not None:
+                processed.append(process_image(upload, with_variants=not is_qr(upload)))
+    return processed
+
+
+def delete_variants(upload):
+    for entry in (upload.variants or {}).values():
+        for extension in IMAGE_FORMATS:
+            if entry.get(extension):
+                default_storage.delete(entry[extension])
+
+
+def delete_blob_variants(digest, directory=None):
+    directory = directory or f"{VARIANTS_DIR}/{digest}"
+    if not default_storage.exists(directory):
+        return
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        default_storage.delete(f"{directory}/{name}")
+    for subdirectory in directories:
+        delete_blob_variants(digest, f"{directory}/{subdirectory}")
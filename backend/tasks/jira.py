@@ -0,0 +1,293 @@
+import random
+import threading
+import time
+from datetime import timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Denuncia, JiraOutbox
+
+MAX_ATTEMPTS = 8
+# Límite de issues por llamada a /rest/api/3/issue/bulk
+BULK_LIMIT = 50
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60 * 6
+
+DESCRIPTION_FIELDS = [
+    ('Nombre', 'nombre'),
+    ('Apellido', 'apellido'),
+    ('Correo Electrónico', 'email'),
+    ('Teléfono', 'telefono'),
+    ('Tipo de Incidente', 'tipo_incidente'),
+    ('Fecha del Incidente', 'fecha_incidente'),
+    ('Lugar del Incidente', 'lugar_incidente'),
+    ('Descripción', 'descripcion'),
+    ('Campus', 'campus'),
+    ('Encargado de Acogida', 'encargado_acogida'),
+]
+
+
+class JiraError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class CircuitOpenError(JiraError):
+    pass
+
+
+class CircuitBreaker:
+    """Corta las llamadas a Jira tras varias fallas seguidas de red o 5xx.
+
+    Pasado reset_timeout deja pasar una llamada de prueba (semiabierto): si
+    funciona se cierra, si falla vuelve a abrirse por otro período.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial_running and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.reset()
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(
+    failure_threshold=settings.JIRA_BREAKER_THRESHOLD,
+    reset_timeout=settings.JIRA_BREAKER_RESET,
+)
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # Sesión compartida: reutiliza conexiones TCP/TLS keep-alive entre issues
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.JIRA_POOL_SIZE, max_retries=0)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+            _session.headers.update({
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+            })
+        return _session
+
+
+def _post(path, payload):
+    if not breaker.allow():
+        raise CircuitOpenError("Circuito abierto: Jira no responde, se reintentará más tarde")
+    # (conexión, lectura) en segundos; una Jira lenta no debe bloquear al worker indefinidamente
+    timeout = (settings.JIRA_CONNECT_TIMEOUT, settings.JIRA_READ_TIMEOUT)
+    try:
+        response = get_session().post(
+            f"{settings.JIRA_API_URL}{path}",
+            json=payload,
+            auth=(settings.JIRA_EMAIL, settings.JIRA_API_TOKEN),
+            timeout=timeout,
+        )
+    except requests.exceptions.RequestException as e:
+        breaker.record_failure()
+        raise JiraError(f"Error de conexión con Jira: {e}")
+    if response.status_code == 429 or response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+def build_issue_payload(denuncia):
+    # Formatear todos los campos en la descripción
+    description_content = [
+        {
+            "type": "paragraph",
+            "content": [
+                {"type": "text", "text": f"{label}: {getattr(denuncia, field, None) or 'No especificado'}"}
+            ]
+        }
+        for label, field in DESCRIPTION_FIELDS
+    ]
+    return {
+        "fields": {
+            "project": {"key": settings.JIRA_PROJECT_KEY},
+            "summary": f"Caso de acogida: {denuncia.nombre} {denuncia.apellido}",
+            "description": {
+                "type": "doc",
+                "version": 1,
+                "content": description_content
+            },
+            "issuetype": {"name": "Task"},
+        }
+    }
+
+
+def _is_retryable(status_code):
+    # Los 4xx (salvo 429) no se arreglan reintentando
+    return status_code == 429 or status_code >= 500
+
+
+def create_issue(payload):
+    response = _post("/rest/api/3/issue", payload)
+    if response.status_code >= 400:
+        raise JiraError(f"Error de Jira ({response.status_code}): {response.text[:1000]}", retryable=_is_retryable(response.status_code))
+    try:
+        return response.json()
+    except ValueError:
+        # Un proxy o página de mantenimiento puede responder 2xx con HTML
+        raise JiraError(f"Respuesta inválida de Jira ({response.status_code}): {response.text[:1000]}")
+
+
+def create_issues_bulk(payloads):
+    """Crea varios issues en una llamada; devuelve por cada payload el issue o un JiraError."""
+    response = _post("/rest/api/3/issue/bulk", {"issueUpdates": payloads})
+    if _is_retryable(response.status_code):
+        error = JiraError(f"Error de Jira ({response.status_code}): {response.text[:1000]}")
+        return [error] * len(payloads)
+    try:
+        body = response.json()
+    except ValueError:
+        error = JiraError(f"Respuesta inválida de Jira ({response.status_code}): {response.text[:1000]}")
+        return [error] * len(payloads)
+
+    # Jira lista los issues creados en orden y las fallas por índice del elemento
+    results = [None] * len(payloads)
+    for failure in body.get('errors', []):
+        index = failure.get('failedElementNumber')
+        if index is not None and 0 <= index < len(payloads):
+            status_code = failure.get('status', 400)
+            results[index] = JiraError(f"Error de Jira ({status_code}): {failure.get('elementErrors')}", retryable=_is_retryable(status_code))
+    issues = iter(body.get('issues', []))
+    for index, result in enumerate(results):
+        if result is None:
+            issue = next(issues, None)
+            results[index] = issue if issue is not None else JiraError("Jira no devolvió el issue creado")
+    return results
+
+
+def backoff_delay(attempts):
+    # Exponencial con jitter para no reintentar todo a la vez tras una caída de Jira
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def record_failure(entry, error, max_attempts=MAX_ATTEMPTS):
+    # El intento ya se contó al reservar la entrada (claim_entries)
+    entry.last_error = str(error)
+    if not getattr(error, 'retryable', True) or entry.attempts >= max_attempts:
+        entry.status = 'dead'
+    else:
+        entry.status = 'pending'
+        entry.next_attempt_at = timezone.now() + backoff_delay(entry.attempts)
+    entry.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'updated_at'])
+
+
+def record_success(entry, issue):
+    entry.status = 'sent'
+    entry.last_error = ''
+    with transaction.atomic():
+        entry.save(update_fields=['last_error', 'status', 'updated_at'])
+        # update() evita tocar updated_at de la denuncia por un dato interno
+        Denuncia.objects.filter(pk=entry.denuncia_id).update(jira_key=issue.get('key'))
+
+
+def claim_entries(limit, lease, max_attempts=MAX_ATTEMPTS):
+    """Marca como 'processing' hasta limit entradas vencidas y las devuelve.
+
+    La transacción dura solo el SELECT ... FOR UPDATE SKIP LOCKED y el UPDATE:
+    las llamadas a Jira se hacen después, sin bloqueos abiertos. Las entradas
+    'processing' cuyo lease venció (un worker que murió a mitad de lote) se
+    vuelven a tomar. El intento se cuenta aquí, antes de llamar a Jira: una
+    entrada que hace caer al worker agota sus intentos y pasa a 'dead'.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        entries = list(
+            JiraOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status__in=['pending', 'processing'], next_attempt_at__lte=now)
+            .select_related('denuncia')
+            .order_by('next_attempt_at')[:limit]
+        )
+        exhausted = [entry for entry in entries if entry.attempts >= max_attempts]
+        JiraOutbox.objects.filter(pk__in=[entry.pk for entry in exhausted]).update(
+            status='dead', last_error='El worker no terminó el último intento', updated_at=now,
+        )
+        entries = [entry for entry in entries if entry.attempts < max_attempts]
+        JiraOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+            status='processing', attempts=F('attempts') + 1, next_attempt_at=now + lease, updated_at=now,
+        )
+    for entry in entries:
+        entry.attempts += 1
+    return entries
+
+
+def release_entries(entries):
+    # Vuelven a la cola sin gastar un intento: se descuenta el de claim_entries
+    JiraOutbox.objects.filter(pk__in=[entry.pk for entry in entries], status='processing').update(
+        status='pending', attempts=F('attempts') - 1, next_attempt_at=timezone.now(),
+    )
+
+
+def process_outbox(limit=10, max_attempts=MAX_ATTEMPTS, bulk=False):
+    """Envía a Jira las entradas pendientes cuyo próximo intento ya venció.
+
+    Las filas se reservan con un lease (claim_entries), así que varios workers
+    pueden drenar la tabla en paralelo sin enviar dos veces la misma denuncia. El
+    resultado de cada entrada se guarda apenas llega, en su propia transacción:
+    una caída a mitad de lote solo puede repetir el envío en curso. Con bulk=True
+    se envían en lotes con el endpoint de creación masiva de Jira.
+    """
+    chunk_size = BULK_LIMIT if bulk else 1
+    # El lease cubre el peor caso: todas las llamadas del lote agotando el timeout
+    calls = -(-limit // chunk_size)
+    lease = timedelta(seconds=(settings.JIRA_CONNECT_TIMEOUT + settings.JIRA_READ_TIMEOUT) * calls + 60)
+    entries = claim_entries(limit, lease, max_attempts)
+    processed = []
+    for start in range(0, len(entries), chunk_size):
+        chunk = entries[start:start + chunk_size]
+        try:
+            if bulk:
+                results = create_issues_bulk([build_issue_payload(entry.denuncia) for entry in chunk])
+            else:
+                results = [create_issue(build_issue_payload(chunk[0].denuncia))]
+        except CircuitOpenError:
+            # Con el circuito abierto no se gastan intentos; quedan para la próxima pasada
+            release_entries(entries[start:])
+            break
+        except JiraError as e:
+            results = [e] * len(chunk)
+        for entry, result in zip(chunk, results):
+            if isinstance(result, JiraError):
+                record_failure(entry, result, max_attempts)
+            else:
+                record_success(entry, result)
+        processed.extend(chunk)
+    return processed
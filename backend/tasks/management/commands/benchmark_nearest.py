@@ -0,0 +1,51 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from tasks.geo import GridIndex, linear_nearest
+
+
+class Command(BaseCommand):
+    help = 'Compara el índice de grilla contra el recorrido lineal para buscar la recepción más cercana'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--receptions', type=int, default=10000)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--k', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Puntos sintéticos en un área de ~5 km alrededor del campus Curicó
+        lat0, lon0, spread = -34.985, -71.236, 0.05
+        points = [
+            (i, lat0 + rng.uniform(-spread, spread), lon0 + rng.uniform(-spread, spread), None)
+            for i in range(options['receptions'])
+        ]
+        queries = [
+            (lat0 + rng.uniform(-spread, spread), lon0 + rng.uniform(-spread, spread))
+            for _ in range(options['queries'])
+        ]
+        k = options['k']
+
+        start = time.perf_counter()
+        index = GridIndex.build(points)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        grid_results = [index.nearest(lat, lon, k=k) for lat, lon in queries]
+        grid = time.perf_counter() - start
+
+        start = time.perf_counter()
+        linear_results = [linear_nearest(points, lat, lon, k=k) for lat, lon in queries]
+        linear = time.perf_counter() - start
+
+        mismatches = sum(
+            [key for _, key, _ in a] != [key for _, key, _ in b]
+            for a, b in zip(grid_results, linear_results)
+        )
+        n = len(queries)
+        self.stdout.write(f"Recepciones: {len(points)}, consultas: {n}, k={k}")
+        self.stdout.write(f"Construcción del índice: {build * 1000:.1f} ms")
+        self.stdout.write(f"Grilla: {grid / n * 1e6:.1f} µs por consulta")
+        self.stdout.write(f"Lineal: {linear / n * 1e6:.1f} µs por consulta")
+        self.stdout.write(f"Aceleración: {linear / grid:.1f}x, resultados distintos: {mismatches}")
@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from tasks.models import ImageUploadSession
+from tasks.uploads import discard_session_file
+
+
+class Command(BaseCommand):
+    help = 'Elimina las subidas reanudables abandonadas y sus archivos parciales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Horas sin actividad para considerar abandonada una subida')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = list(ImageUploadSession.objects.filter(updated_at__lt=cutoff))
+        for session in stale:
+            discard_session_file(session)
+        ImageUploadSession.objects.filter(pk__in=[session.pk for session in stale]).delete()
+        self.stdout.write(self.style.SUCCESS(f"{len(stale)} subidas abandonadas eliminadas"))
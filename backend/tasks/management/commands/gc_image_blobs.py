@@ -0,0 +1,81 @@
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, ProtectedError
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from tasks.images import delete_blob_variants, delete_variants, process_image
+from tasks.models import ImageBlob, ImageUpload
+from tasks.uploads import store_blob, validate_image
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las referencias de los blobs de imágenes y elimina los que ya no usa ninguna subida'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informar lo que se eliminaría')
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Minutos sin cambios antes de eliminar un blob sin referencias (protege subidas en curso)')
+        parser.add_argument('--adopt', action='store_true',
+                            help='Pasar a blobs las imágenes subidas antes del almacenamiento por hash')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['adopt'] and not dry_run:
+            adopted = self.adopt()
+            self.stdout.write(f"{adopted} imágenes pasadas a blobs")
+
+        # El contador se corrige con las filas reales por si quedó desfasado
+        drifted = ImageBlob.objects.annotate(refs=Count('uploads')).exclude(refcount=F('refs'))
+        fixed = 0
+        for blob in drifted:
+            fixed += 1
+            if not dry_run:
+                ImageBlob.objects.filter(pk=blob.pk).update(refcount=blob.refs)
+
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        unused = list(ImageBlob.objects.filter(uploads__isnull=True, updated_at__lt=cutoff))
+        deleted = len(unused) if dry_run else sum(self.delete_blob(blob, cutoff) for blob in unused)
+
+        prefix = 'Se eliminarían' if dry_run else 'Eliminados'
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {deleted} blobs sin referencias ({fixed} contadores corregidos)"))
+
+    def delete_blob(self, blob, cutoff):
+        # Una subida pudo reutilizar el blob desde que se listó: se bloquea su fila y se
+        # vuelve a verificar antes de eliminarlo; los archivos se borran tras el commit
+        try:
+            with transaction.atomic():
+                blob = ImageBlob.objects.select_for_update().filter(pk=blob.pk, updated_at__lt=cutoff).first()
+                if blob is None or blob.uploads.exists():
+                    return False
+                blob.delete()
+        except ProtectedError:
+            return False
+        default_storage.delete(blob.file.name)
+        delete_blob_variants(blob.sha256)
+        return True
+
+    def adopt(self):
+        # Los QRs ya se guardan por hash de su contenido (tasks/qr.py)
+        legacy = ImageUpload.objects.filter(blob__isnull=True, qr_hash__isnull=True).exclude(image__startswith='images/points/qr_')
+        adopted = 0
+        for upload in legacy.iterator():
+            old_name = upload.image.name
+            try:
+                with upload.image.open('rb') as stored:
+                    format, _, _ = validate_image(stored)
+                    blob = store_blob(stored, format)
+            except (OSError, ValidationError):
+                self.stderr.write(f"Se omite {old_name}: no se pudo leer como imagen")
+                continue
+            delete_variants(upload)
+            upload.image = blob.file.name
+            upload.blob = blob
+            upload.variants = {}
+            upload.save()
+            process_image(upload)
+            if not ImageUpload.objects.filter(image=old_name).exists():
+                default_storage.delete(old_name)
+            adopted += 1
+        return adopted
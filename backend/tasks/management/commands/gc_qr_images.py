@@ -0,0 +1,73 @@
+import re
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from tasks.models import ImageUpload, ReceptionQR, TotemQR
+from tasks.qr import QR_STORAGE_DIR, point_qr_digest
+
+# Nombres de los QR generados antes de guardarlos por hash de contenido
+LEGACY_QR_NAME = re.compile(r'^images/points/qr_(totem|reception)_\d+_')
+
+
+class Command(BaseCommand):
+    help = 'Elimina QRs generados que ya no corresponden a ningún punto y sus archivos huérfanos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informar lo que se eliminaría')
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Antigüedad mínima de registros y archivos a eliminar (protege QRs que se están generando)')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        # store_point_qr guarda el archivo antes de crear la fila, y un punto recién
+        # modificado puede tener un QR más nuevo que los puntos leídos aquí
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        points = {}
+        for point_type, model in (('totem', TotemQR), ('reception', ReceptionQR)):
+            for point in model.objects.all():
+                points[(point_type, point.id)] = point
+
+        stale = []
+        candidates = ImageUpload.objects.filter(
+            Q(qr_hash__isnull=False) | Q(image__startswith='images/points/qr_'), uploaded_at__lt=cutoff,
+        )
+        for upload in candidates:
+            if upload.qr_hash is None and not LEGACY_QR_NAME.match(upload.image.name):
+                continue
+            point = points.get((upload.point_type, upload.point_id))
+            if point is not None:
+                if upload.qr_hash is not None and upload.qr_hash == point_qr_digest(upload.point_type, point):
+                    continue
+                # Un QR antiguo se conserva mientras sea el que el punto tiene publicado
+                if point.qr_image and point.qr_image.endswith(default_storage.url(upload.image.name)):
+                    continue
+            stale.append(upload)
+
+        stale_names = {upload.image.name for upload in stale}
+        if not dry_run:
+            ImageUpload.objects.filter(pk__in=[upload.pk for upload in stale]).delete()
+
+        # Archivos de QR sin ninguna fila que los use (incluye los de filas recién eliminadas)
+        referenced = set(ImageUpload.objects.exclude(pk__in=[upload.pk for upload in stale]).values_list('image', flat=True))
+        orphan_files = [name for name in stale_names if name not in referenced]
+        orphan_files += [
+            name for name in self.qr_files()
+            if name not in referenced and name not in stale_names and default_storage.get_modified_time(name) < cutoff
+        ]
+        if not dry_run:
+            for name in orphan_files:
+                default_storage.delete(name)
+
+        prefix = 'Se eliminarían' if dry_run else 'Eliminados'
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {len(stale)} registros de QR y {len(orphan_files)} archivos"))
+
+    def qr_files(self, directory=QR_STORAGE_DIR):
+        if not default_storage.exists(directory):
+            return
+        directories, files = default_storage.listdir(directory)
+        for name in files:
+            yield f"{directory}/{name}"
+        for subdirectory in directories:
+            yield from self.qr_files(f"{directory}/{subdirectory}")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from tasks.images import is_qr, process_image
+from tasks.models import ImageUpload
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes WebP/JPEG y los metadatos de las imágenes de puntos que no los tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Procesar todas de nuevo; también marca como no disponibles las que ya no se pueden leer')
+
+    def handle(self, *args, **options):
+        uploads = ImageUpload.objects.all()
+        if not options['all']:
+            uploads = uploads.filter(Q(variants={}) | Q(variants__isnull=True) | Q(width__isnull=True))
+        processed = failed = 0
+        for upload in uploads.iterator():
+            qr = is_qr(upload)
+            if qr and upload.width is not None and not options['all']:
+                continue
+            if process_image(upload, with_variants=not qr).width is not None:
+                processed += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"{processed} imágenes procesadas ({failed} con error)"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from tasks.models import TotemQR
+from tasks.routing import compute_totem_routes
+
+
+class Command(BaseCommand):
+    help = 'Calcula la tabla de rutas totem -> recepciones para los totems que no la tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campus', help='Limitar a un campus')
+        parser.add_argument('--all', action='store_true', help='Recalcular también los totems con rutas vigentes')
+
+    def handle(self, *args, **options):
+        totems = TotemQR.objects.all()
+        if options['campus']:
+            totems = totems.filter(campus=options['campus'])
+        if not options['all']:
+            totems = totems.filter(routes__isnull=True)
+        count = 0
+        for totem in totems.order_by('campus', 'id'):
+            compute_totem_routes(totem)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rutas calculadas para {count} totems"))
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from tasks.images import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes y metadatos de las imágenes recién subidas, fuera de las peticiones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesar lo pendiente y terminar')
+        parser.add_argument('--interval', type=float, default=2, help='Segundos de espera cuando no hay imágenes pendientes')
+        parser.add_argument('--batch-size', type=int, default=10)
+
+    def handle(self, *args, **options):
+        while True:
+            uploads = process_pending(limit=options['batch_size'])
+            for upload in uploads:
+                if upload.width is not None:
+                    self.stdout.write(f"Imagen {upload.pk}: {len(upload.variants)} variantes")
+                else:
+                    self.stderr.write(f"Imagen {upload.pk}: no se pudo procesar")
+            if not uploads:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from tasks.jira import MAX_ATTEMPTS, process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Crea en Jira los issues de las denuncias encoladas, con reintentos y backoff exponencial'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesar lo pendiente y terminar')
+        parser.add_argument('--interval', type=float, default=5, help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--bulk', action='store_true', help='Enviar cada lote con el endpoint de creación masiva de Jira')
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+
+    def handle(self, *args, **options):
+        while True:
+            entries = process_outbox(limit=options['batch_size'], max_attempts=options['max_attempts'], bulk=options['bulk'])
+            for entry in entries:
+                if entry.status == 'sent':
+                    self.stdout.write(f"Denuncia {entry.denuncia_id}: issue creado")
+                else:
+                    self.stderr.write(f"Denuncia {entry.denuncia_id}: intento {entry.attempts} fallido ({entry.status}): {entry.last_error}")
+            if not entries:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from tasks.qr_batch import claim_job, expire_stale_jobs, render_pool, run_qr_batch
+
+
+class Command(BaseCommand):
+    help = 'Genera los lotes de QRs pendientes, de a uno y con un único pool de procesos para dibujar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesar lo pendiente y terminar')
+        parser.add_argument('--interval', type=float, default=5, help='Segundos de espera cuando no hay lotes pendientes')
+        parser.add_argument('--workers', type=int, default=None, help='Procesos para dibujar (por defecto QR_BATCH_WORKERS)')
+
+    def handle(self, *args, **options):
+        with render_pool(options['workers']) as pool:
+            while True:
+                expired = expire_stale_jobs()
+                if expired:
+                    self.stderr.write(f"{expired} lotes sin latido marcados como fallidos")
+                job = claim_job()
+                if job is not None:
+                    run_qr_batch(job.pk, pool=pool)
+                    job.refresh_from_db()
+                    self.stdout.write(f"Lote {job.pk} ({job.campus}): {job.status}")
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
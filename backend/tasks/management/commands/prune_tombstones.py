@@ -0,0 +1,18 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from tasks.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Elimina los registros de eliminaciones más antiguos que la retención de la sincronización ?since='
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TOMBSTONE_RETENTION_DAYS,
+                            help='Días que se conservan; no debe ser menor que TOMBSTONE_RETENTION_DAYS')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} eliminaciones antiguas borradas"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from tasks.stats import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Regenera los conteos del dashboard (StatsRollup) a partir de denuncias y reportes'
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"{count} filas de estadísticas regeneradas"))
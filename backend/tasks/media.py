@@ -0,0 +1,111 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+# Archivos nombrados por el hash de su contenido: nunca cambian, se cachean un año
+IMMUTABLE_PATHS = re.compile(r'^images/(blobs/[0-9a-f]{2}/[0-9a-f]{64}\.|variants/[0-9a-f]{64}/v\d+/|qr/[0-9a-f]{2}/[0-9a-f]{64}\.)')
+IMMUTABLE_CACHE_SECONDS = 365 * 24 * 60 * 60
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK = 64 * 1024
+
+
+def media_file(path):
+    """Ruta absoluta y stat de un archivo dentro de MEDIA_ROOT; 404 si no existe o escapa de ella."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    return full_path, stat
+
+
+def is_immutable(path):
+    return bool(IMMUTABLE_PATHS.match(path))
+
+
+def file_etag(stat):
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def content_type(path):
+    content_type, encoding = mimetypes.guess_type(path)
+    return content_type or 'application/octet-stream'
+
+
+def requested_range(request, size, etag, last_modified):
+    """(inicio, fin) inclusivo del header Range, None para el archivo completo o
+    'invalid' si el rango no se puede satisfacer.
+
+    Solo se atiende un rango; con varios, o si If-Range no coincide con el
+    archivo actual, se responde completo como permite la RFC 9110.
+    """
+    header = request.headers.get('Range')
+    if not header or size == 0:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range:
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != int(last_modified):
+            return None
+    match = RANGE_HEADER.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N: los últimos N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return 'invalid'
+    return start, end
+
+
+def read_range(full_path, start, end):
+    with open(full_path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            block = file.read(min(STREAM_BLOCK, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def sendfile_headers(path, full_path):
+    # El servidor web delante de la app envía el archivo; el worker solo responde headers
+    mode = settings.MEDIA_SENDFILE
+    if mode == 'x-accel-redirect':
+        return {'X-Accel-Redirect': settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + path}
+    if mode == 'x-sendfile':
+        return {'X-Sendfile': full_path}
+    return None
+
+
+def cache_headers(path, stat):
+    if is_immutable(path):
+        cache_control = f'public, max-age={IMMUTABLE_CACHE_SECONDS}, immutable'
+    else:
+        # Nombres que pueden reutilizarse: se revalida siempre con ETag/Last-Modified
+        cache_control = 'public, no-cache'
+    return {
+        'Cache-Control': cache_control,
+        'ETag': file_etag(stat),
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
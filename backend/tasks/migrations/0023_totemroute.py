@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0022_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TotemRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('distance', models.FloatField()),
+                ('coordinates', models.JSONField()),
+                ('version', models.PositiveBigIntegerField()),
+                ('reception', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tasks.receptionqr')),
+                ('totem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes', to='tasks.totemqr')),
+            ],
+            options={
+                'ordering': ['totem', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('totem', 'rank'), name='unique_totem_route_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0023_totemroute'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='denuncia',
+            name='jira_key',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.CreateModel(
+            name='JiraOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('sent', 'Enviado'), ('dead', 'Fallido')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('denuncia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jira_outbox', to='tasks.denuncia')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='tasks_jirao_status_f0e009_idx')],
+            },
+        ),
+    ]
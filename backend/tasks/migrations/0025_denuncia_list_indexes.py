@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0024_jira_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=models.Index(fields=['-created_at', '-id'], name='denuncia_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=models.Index(fields=['campus', '-created_at'], name='denuncia_campus_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=models.Index(fields=['estado', '-created_at'], name='denuncia_estado_created_idx'),
+        ),
+    ]
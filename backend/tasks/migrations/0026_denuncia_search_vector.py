@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:12
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Índice GIN y llenado inicial solo en Postgres; en otros motores la búsqueda
+    # usa el modo simple de tasks/search.py
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS denuncia_search_vector_gin ON tasks_denuncia USING gin (search_vector)'
+    )
+    Denuncia = apps.get_model('tasks', 'Denuncia')
+    Denuncia.objects.update(search_vector=(
+        SearchVector('nombre', weight='A', config='spanish')
+        + SearchVector('apellido', weight='A', config='spanish')
+        + SearchVector('lugar_incidente', weight='B', config='spanish')
+        + SearchVector('descripcion', weight='C', config='spanish')
+    ))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS denuncia_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0025_denuncia_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='denuncia',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
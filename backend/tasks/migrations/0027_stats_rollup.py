@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:13
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    StatsRollup = apps.get_model('tasks', 'StatsRollup')
+    sources = [
+        ('denuncia', apps.get_model('tasks', 'Denuncia'), 'tipo_incidente'),
+        ('reporte', apps.get_model('tasks', 'ReporteAtencion'), 'tipo_reporte'),
+    ]
+    rows = []
+    for kind, model, tipo_field in sources:
+        groups = (
+            model.objects.annotate(day=TruncDate('created_at'))
+            .values('day', 'campus', tipo_field, 'estado')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for group in groups:
+            rows.append(StatsRollup(
+                kind=kind, day=group['day'], campus=group['campus'] or '',
+                tipo=group[tipo_field] or '', estado=group['estado'] or '', count=group['total'],
+            ))
+    StatsRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0026_denuncia_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('denuncia', 'Denuncia'), ('reporte', 'Reporte de atención')], max_length=20)),
+                ('day', models.DateField()),
+                ('campus', models.CharField(blank=True, default='', max_length=100)),
+                ('tipo', models.CharField(blank=True, default='', max_length=100)),
+                ('estado', models.CharField(blank=True, default='', max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'day'], name='tasks_stats_kind_99f9dc_idx')],
+                'unique_together': {('kind', 'day', 'campus', 'tipo', 'estado')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def initial_updated_at(apps, schema_editor):
+    # Los reportes existentes no tienen historial de cambios; se parte de su creación
+    ReporteAtencion = apps.get_model('tasks', 'ReporteAtencion')
+    ReporteAtencion.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0027_stats_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('denuncia', 'Denuncia'), ('reporte', 'Reporte de atención')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('campus', models.CharField(blank=True, default='', max_length=100)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reporteatencion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(initial_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=models.Index(fields=['updated_at'], name='denuncia_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['model', 'deleted_at'], name='tasks_tombs_model_55a889_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0028_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reporteatencion',
+            index=models.Index(condition=models.Q(('estado', 'nuevo')), fields=['campus'], name='reporte_nuevo_campus_idx'),
+        ),
+    ]
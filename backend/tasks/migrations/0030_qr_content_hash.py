@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0029_reporte_unread_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='qr_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='imageupload',
+            constraint=models.UniqueConstraint(condition=models.Q(('qr_hash__isnull', False)), fields=('point_type', 'point_id', 'qr_hash'), name='unique_point_qr'),
+        ),
+    ]
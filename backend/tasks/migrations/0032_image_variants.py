@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0031_qr_batch_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0032_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(fields=['campus', 'point_type', 'point_id'], name='imageupload_point_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0036_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='jiraoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendiente'), ('processing', 'En proceso'), ('sent', 'Enviado'), ('dead', 'Fallido')], default='pending', max_length=20),
+        ),
+    ]
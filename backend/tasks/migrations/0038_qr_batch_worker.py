@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0037_jira_outbox_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrbatchjob',
+            name='base_url',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='qrbatchjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_processed(apps, schema_editor):
+    # Solo las que ya tienen metadatos (generate_image_variants); las subidas antes
+    # de 0036 quedan pendientes y las procesa el worker
+    ImageUpload = apps.get_model('tasks', 'ImageUpload')
+    ImageUpload.objects.filter(width__isnull=False).update(processed_at=F('uploaded_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0038_qr_batch_worker'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_processed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['uploaded_at'], name='imageupload_pending_idx'),
+        ),
+    ]
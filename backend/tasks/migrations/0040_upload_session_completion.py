@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0039_image_processing_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageuploadsession',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageuploadsession',
+            name='image_upload',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tasks.imageupload'),
+        ),
+    ]
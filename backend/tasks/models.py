@@ -1,8 +1,12 @@
-from django.db import models
-from django.db.models.signals import post_save
+import uuid
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
+from django.utils import timezone
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -23,6 +27,41 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created and not UserProfile.objects.filter(user=instance).exists():
         UserProfile.objects.create(user=instance)
 
+class DataVersion(models.Model):
+    # Contador por clave (p. ej. "campus:Curico") que se incrementa en cada escritura
+    # relevante; permite invalidar cachés y calcular ETags sin recorrer los datos.
+    key = models.CharField(max_length=255, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def campus_key(campus):
+        return f"campus:{campus or ''}"
+
+    @staticmethod
+    def receptions_key(campus):
+        return f"receptions:{campus or ''}"
+
+    @staticmethod
+    def images_key(campus):
+        return f"images:{campus or ''}"
+
+    @classmethod
+    def get(cls, key):
+        return cls.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, key):
+        # Se ejecuta en la misma transacción que la escritura que invalida los datos
+        with transaction.atomic():
+            if not cls.objects.filter(key=key).update(version=F('version') + 1):
+                obj, created = cls.objects.get_or_create(key=key, defaults={'version': 1})
+                if not created:
+                    cls.objects.filter(key=key).update(version=F('version') + 1)
+
+    def __str__(self):
+        return f"{self.key} - v{self.version}"
+
 class TotemQR(models.Model):
     id = models.AutoField(primary_key=True)
     latitude = models.FloatField()
@@ -66,6 +105,27 @@ class PathPoint(models.Model):
     class Meta:
         ordering = ['order']
 
+class TotemRoute(models.Model):
+    # Tabla precalculada: para cada totem, las TOP_K recepciones operativas más
+    # cercanas caminando, con la geometría del recorrido ya resuelta.
+    TOP_K = 3
+
+    totem = models.ForeignKey(TotemQR, on_delete=models.CASCADE, related_name='routes')
+    reception = models.ForeignKey(ReceptionQR, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    distance = models.FloatField()
+    coordinates = models.JSONField()  # [[lat, lon], ...] desde el totem hasta la recepción
+    version = models.PositiveBigIntegerField()  # Versión de datos del campus usada al calcular
+
+    class Meta:
+        ordering = ['totem', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['totem', 'rank'], name='unique_totem_route_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.totem_id} -> {self.reception_id} ({self.rank})"
+
 class Denuncia(models.Model):
     TIPO_INCIDENTE_CHOICES = [
         ('Acoso_sexual', 'Acoso Sexual'),
@@ -90,25 +150,153 @@ class Denuncia(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     estado = models.CharField(max_length=20, choices=[('pendiente', 'Pendiente'), ('tomada', 'Tomada')], default='pendiente')
     comentarios = models.TextField(blank=True, null=True)
+    jira_key = models.CharField(max_length=50, blank=True, null=True)  # Issue creado por el worker de Jira
+    # tsvector en español (nombre, apellido, lugar, descripción); solo se llena en Postgres
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # Listado del dashboard: más recientes primero, opcionalmente por campus o estado
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='denuncia_created_idx'),
+            models.Index(fields=['campus', '-created_at'], name='denuncia_campus_created_idx'),
+            models.Index(fields=['estado', '-created_at'], name='denuncia_estado_created_idx'),
+            models.Index(fields=['updated_at'], name='denuncia_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} {self.apellido} - {self.tipo_incidente}"
 
+class JiraOutbox(models.Model):
+    # Cola transaccional: se escribe junto con la denuncia y la drena
+    # `manage.py process_jira_outbox`, de modo que Jira no bloquea la petición
+    denuncia = models.ForeignKey(Denuncia, on_delete=models.CASCADE, related_name='jira_outbox')
+    status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pendiente'),
+        ('processing', 'En proceso'),
+        ('sent', 'Enviado'),
+        ('dead', 'Fallido'),
+    ], default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # En 'processing' es el vencimiento del lease: pasado ese momento otro worker la retoma
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"Denuncia {self.denuncia_id} - {self.status}"
+
+class ImageBlob(models.Model):
+    # Contenido único de una imagen subida, guardado una sola vez con su hash como
+    # nombre (tasks/uploads.py). refcount cuenta los ImageUpload que lo usan; los
+    # que quedan en 0 se eliminan con `manage.py gc_image_blobs`
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='images/blobs/')
+    size = models.PositiveBigIntegerField()
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def adjust(cls, pk, delta):
+        cls.objects.filter(pk=pk).update(refcount=F('refcount') + delta, updated_at=timezone.now())
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.refcount} refs)"
+
+
 class ImageUpload(models.Model):
     point_id = models.IntegerField()
     point_type = models.CharField(max_length=20, choices=[('totem', 'Totem'), ('reception', 'Reception')])
     campus = models.CharField(max_length=50)
     image = models.ImageField(upload_to='images/points/')
+    # Contenido compartido con otras subidas idénticas; None en QRs y subidas anteriores a los blobs
+    blob = models.ForeignKey(ImageBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='uploads')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    # Solo en QRs generados: hash del contenido codificado y parámetros de dibujo (tasks/qr.py)
+    qr_hash = models.CharField(max_length=64, blank=True, null=True)
+    # Versiones redimensionadas en WebP/JPEG (tasks/images.py): {variante: {width, height, webp, jpeg}}
+    variants = models.JSONField(default=dict, blank=True)
+    # Metadatos del original calculados al procesarlo (tasks/images.py); width en None
+    # indica que el archivo no se pudo leer
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    placeholder = models.TextField(blank=True, default='')
+    # None mientras espera sus variantes: la cola que drena `manage.py process_images`
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Listado de imágenes por punto y por campus completo (ImageListView)
+        indexes = [
+            models.Index(fields=['campus', 'point_type', 'point_id'], name='imageupload_point_idx'),
+            models.Index(fields=['uploaded_at'], condition=models.Q(processed_at__isnull=True), name='imageupload_pending_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['point_type', 'point_id', 'qr_hash'],
+                condition=models.Q(qr_hash__isnull=False),
+                name='unique_point_qr',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.point_type} {self.point_id} - {self.image.name}"
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.create(user=instance)
+
+class ImageUploadSession(models.Model):
+    # Subida reanudable por partes de una foto grande (tasks/uploads.py); el archivo
+    # parcial vive en IMAGE_UPLOAD_TEMP_DIR hasta que llega el último byte
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    point_id = models.IntegerField()
+    point_type = models.CharField(max_length=20, choices=[('totem', 'Totem'), ('reception', 'Reception')])
+    campus = models.CharField(max_length=50)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Imagen resultante; se conserva para responder igual si el cliente repite el último PUT
+    image_upload = models.ForeignKey('ImageUpload', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class QRBatchJob(models.Model):
+    # Generación de los QR de todo un campus en segundo plano: los toma
+    # `manage.py process_qr_batches` (tasks/qr_batch.py)
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En proceso'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    ]
+    campus = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    include_pdf = models.BooleanField(default=False)
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    archive = models.FileField(upload_to='qr_batches/', blank=True)
+    pdf = models.FileField(upload_to='qr_batches/', blank=True)
+    error = models.TextField(blank=True)
+    # Base de las URLs absolutas de los QR, tomada de la petición que creó el job
+    base_url = models.CharField(max_length=500, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Lo actualiza el worker mientras avanza; un job 'running' sin latido se da por perdido
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"QRs {self.campus} - {self.status} ({self.completed}/{self.total})"
 
 
 class ReporteAtencion(models.Model):
@@ -127,7 +315,285 @@ class ReporteAtencion(models.Model):
     campus = models.CharField(max_length=100)
     tipo_reporte = models.CharField(max_length=50, default="falta_atencion")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     estado = models.CharField(max_length=20, default="nuevo") 
 
+    class Meta:
+        # Índice parcial: el contador de no leídos solo recorre los reportes nuevos
+        indexes = [
+            models.Index(fields=['campus'], condition=models.Q(estado='nuevo'), name='reporte_nuevo_campus_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} - {self.campus} - {self.created_at.date()}"
+
+class Tombstone(models.Model):
+    # Registro de eliminaciones para la sincronización incremental (?since=)
+    MODEL_CHOICES = [
+        ('denuncia', 'Denuncia'),
+        ('reporte', 'Reporte de atención'),
+    ]
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.PositiveIntegerField()
+    campus = models.CharField(max_length=100, blank=True, default='')
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['model', 'deleted_at'])]
+
     def __str__(self):
-        return f"{self.nombre} - {self.campus} - {self.created_at.date()}"
\ No newline at end of file
+        return f"{self.model} {self.object_id} eliminado {self.deleted_at}"
+
+class StatsRollup(models.Model):
+    # Conteos precalculados para el dashboard, mantenidos por señales al guardar o
+    # eliminar denuncias y reportes; `manage.py rebuild_stats` los regenera desde cero
+    KIND_CHOICES = [
+        ('denuncia', 'Denuncia'),
+        ('reporte', 'Reporte de atención'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    day = models.DateField()
+    campus = models.CharField(max_length=100, blank=True, default='')
+    tipo = models.CharField(max_length=100, blank=True, default='')
+    estado = models.CharField(max_length=20, blank=True, default='')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'day', 'campus', 'tipo', 'estado')
+        indexes = [models.Index(fields=['kind', 'day'])]
+
+    @staticmethod
+    def key_for(instance):
+        # (kind, day, campus, tipo, estado) de una Denuncia o un ReporteAtencion
+        if isinstance(instance, Denuncia):
+            kind, tipo = 'denuncia', instance.tipo_incidente
+        else:
+            kind, tipo = 'reporte', instance.tipo_reporte
+        return (kind, timezone.localdate(instance.created_at), instance.campus or '', tipo or '', instance.estado or '')
+
+    @classmethod
+    def adjust(cls, key, delta):
+        kind, day, campus, tipo, estado = key
+        lookup = {'kind': kind, 'day': day, 'campus': campus, 'tipo': tipo, 'estado': estado}
+        with transaction.atomic():
+            if not cls.objects.filter(**lookup).update(count=F('count') + delta):
+                obj, created = cls.objects.get_or_create(**lookup, defaults={'count': delta})
+                if not created:
+                    cls.objects.filter(**lookup).update(count=F('count') + delta)
+
+    def __str__(self):
+        return f"{self.kind} {self.day} {self.campus} {self.tipo} {self.estado}: {self.count}"
+
+
+# Invalidación de la versión de datos del campus (snapshot del mapa)
+def _deleted_with_path(sender, kwargs):
+    # Puntos borrados en cascada con su camino: basta con la señal del camino
+    origin = kwargs.get('origin')
+    return sender is PathPoint and (isinstance(origin, Path) or getattr(origin, 'model', None) is Path)
+
+@receiver(pre_save, sender=TotemQR)
+@receiver(pre_save, sender=ReceptionQR)
+@receiver(pre_save, sender=Path)
+def remember_previous_state(sender, instance, **kwargs):
+    # Estado anterior a la escritura, para invalidar también el campus o la posición previa
+    if instance.pk:
+        fields = ['campus'] if sender is Path else ['campus', 'latitude', 'longitude', 'status']
+        previous = sender.objects.filter(pk=instance.pk).values(*fields).first()
+        if previous is not None:
+            instance._previous_state = previous
+
+@receiver(post_save, sender=TotemQR)
+@receiver(post_delete, sender=TotemQR)
+@receiver(post_save, sender=ReceptionQR)
+@receiver(post_delete, sender=ReceptionQR)
+@receiver(post_save, sender=Path)
+@receiver(post_delete, sender=Path)
+@receiver(post_save, sender=PathPoint)
+@receiver(post_delete, sender=PathPoint)
+def bump_campus_version(sender, instance, **kwargs):
+    if _deleted_with_path(sender, kwargs):
+        return
+    campus = instance.path.campus if sender is PathPoint else instance.campus
+    DataVersion.bump(DataVersion.campus_key(campus))
+    # Si el punto cambió de campus también se invalida el campus anterior
+    previous = getattr(instance, '_previous_state', None)
+    if previous is not None and previous['campus'] != campus:
+        DataVersion.bump(DataVersion.campus_key(previous['campus']))
+
+@receiver(post_save, sender=ReceptionQR)
+@receiver(post_delete, sender=ReceptionQR)
+def update_reception_index(sender, instance, signal, **kwargs):
+    # El índice espacial de recepciones se corrige en el lugar al confirmar la
+    # transacción, sin reconstruirlo (tasks/geo.py)
+    from .geo import apply_reception_change, reception_data
+    changes = {instance.campus: None if signal is post_delete else reception_data(instance)}
+    previous = getattr(instance, '_previous_state', None)
+    if previous is not None and previous['campus'] != instance.campus:
+        changes[previous['campus']] = None
+    for campus, data in changes.items():
+        key = DataVersion.receptions_key(campus)
+        DataVersion.bump(key)
+        version = DataVersion.get(key)
+        transaction.on_commit(
+            lambda campus=campus, pk=instance.pk, data=data, version=version: apply_reception_change(campus, pk, data, version)
+        )
+
+
+# Invalidación de la tabla de rutas: se descartan las filas de los totems afectados
+# y se recalculan al confirmar la transacción (tasks/routing.py)
+def refresh_totem_routes(totem_ids):
+    from .routing import schedule_totem_routes
+    totem_ids = set(totem_ids)
+    if totem_ids:
+        TotemRoute.objects.filter(totem_id__in=totem_ids).delete()
+        schedule_totem_routes(totem_ids)
+
+def _location_changed(instance):
+    previous = getattr(instance, '_previous_state', None)
+    return previous is None or any(
+        previous[field] != getattr(instance, field) for field in ('campus', 'latitude', 'longitude', 'status')
+    )
+
+@receiver(post_save, sender=TotemQR)
+def invalidate_totem_routes(sender, instance, created, **kwargs):
+    if created or _location_changed(instance):
+        refresh_totem_routes([instance.pk])
+
+@receiver(post_save, sender=ReceptionQR)
+def invalidate_reception_routes(sender, instance, created, **kwargs):
+    if not created and not _location_changed(instance):
+        return
+    from .geo import haversine
+
+    # Totems cuya ruta pasaba por esta recepción
+    affected = set(TotemRoute.objects.filter(reception=instance).values_list('totem_id', flat=True))
+    if instance.status == 'Operativo':
+        # Totems para los que la recepción, en su nueva posición, podría entrar al top-k:
+        # la distancia en línea recta es cota inferior de la distancia caminando
+        worst = {}
+        for totem_id, distance in TotemRoute.objects.filter(totem__campus=instance.campus).values_list('totem_id', 'distance'):
+            worst[totem_id] = worst.get(totem_id, []) + [distance]
+        for totem_id, lat, lon in TotemQR.objects.filter(id__in=worst).values_list('id', 'latitude', 'longitude'):
+            distances = worst[totem_id]
+            if len(distances) < TotemRoute.TOP_K or haversine(lat, lon, instance.latitude, instance.longitude) < max(distances):
+                affected.add(totem_id)
+    refresh_totem_routes(affected)
+
+@receiver(pre_delete, sender=ReceptionQR)
+def invalidate_deleted_reception_routes(sender, instance, **kwargs):
+    refresh_totem_routes(TotemRoute.objects.filter(reception=instance).values_list('totem_id', flat=True))
+
+def campus_data_changed(campuses):
+    # Equivalente a las señales para escrituras masivas (bulk_create, update) que no las disparan
+    campuses = set(campuses)
+    for campus in campuses:
+        DataVersion.bump(DataVersion.campus_key(campus))
+    refresh_totem_routes(TotemQR.objects.filter(campus__in=campuses).values_list('id', flat=True))
+
+@receiver(post_save, sender=Path)
+@receiver(post_delete, sender=Path)
+@receiver(post_save, sender=PathPoint)
+@receiver(post_delete, sender=PathPoint)
+def invalidate_campus_routes(sender, instance, **kwargs):
+    # Un cambio en la red de caminos puede alterar cualquier ruta del campus
+    if _deleted_with_path(sender, kwargs):
+        return
+    campuses = {instance.path.campus if sender is PathPoint else instance.campus}
+    if hasattr(instance, '_previous_state'):
+        campuses.add(instance._previous_state['campus'])
+    refresh_totem_routes(TotemQR.objects.filter(campus__in=campuses).values_list('id', flat=True))
+
+@receiver(post_save, sender=Denuncia)
+def update_denuncia_search_vector(sender, instance, update_fields=None, **kwargs):
+    from .search import SEARCH_WEIGHTS, update_search_vector
+    if update_fields is not None and not {field for field, _ in SEARCH_WEIGHTS} & set(update_fields):
+        return
+    update_search_vector(Denuncia.objects.filter(pk=instance.pk))
+
+# Conteos del dashboard (StatsRollup)
+@receiver(pre_save, sender=Denuncia)
+@receiver(pre_save, sender=ReporteAtencion)
+def remember_previous_rollup_key(sender, instance, **kwargs):
+    instance._previous_rollup_key = None
+    if instance.pk:
+        tipo = 'tipo_incidente' if sender is Denuncia else 'tipo_reporte'
+        previous = sender.objects.filter(pk=instance.pk).only('created_at', 'campus', 'estado', tipo).first()
+        if previous is not None:
+            instance._previous_rollup_key = StatsRollup.key_for(previous)
+
+@receiver(post_save, sender=Denuncia)
+@receiver(post_save, sender=ReporteAtencion)
+def update_stats_rollup(sender, instance, **kwargs):
+    key = StatsRollup.key_for(instance)
+    previous = getattr(instance, '_previous_rollup_key', None)
+    if previous == key:
+        return
+    if previous is not None:
+        StatsRollup.adjust(previous, -1)
+    StatsRollup.adjust(key, 1)
+
+@receiver(post_delete, sender=Denuncia)
+@receiver(post_delete, sender=ReporteAtencion)
+def remove_from_stats_rollup(sender, instance, **kwargs):
+    StatsRollup.adjust(StatsRollup.key_for(instance), -1)
+
+# Notificaciones en vivo del dashboard (tasks/events.py)
+@receiver(post_save, sender=ReporteAtencion)
+@receiver(post_delete, sender=ReporteAtencion)
+def publish_reporte_change(sender, instance, signal, **kwargs):
+    from .events import REPORTES_KEY, publish_reporte, reportes_campus_key
+    DataVersion.bump(REPORTES_KEY)
+    # Versión por campus: el contador de no leídos de un campus no se invalida por otro
+    campuses = {instance.campus}
+    previous = getattr(instance, '_previous_rollup_key', None)
+    if previous is not None:
+        campuses.add(previous[2])
+    for campus in campuses:
+        DataVersion.bump(reportes_campus_key(campus))
+    # Tras delete() el pk queda en None, por eso se captura aquí
+    pk, campus = instance.pk, instance.campus
+    reporte = None if signal is post_delete else instance
+    transaction.on_commit(lambda: publish_reporte(pk, campus, reporte))
+
+@receiver(post_delete, sender=Denuncia)
+@receiver(post_delete, sender=ReporteAtencion)
+def record_tombstone(sender, instance, **kwargs):
+    model = 'denuncia' if sender is Denuncia else 'reporte'
+    Tombstone.objects.create(model=model, object_id=instance.pk, campus=instance.campus or '')
+
+@receiver(post_save, sender=ImageUpload)
+@receiver(post_delete, sender=ImageUpload)
+def bump_images_version(sender, instance, **kwargs):
+    DataVersion.bump(DataVersion.images_key(instance.campus))
+
+@receiver(post_delete, sender=ImageUpload)
+def delete_image_variants(sender, instance, **kwargs):
+    from .images import delete_variants
+    # Las variantes de un blob son compartidas: se eliminan con él en gc_image_blobs
+    if instance.blob_id is None:
+        # Solo si la eliminación se confirma
+        transaction.on_commit(lambda: delete_variants(instance))
+
+# Conteo de referencias de ImageBlob
+@receiver(pre_save, sender=ImageUpload)
+def remember_previous_blob(sender, instance, update_fields=None, **kwargs):
+    instance._previous_blob_id = None
+    if instance.pk and (update_fields is None or 'blob' in update_fields):
+        instance._previous_blob_id = ImageUpload.objects.filter(pk=instance.pk).values_list('blob_id', flat=True).first()
+    elif instance.pk:
+        instance._previous_blob_id = instance.blob_id
+
+@receiver(post_save, sender=ImageUpload)
+def count_blob_reference(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_previous_blob_id', None)
+    if previous == instance.blob_id:
+        return
+    if previous is not None:
+        ImageBlob.adjust(previous, -1)
+    if instance.blob_id is not None:
+        ImageBlob.adjust(instance.blob_id, 1)
+
+@receiver(post_delete, sender=ImageUpload)
+def release_blob_reference(sender, instance, **kwargs):
+    if instance.blob_id is not None:
+        ImageBlob.adjust(instance.blob_id, -1)
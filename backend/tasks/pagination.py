@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DenunciaCursorPagination(CursorPagination):
+    # Orden estable: created_at puede repetirse, el id desempata
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Opt-in: sin cursor ni page_size se mantiene la lista completa que
+        # esperan los clientes existentes
+        if self.cursor_query_param not in request.query_params and self.page_size_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        # Con ?ordering= el primer campo (fecha_incidente, updated_at) puede repetirse
+        # mucho: sin desempate las filas con el mismo valor saltan o se repiten entre
+        # páginas. El id, en el mismo sentido, hace el orden total.
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
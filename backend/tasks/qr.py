@@ -0,0 +1,144 @@
+import hashlib
+import json
+from functools import lru_cache
+from io import BytesIO
+from urllib.parse import quote
+import qrcode
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from PIL import Image
+from .images import process_image
+from .models import ImageUpload
+
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+# Se incrementa si cambia la forma de dibujar, para no reutilizar imágenes anteriores
+QR_RENDER_VERSION = 1
+QR_STORAGE_DIR = 'images/qr'
+QR_OUTPUTS = ('png', 'svg')
+QR_MIN_SIZE = 64
+QR_MAX_SIZE = 4096
+
+
+def point_url(point_type, point):
+    # URL pública del mapa que abre el punto; es lo que codifica el QR
+    base = settings.FRONTEND_BASE_URL.rstrip('/')
+    return f"{base}/mapa2/{quote(point.campus or '')}?pointId={point.id}&pointType={point_type}"
+
+
+def make_qr(data, border=QR_BORDER, box_size=QR_BOX_SIZE):
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def render_png(data, box_size=QR_BOX_SIZE, border=QR_BORDER):
+    img = make_qr(data, border=border, box_size=box_size).make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_svg(data, size=None, border=QR_BORDER):
+    # Un path por fila con los tramos de módulos oscuros; el viewBox en módulos
+    # hace que el SVG escale sin pérdida a cualquier tamaño de impresión
+    matrix = make_qr(data, border=border).get_matrix()
+    modules = len(matrix)
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < modules:
+            if row[x]:
+                start = x
+                while x < modules and row[x]:
+                    x += 1
+                path.append(f"M{start},{y}h{x - start}v1h{start - x}z")
+            else:
+                x += 1
+    dimensions = f' width="{size}" height="{size}"' if size else ''
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {modules} {modules}"{dimensions} shape-rendering="crispEdges">'
+        f'<rect width="{modules}" height="{modules}" fill="#fff"/>'
+        f'<path fill="#000" d="{"".join(path)}"/></svg>'
+    )
+    return svg.encode()
+
+
+def render_png_size(data, size, border=QR_BORDER):
+    # Módulos de tamaño entero para bordes nítidos; el sobrante se reparte como margen
+    qr = make_qr(data, border=border)
+    qr.box_size = max(1, size // (qr.modules_count + 2 * border))
+    img = qr.make_image(fill_color="black", back_color="white").get_image().convert('L')
+    if img.size[0] != size:
+        canvas = Image.new('L', (size, size), 255)
+        offset = (size - img.size[0]) // 2
+        canvas.paste(img, (offset, offset))
+        img = canvas
+    buffer = BytesIO()
+    img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=256)
+def render_qr(data, output='png', size=None):
+    """QR en memoria, memorizado por (contenido, formato, tamaño)."""
+    if output == 'svg':
+        return render_svg(data, size=size)
+    if size:
+        return render_png_size(data, size)
+    return render_png(data)
+
+
+def qr_digest(data, **params):
+    """Hash del contenido y los parámetros de dibujo: identifica la imagen resultante."""
+    payload = {'data': data, 'render': QR_RENDER_VERSION, 'box_size': QR_BOX_SIZE, 'border': QR_BORDER}
+    payload.update(params)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def qr_storage_name(digest, extension='png'):
+    return f"{QR_STORAGE_DIR}/{digest[:2]}/{digest}.{extension}"
+
+
+def point_qr_digest(point_type, point):
+    return qr_digest(point_url(point_type, point))
+
+
+def store_point_qr(point_type, point, user=None, content=None):
+    """ImageUpload con el QR vigente del punto; solo dibuja y guarda si no existe.
+
+    content permite pasar el PNG ya dibujado (p. ej. por el lote de tasks/qr_batch.py).
+    Devuelve (image_upload, created).
+    """
+    data = point_url(point_type, point)
+    digest = qr_digest(data)
+    existing = ImageUpload.objects.filter(point_type=point_type, point_id=point.id, qr_hash=digest).first()
+    if existing is not None:
+        return existing, False
+
+    name = qr_storage_name(digest)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content or render_png(data)))
+    try:
+        with transaction.atomic():
+            upload = ImageUpload.objects.create(
+                point_id=point.id,
+                point_type=point_type,
+                campus=point.campus or '',
+                image=name,
+                uploaded_by=user,
+                qr_hash=digest,
+            )
+    except IntegrityError:
+        # Otra petición lo creó al mismo tiempo
+        return ImageUpload.objects.get(point_type=point_type, point_id=point.id, qr_hash=digest), False
+    # Solo metadatos: el QR no se redimensiona, se pide al tamaño justo con /qr/
+    return process_image(upload, with_variants=False), True
@@ -0,0 +1,173 @@
+import logging
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import urljoin
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from PIL import Image, ImageDraw, ImageFont
+from .models import QRBatchJob, ReceptionQR, TotemQR
+from .qr import point_url, qr_digest, qr_storage_name, render_png, store_point_qr
+
+logger = logging.getLogger(__name__)
+
+# Hoja A4 a 150 dpi con una grilla de 2 x 3 QRs y el nombre del punto bajo cada uno
+PAGE_SIZE = (1240, 1754)
+PAGE_DPI = 150
+PAGE_MARGIN = 90
+PAGE_COLUMNS = 2
+PAGE_ROWS = 3
+LABEL_HEIGHT = 60
+# Cada cuántos QRs dibujados se actualiza el progreso en la base de datos
+PROGRESS_EVERY = 10
+
+
+def batch_points(campus):
+    points = [('totem', point) for point in TotemQR.objects.filter(campus=campus).order_by('id')]
+    points += [('reception', point) for point in ReceptionQR.objects.filter(campus=campus).order_by('id')]
+    return points
+
+
+def render_pool(workers=None):
+    # spawn: los procesos hijos no heredan las conexiones ni los hilos del proceso padre
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers or settings.QR_BATCH_WORKERS, mp_context=context, initializer=django.setup)
+
+
+def render_all(urls, pool):
+    return pool.map(render_png, urls, chunksize=max(1, len(urls) // (settings.QR_BATCH_WORKERS * 4)))
+
+
+def entry_name(point_type, point):
+    return f"{point_type}_{point.id}_{slugify(point.name) or 'qr'}.png"
+
+
+def build_zip(entries):
+    buffer = BytesIO()
+    # Los PNG ya vienen comprimidos
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, _, content in entries:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def build_pdf(entries):
+    """PDF multipágina listo para imprimir, con los QRs en grilla y su etiqueta."""
+    cell_width = (PAGE_SIZE[0] - 2 * PAGE_MARGIN) // PAGE_COLUMNS
+    cell_height = (PAGE_SIZE[1] - 2 * PAGE_MARGIN) // PAGE_ROWS
+    qr_side = min(cell_width, cell_height - LABEL_HEIGHT) - 20
+    font = ImageFont.load_default(size=28)
+    per_page = PAGE_COLUMNS * PAGE_ROWS
+    pages = []
+    for start in range(0, max(len(entries), 1), per_page):
+        page = Image.new('RGB', PAGE_SIZE, 'white')
+        draw = ImageDraw.Draw(page)
+        for i, (_, label, content) in enumerate(entries[start:start + per_page]):
+            column, row = i % PAGE_COLUMNS, i // PAGE_COLUMNS
+            x = PAGE_MARGIN + column * cell_width
+            y = PAGE_MARGIN + row * cell_height
+            qr = Image.open(BytesIO(content)).convert('RGB').resize((qr_side, qr_side), Image.NEAREST)
+            page.paste(qr, (x + (cell_width - qr_side) // 2, y))
+            draw.text((x + cell_width // 2, y + qr_side + 10), label, fill='black', font=font, anchor='ma')
+        pages.append(page)
+    buffer = BytesIO()
+    pages[0].save(buffer, format='PDF', save_all=True, append_images=pages[1:], resolution=PAGE_DPI)
+    return buffer.getvalue()
+
+
+def heartbeat(job_id, **fields):
+    QRBatchJob.objects.filter(pk=job_id).update(heartbeat_at=timezone.now(), **fields)
+
+
+def claim_job():
+    """Toma el job pendiente más antiguo y lo marca 'running'; None si no hay."""
+    with transaction.atomic():
+        job = QRBatchJob.objects.select_for_update(skip_locked=True).filter(status='pending').order_by('created_at').first()
+        if job is not None:
+            job.status = 'running'
+            job.heartbeat_at = timezone.now()
+            job.save(update_fields=['status', 'heartbeat_at'])
+    return job
+
+
+def expire_stale_jobs(timeout=None):
+    # Jobs cuyo worker murió (reinicio, deploy) a mitad de camino
+    timeout = timedelta(seconds=timeout or settings.QR_BATCH_HEARTBEAT_TIMEOUT)
+    now = timezone.now()
+    return QRBatchJob.objects.filter(status='running', heartbeat_at__lt=now - timeout).update(
+        status='failed', error='El proceso que generaba el lote se detuvo', finished_at=now,
+    )
+
+
+def run_qr_batch(job_id, base_url=None, workers=None, pool=None):
+    """Genera los QRs de todos los puntos del campus del job, el ZIP y el PDF opcional.
+
+    Los QRs ya guardados (mismo hash de contenido) se leen del storage; solo los
+    faltantes se dibujan en paralelo en pool, el del worker que toma los jobs, o
+    en uno propio de workers procesos si no se pasa.
+    """
+    job = QRBatchJob.objects.get(pk=job_id)
+    base_url = base_url or job.base_url
+    try:
+        points = batch_points(job.campus)
+        job.status = 'running'
+        job.total = len(points)
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'total', 'heartbeat_at'])
+
+        contents = [None] * len(points)
+        missing = []
+        for i, (point_type, point) in enumerate(points):
+            url = point_url(point_type, point)
+            name = qr_storage_name(qr_digest(url))
+            if default_storage.exists(name):
+                with default_storage.open(name) as stored:
+                    contents[i] = stored.read()
+            else:
+                missing.append((i, url))
+        completed = len(points) - len(missing)
+        heartbeat(job_id, completed=completed)
+
+        if missing:
+            own_pool = pool is None
+            pool = pool or render_pool(workers)
+            try:
+                for (i, _), content in zip(missing, render_all([url for _, url in missing], pool)):
+                    contents[i] = content
+                    completed += 1
+                    if completed % PROGRESS_EVERY == 0:
+                        heartbeat(job_id, completed=completed)
+            finally:
+                if own_pool:
+                    pool.shutdown()
+
+        entries = []
+        for i, ((point_type, point), content) in enumerate(zip(points, contents)):
+            upload, _ = store_point_qr(point_type, point, user=job.created_by, content=content)
+            qr_image = urljoin(base_url, default_storage.url(upload.image.name))
+            if point.qr_image != qr_image:
+                point.qr_image = qr_image
+                point.save(update_fields=['qr_image'])
+            entries.append((entry_name(point_type, point), point.name, content))
+            if i % PROGRESS_EVERY == 0:
+                heartbeat(job_id)
+
+        file_name = f"qr_{slugify(job.campus) or 'campus'}_{job.pk}"
+        job.archive.save(f"{file_name}.zip", ContentFile(build_zip(entries)), save=False)
+        if job.include_pdf:
+            heartbeat(job_id)
+            job.pdf.save(f"{file_name}.pdf", ContentFile(build_pdf(entries)), save=False)
+        job.status = 'done'
+        job.completed = len(points)
+        job.finished_at = timezone.now()
+        job.save()
+    except Exception as e:
+        logger.exception("Falló el lote de QRs %s", job_id)
+        QRBatchJob.objects.filter(pk=job_id).update(status='failed', error=str(e), finished_at=timezone.now())
@@ -0,0 +1,215 @@
+import heapq
+import itertools
+from django.db import IntegrityError, transaction
+from .geo import GridIndex, haversine, reception_index
+from .models import DataVersion, PathPoint, ReceptionQR, TotemQR, TotemRoute
+
+# Vértices de caminos distintos a menos de esta distancia se consideran el mismo nodo
+SNAP_TOLERANCE_M = 3.0
+# Máxima caminata en línea recta entre un totem o recepción y la red de caminos
+MAX_CONNECTOR_M = 150.0
+
+
+class CampusGraph:
+    """Grafo caminable de un campus construido a partir de los Path dibujados."""
+
+    def __init__(self):
+        self.nodes = []
+        self.adjacency = []
+        self.vertex_index = GridIndex()
+        self.receptions = []
+        # nodo -> [(índice de recepción, metros de conexión)]
+        self.attachments = {}
+        self.reception_index = None
+
+    @classmethod
+    def build(cls, polylines, receptions):
+        graph = cls()
+        for polyline in polylines:
+            previous = None
+            for lat, lon in polyline:
+                node = graph._add_vertex(lat, lon)
+                if previous is not None and previous != node:
+                    graph._add_edge(previous, node)
+                previous = node
+        graph.receptions = list(receptions)
+        graph.reception_index = GridIndex.build(
+            (i, reception['latitude'], reception['longitude'], reception)
+            for i, reception in enumerate(graph.receptions)
+        )
+        for i, reception in enumerate(graph.receptions):
+            nearest = graph.vertex_index.nearest(reception['latitude'], reception['longitude'])
+            if nearest and nearest[0][0] <= MAX_CONNECTOR_M:
+                distance, node, _ = nearest[0]
+                graph.attachments.setdefault(node, []).append((i, distance))
+        return graph
+
+    def _add_vertex(self, lat, lon):
+        nearest = self.vertex_index.nearest(lat, lon)
+        if nearest and nearest[0][0] <= SNAP_TOLERANCE_M:
+            return nearest[0][1]
+        node = len(self.nodes)
+        self.nodes.append((lat, lon))
+        self.adjacency.append({})
+        self.vertex_index.insert(node, lat, lon)
+        return node
+
+    def _add_edge(self, a, b):
+        weight = haversine(*self.nodes[a], *self.nodes[b])
+        self.adjacency[a][b] = weight
+        self.adjacency[b][a] = weight
+
+    def route(self, lat, lon):
+        routes = self.routes(lat, lon, k=1)
+        return routes[0] if routes else None
+
+    def routes(self, lat, lon, k=1):
+        """Caminos más cortos desde (lat, lon) hasta las k recepciones más cercanas.
+
+        Dijkstra multi-destino: cada recepción entra al heap como un destino virtual
+        con el costo acumulado más su tramo de conexión, de modo que las recepciones
+        salen del heap en orden de distancia caminando.
+        """
+        found = []
+        seen = set()
+        heap = []
+        # Desempate a igual costo: los destinos directos (nodo None) no se comparan con nodos
+        order = itertools.count()
+        distances = {}
+        previous = {}
+        for distance, node, _ in self.vertex_index.nearest(lat, lon, k=3):
+            if distance <= MAX_CONNECTOR_M and distance < distances.get(node, float('inf')):
+                distances[node] = distance
+                heapq.heappush(heap, (distance, 0, next(order), node))
+        # Recepciones lo bastante cerca como para ir directo sin pasar por la red
+        for distance, i, _ in self.reception_index.nearest(lat, lon, k=3):
+            if distance <= MAX_CONNECTOR_M:
+                heapq.heappush(heap, (distance, 1, next(order), (i, None)))
+
+        while heap:
+            cost, is_target, _, item = heapq.heappop(heap)
+            if is_target:
+                reception_id, node = item
+                if reception_id not in seen:
+                    seen.add(reception_id)
+                    found.append(self._build_route(lat, lon, cost, self.receptions[reception_id], node, previous))
+                    if len(found) == k:
+                        break
+                continue
+            if cost > distances.get(item, float('inf')):
+                continue
+            for i, connector in self.attachments.get(item, ()):
+                heapq.heappush(heap, (cost + connector, 1, next(order), (i, item)))
+            for neighbor, weight in self.adjacency[item].items():
+                candidate = cost + weight
+                if candidate < distances.get(neighbor, float('inf')):
+                    distances[neighbor] = candidate
+                    previous[neighbor] = item
+                    heapq.heappush(heap, (candidate, 0, next(order), neighbor))
+        return found
+
+    def _build_route(self, lat, lon, distance, reception, node, previous):
+        nodes = []
+        while node is not None:
+            nodes.append(node)
+            node = previous.get(node)
+        coordinates = [(lat, lon)] + [self.nodes[n] for n in reversed(nodes)]
+        coordinates.append((reception['latitude'], reception['longitude']))
+        return {'reception': reception, 'distance': distance, 'coordinates': coordinates}
+
+
+_graphs = {}
+
+
+def campus_graph(campus, operative_only=True, version=None):
+    # Se compila una vez por versión de datos del campus y se reutiliza entre consultas
+    if version is None:
+        version = DataVersion.get(DataVersion.campus_key(campus))
+    cache_key = (campus, operative_only)
+    cached = _graphs.get(cache_key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    polylines = {}
+    points = PathPoint.objects.filter(path__campus=campus).order_by('path_id', 'order')
+    for path_id, lat, lon in points.values_list('path_id', 'latitude', 'longitude'):
+        polylines.setdefault(path_id, []).append((lat, lon))
+    receptions = ReceptionQR.objects.filter(campus=campus)
+    if operative_only:
+        receptions = receptions.filter(status='Operativo')
+    graph = CampusGraph.build(
+        polylines.values(),
+        receptions.values('id', 'name', 'latitude', 'longitude', 'status'),
+    )
+    _graphs[cache_key] = (version, graph)
+    return graph
+
+
+def compute_totem_routes(totem):
+    """Recalcula y guarda las filas de TotemRoute de un totem."""
+    key = DataVersion.campus_key(totem.campus)
+    version = DataVersion.get(key)
+    routes = campus_graph(totem.campus, version=version).routes(totem.latitude, totem.longitude, k=TotemRoute.TOP_K)
+    # Recepciones sin conexión a la red completan el top-k en línea recta
+    if len(routes) < TotemRoute.TOP_K:
+        reached = {route['reception']['id'] for route in routes}
+        nearest = reception_index(totem.campus).nearest(totem.latitude, totem.longitude, k=TotemRoute.TOP_K + len(reached))
+        for distance, reception_id, reception in nearest:
+            if reception_id not in reached and len(routes) < TotemRoute.TOP_K:
+                routes.append({
+                    'reception': reception,
+                    'distance': distance,
+                    'coordinates': [(totem.latitude, totem.longitude), (reception['latitude'], reception['longitude'])],
+                })
+
+    rows = [
+        TotemRoute(
+            totem=totem,
+            # La recepción ya viene con la ruta: quien use las filas no la vuelve a consultar
+            reception=ReceptionQR(**route['reception']),
+            rank=rank,
+            distance=route['distance'],
+            coordinates=[list(point) for point in route['coordinates']],
+            version=version,
+        )
+        for rank, route in enumerate(routes)
+    ]
+    try:
+        with transaction.atomic():
+            # Dos primeros escaneos simultáneos del mismo totem se turnan con el bloqueo
+            # de su fila, y el de la versión impide que el campus cambie entre la
+            # comprobación y la escritura
+            if not TotemQR.objects.select_for_update().filter(pk=totem.pk).values_list('id', flat=True):
+                return rows
+            current = DataVersion.objects.select_for_update().filter(key=key).values_list('version', flat=True).first() or 0
+            # Si los datos del campus cambiaron durante el cálculo no se guardan filas obsoletas
+            if current == version:
+                TotemRoute.objects.filter(totem=totem).delete()
+                TotemRoute.objects.bulk_create(rows)
+    except IntegrityError:
+        # Sin bloqueos de fila (SQLite) otra petición pudo guardarlas antes; las
+        # calculadas siguen siendo válidas para responder
+        pass
+    return rows
+
+
+def schedule_totem_routes(totem_ids):
+    """Recalcula las rutas de los totems al confirmar la transacción en curso,
+    para que el escaneo encuentre la tabla lista. Si falla se registra y el
+    escaneo vuelve a calcularlas.
+    """
+    totem_ids = set(totem_ids)
+    transaction.on_commit(lambda: recompute_totem_routes(totem_ids), robust=True)
+
+
+def recompute_totem_routes(totem_ids):
+    # Varias escrituras de una transacción (p. ej. puntos guardados de a uno) encolan
+    # los mismos totems: los que ya tienen filas de la versión vigente se omiten
+    totems = list(TotemQR.objects.filter(id__in=totem_ids).order_by('campus', 'id'))
+    versions = {campus: DataVersion.get(DataVersion.campus_key(campus)) for campus in {totem.campus for totem in totems}}
+    current = set(
+        TotemRoute.objects.filter(totem_id__in=totem_ids).values_list('totem_id', 'version').distinct()
+    )
+    for totem in totems:
+        if (totem.pk, versions[totem.campus]) not in current:
+            compute_totem_routes(totem)
@@ -0,0 +1,104 @@
+import re
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.html import escape
+
+SEARCH_CONFIG = 'spanish'
+# Peso por campo: el nombre de la persona pesa más que el texto libre
+SEARCH_WEIGHTS = [
+    ('nombre', 'A'),
+    ('apellido', 'A'),
+    ('lugar_incidente', 'B'),
+    ('descripcion', 'C'),
+]
+WEIGHT_VALUES = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+SNIPPET_WORDS = 20
+# Marcadores internos del resaltado; se reemplazan por <mark> después de escapar el texto
+START_SEL = '\x02'
+STOP_SEL = '\x03'
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector():
+    vector = None
+    for field, weight in SEARCH_WEIGHTS:
+        part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def update_search_vector(queryset):
+    # update() no dispara señales ni toca updated_at
+    if uses_postgres():
+        queryset.update(search_vector=search_vector())
+
+
+def _mark(text):
+    return escape(text).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>')
+
+
+def search_denuncias(queryset, q, limit=20):
+    """Denuncias que coinciden con q, de más a menos relevante.
+
+    Devuelve tuplas (denuncia, rank, snippet); el snippet es HTML escapado con
+    los términos encontrados dentro de <mark>.
+    """
+    if uses_postgres():
+        query = SearchQuery(q, search_type='websearch', config=SEARCH_CONFIG)
+        results = (
+            queryset.filter(search_vector=query)
+            .annotate(
+                rank=SearchRank(F('search_vector'), query),
+                snippet=SearchHeadline(
+                    'descripcion', query, config=SEARCH_CONFIG,
+                    start_sel=START_SEL, stop_sel=STOP_SEL, max_words=SNIPPET_WORDS, min_words=5,
+                ),
+            )
+            .order_by('-rank', '-created_at')[:limit]
+        )
+        return [(denuncia, denuncia.rank, _mark(denuncia.snippet)) for denuncia in results]
+    return _fallback_search(queryset, q, limit)
+
+
+def _terms(q):
+    # Las comillas y operadores de la sintaxis web se ignoran en el modo simple
+    return [term for term in re.findall(r'-?\w+', q.lower()) if not term.startswith('-') and term != 'or']
+
+
+def _fallback_search(queryset, q, limit):
+    # Sin Postgres (tests, desarrollo con SQLite): todos los términos deben aparecer
+    # en algún campo y el rank es la frecuencia ponderada por campo
+    terms = _terms(q)
+    if not terms:
+        return []
+    for term in terms:
+        condition = Q()
+        for field, _ in SEARCH_WEIGHTS:
+            condition |= Q(**{f'{field}__icontains': term})
+        queryset = queryset.filter(condition)
+
+    scored = []
+    for denuncia in queryset:
+        rank = 0.0
+        for field, weight in SEARCH_WEIGHTS:
+            text = (getattr(denuncia, field) or '').lower()
+            rank += WEIGHT_VALUES[weight] * sum(text.count(term) for term in terms)
+        scored.append((denuncia, rank, _snippet(denuncia.descripcion or '', terms)))
+    scored.sort(key=lambda item: (-item[1], -item[0].created_at.timestamp()))
+    return scored[:limit]
+
+
+def _snippet(text, terms):
+    words = text.split()
+    first = next((i for i, word in enumerate(words) if any(term in word.lower() for term in terms)), 0)
+    start = max(0, first - SNIPPET_WORDS // 4)
+    window = []
+    for word in words[start:start + SNIPPET_WORDS]:
+        if any(term in word.lower() for term in terms):
+            word = f'{START_SEL}{word}{STOP_SEL}'
+        window.append(word)
+    return _mark(' '.join(window))
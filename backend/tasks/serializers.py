@@ -1,6 +1,30 @@
 from rest_framework import serializers
-from .models import TotemQR, ReceptionQR, Path, PathPoint, Denuncia, UserProfile, ImageUpload, ReporteAtencion
+from .models import TotemQR, ReceptionQR, Path, PathPoint, Denuncia, UserProfile, ImageUpload, ReporteAtencion, QRBatchJob, campus_data_changed
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .images import IMAGE_FORMATS
+from .geo import encode_polyline, simplify
+
+# Puntos por INSERT al guardar caminos con bulk_create
+PATH_POINT_BATCH_SIZE = 1000
+GEOMETRY_FORMATS = ('encoded', 'flat')
+
+
+def geometry_options(query_params):
+    # Opciones de ?geometry=encoded|flat y ?tolerance=<metros> para el contexto de PathSerializer
+    geometry = query_params.get('geometry')
+    if geometry is None:
+        return {}
+    if geometry not in GEOMETRY_FORMATS:
+        raise serializers.ValidationError({'geometry': f"Formato inválido, opciones: {', '.join(GEOMETRY_FORMATS)}."})
+    try:
+        tolerance = float(query_params.get('tolerance', 0))
+    except ValueError:
+        tolerance = -1
+    if not 0 <= tolerance < 1000:
+        raise serializers.ValidationError({'tolerance': 'Debe ser un número de metros entre 0 y 1000.'})
+    return {'geometry': geometry, 'tolerance': tolerance}
 
 class PathPointSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,14 +39,67 @@ class PathSerializer(serializers.ModelSerializer):
         model = Path
         fields = ['id', 'name', 'points', 'campus']
 
+    def to_representation(self, instance):
+        # Geometría compacta opcional: polyline codificada o arreglo plano [lat, lon, lat, lon, ...]
+        geometry = self.context.get('geometry')
+        if geometry is None:
+            return super().to_representation(instance)
+        coordinates = simplify([(point.latitude, point.longitude) for point in instance.points.all()], self.context.get('tolerance', 0))
+        data = {'id': instance.id, 'name': instance.name, 'campus': instance.campus}
+        if geometry == 'encoded':
+            data['polyline'] = encode_polyline(coordinates)
+        else:
+            data['coordinates'] = [value for coordinate in coordinates for value in coordinate]
+        return data
+
+    @transaction.atomic
     def create(self, validated_data):
         points_data = validated_data.pop('points')
         campus = validated_data.pop('campus', None)
-        path = Path.objects.create(**validated_data, campus=campus)
-        for point_data in points_data:
-            PathPoint.objects.create(path=path, **point_data)
+        path = Path.objects.create(**validated_data, campus=campus or '')
+        PathPoint.objects.bulk_create(
+            [PathPoint(path=path, **point_data) for point_data in points_data],
+            batch_size=PATH_POINT_BATCH_SIZE,
+        )
         return path
 
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        # Los puntos enviados reemplazan a los existentes en bloque
+        points_data = validated_data.pop('points', None)
+        if 'campus' in validated_data:
+            validated_data['campus'] = validated_data['campus'] or ''
+        instance = super().update(instance, validated_data)
+        if points_data is not None:
+            # Sin señales por punto: el post_save del camino ya invalidó su campus
+            points = instance.points.all()
+            points._raw_delete(points.db)
+            PathPoint.objects.bulk_create(
+                [PathPoint(path=instance, **point_data) for point_data in points_data],
+                batch_size=PATH_POINT_BATCH_SIZE,
+            )
+            if hasattr(instance, '_prefetched_objects_cache'):
+                instance._prefetched_objects_cache.pop('points', None)
+        return instance
+
+    @staticmethod
+    @transaction.atomic
+    def bulk_create(validated_paths):
+        # Importación masiva: un INSERT para los caminos y uno por lote de puntos
+        paths = Path.objects.bulk_create([
+            Path(name=data['name'], campus=data.get('campus') or '') for data in validated_paths
+        ])
+        PathPoint.objects.bulk_create(
+            [
+                PathPoint(path=path, **point_data)
+                for path, data in zip(paths, validated_paths)
+                for point_data in data['points']
+            ],
+            batch_size=PATH_POINT_BATCH_SIZE,
+        )
+        campus_data_changed(path.campus for path in paths)
+        return paths
+
 class TotemQRSerializer(serializers.ModelSerializer):
     class Meta:
         model = TotemQR
@@ -36,7 +113,8 @@ class ReceptionQRSerializer(serializers.ModelSerializer):
 class DenunciaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Denuncia
-        fields = '__all__'
+        exclude = ['search_vector']
+        read_only_fields = ['jira_key']
 
 class UserProfileSerializer(serializers.ModelSerializer):
     # Campos de User
@@ -71,10 +149,42 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
 class ImageUploadSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(max_length=None, use_url=True)
+    variants = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    available = serializers.SerializerMethodField()
 
     class Meta:
         model = ImageUpload
-        fields = ['id', 'point_id', 'point_type', 'campus', 'image', 'uploaded_at']
+        fields = [
+            'id', 'point_id', 'point_type', 'campus', 'image', 'uploaded_at', 'variants', 'srcset',
+            'available', 'width', 'height', 'size', 'sha256', 'placeholder',
+        ]
+        read_only_fields = ['width', 'height', 'size', 'sha256', 'placeholder']
+
+    def _url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_variants(self, obj):
+        # {thumb|medium|full: {width, height, webp, jpeg}} con URLs absolutas; vacío si
+        # la imagen no tiene variantes (QRs, imágenes que no se pudieron procesar)
+        return {
+            variant: {key: self._url(value) if key in IMAGE_FORMATS else value for key, value in entry.items()}
+            for variant, entry in (obj.variants or {}).items()
+        }
+
+    def get_available(self, obj):
+        # El servidor leyó el archivo como imagen al procesarlo; el cliente no necesita
+        # verificarlo. Las que esperan al worker se muestran con el original
+        return obj.width is not None or obj.processed_at is None
+
+    def get_srcset(self, obj):
+        # Listo para <source type="image/webp" srcset> y <img srcset> respectivamente
+        return {
+            extension: ', '.join(f"{self._url(entry[extension])} {entry['width']}w" for entry in obj.variants.values())
+            for extension in IMAGE_FORMATS
+        } if obj.variants else {}
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -84,4 +194,17 @@ class ImageUploadSerializer(serializers.ModelSerializer):
 class ReporteAtencionSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReporteAtencion
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class QRBatchJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QRBatchJob
+        fields = ['id', 'campus', 'include_pdf', 'status', 'total', 'completed', 'progress', 'error', 'created_at', 'finished_at']
+        read_only_fields = ['status', 'total', 'completed', 'error', 'created_at', 'finished_at']
+
+    def get_progress(self, obj):
+        if obj.status == 'done':
+            return 1.0
+        return round(obj.completed / obj.total, 3) if obj.total else 0.0
@@ -0,0 +1,45 @@
+import hashlib
+import json
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import DataVersion, TotemQR, ReceptionQR, Path
+from .serializers import TotemQRSerializer, ReceptionQRSerializer, PathSerializer
+
+# Cambiar al modificar la forma del payload para no servir ETags de la versión anterior
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+def _variant(campus, version, options):
+    # Identifica campus, versión y formato de geometría (?geometry, ?tolerance)
+    options = options or {}
+    variant = f"{SNAPSHOT_FORMAT}:{campus}:{version}:{options.get('geometry', '')}:{options.get('tolerance', 0)}"
+    return hashlib.sha1(variant.encode()).hexdigest()
+
+
+def snapshot_etag(campus, version, options=None):
+    return f'"{_variant(campus, version, options)}"'
+
+
+def build_snapshot(campus, options=None):
+    paths = Path.objects.filter(campus=campus).prefetch_related('points')
+    data = {
+        'campus': campus,
+        'totems': TotemQRSerializer(TotemQR.objects.filter(campus=campus), many=True).data,
+        'receptions': ReceptionQRSerializer(ReceptionQR.objects.filter(campus=campus), many=True).data,
+        'paths': PathSerializer(paths, many=True, context=options or {}).data,
+    }
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+
+
+def get_snapshot(campus, version=None, options=None):
+    # El payload se guarda ya serializado bajo la versión vigente del campus, de modo
+    # que cualquier escritura deja la entrada anterior inalcanzable.
+    if version is None:
+        version = DataVersion.get(DataVersion.campus_key(campus))
+    key = f"campus_snapshot:{_variant(campus, version, options)}"
+    content = cache.get(key)
+    if content is None:
+        content = build_snapshot(campus, options)
+        cache.set(key, content, SNAPSHOT_TIMEOUT)
+    return snapshot_etag(campus, version, options), content
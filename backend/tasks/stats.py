@@ -0,0 +1,103 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncDay, TruncMonth, TruncWeek
+from .models import Denuncia, ReporteAtencion, StatsRollup
+
+BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+# kind del rollup -> (modelo, campo de tipo, clave en la respuesta)
+SOURCES = {
+    'denuncia': (Denuncia, 'tipo_incidente', 'denuncias'),
+    'reporte': (ReporteAtencion, 'tipo_reporte', 'reportes'),
+}
+
+
+def rebuild_rollups():
+    """Regenera StatsRollup completo a partir de las denuncias y reportes."""
+    rows = []
+    for kind, (model, tipo_field, _) in SOURCES.items():
+        groups = (
+            model.objects.annotate(day=TruncDate('created_at'))
+            .values('day', 'campus', tipo_field, 'estado')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for group in groups:
+            rows.append(StatsRollup(
+                kind=kind,
+                day=group['day'],
+                campus=group['campus'] or '',
+                tipo=group[tipo_field] or '',
+                estado=group['estado'] or '',
+                count=group['total'],
+            ))
+    with transaction.atomic():
+        StatsRollup.objects.all().delete()
+        StatsRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def move_estado(kind, queryset, estado):
+    """Ajusta StatsRollup para un update() masivo que llevará queryset a `estado`.
+
+    Debe llamarse en la misma transacción y antes del update, que no dispara señales.
+    """
+    _, tipo_field, _ = SOURCES[kind]
+    groups = (
+        queryset.exclude(estado=estado)
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'campus', tipo_field, 'estado')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for group in groups:
+        key = (kind, group['day'], group['campus'] or '', group[tipo_field] or '')
+        StatsRollup.adjust(key + (group['estado'] or '',), -group['total'])
+        StatsRollup.adjust(key + (estado,), group['total'])
+
+
+def dashboard_stats(bucket='week', campus=None, desde=None, hasta=None):
+    """Totales por campus, tipo y estado más la serie temporal, para denuncias y reportes."""
+    rollups = StatsRollup.objects.filter(count__gt=0)
+    if campus:
+        rollups = rollups.filter(campus=campus)
+    if desde is not None:
+        rollups = rollups.filter(day__gte=desde)
+    if hasta is not None:
+        rollups = rollups.filter(day__lte=hasta)
+    # Una sola consulta agrupada; el resto se suma en Python sobre pocas filas
+    groups = (
+        rollups.annotate(period=BUCKETS[bucket]('day'))
+        .values('kind', 'period', 'campus', 'tipo', 'estado')
+        .annotate(total=Sum('count'))
+        .order_by()
+    )
+    result = {}
+    for kind, (_, _, name) in SOURCES.items():
+        result[name] = {
+            'total': 0,
+            'por_campus': defaultdict(int),
+            'por_tipo': defaultdict(int),
+            'por_estado': defaultdict(int),
+            'series': defaultdict(int),
+        }
+    for group in groups:
+        stats = result[SOURCES[group['kind']][2]]
+        total = group['total']
+        stats['total'] += total
+        stats['por_campus'][group['campus']] += total
+        stats['por_tipo'][group['tipo']] += total
+        stats['por_estado'][group['estado']] += total
+        stats['series'][group['period']] += total
+    for stats in result.values():
+        for field in ('por_campus', 'por_tipo', 'por_estado'):
+            stats[field] = dict(stats[field])
+        stats['series'] = [
+            {'periodo': period.isoformat(), 'total': total}
+            for period, total in sorted(stats['series'].items())
+        ]
+    return result
@@ -1,3 +1,1610 @@
-from django.test import TestCase
+import asyncio
+import base64
+import importlib
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from PIL import Image
+from .models import Path, PathPoint, TotemQR, TotemRoute, ReceptionQR, Denuncia, ImageUpload, ReporteAtencion, JiraOutbox, StatsRollup, DataVersion, QRBatchJob, ImageBlob, Tombstone
+from .serializers import PATH_POINT_BATCH_SIZE, ImageUploadSerializer
+from .geo import METERS_PER_DEGREE, GridIndex, _reception_indexes, decode_polyline, linear_nearest, reception_index
+from . import jira
+from .events import REPORTES_KEY, broker
+from .qr import point_url, qr_digest
+from .qr_batch import claim_job, expire_stale_jobs, run_qr_batch
+from .routing import _graphs, campus_graph, compute_totem_routes
+from .images import read_image
+from .uploads import store_blob
+from .management.commands.gc_image_blobs import Command as GcImageBlobsCommand
 
-# Create your tests here.
+
+def admin_client():
+    user = User.objects.create_user(username='admin', password='admin')
+    user.userprofile.role = 'admin'
+    user.userprofile.save()
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def path_payload(n, name='Camino', campus='Curico'):
+    return {
+        'name': name,
+        'campus': campus,
+        'points': [
+            {'latitude': -34.98 + i * 1e-5, 'longitude': -71.23, 'order': i}
+            for i in range(n)
+        ],
+    }
+
+
+class CampusSnapshotTests(TestCase):
+    def setUp(self):
+        self.client = admin_client()
+        self.path = Path.objects.create(name='Camino', campus='Curico')
+        self.points = PathPoint.objects.bulk_create([
+            PathPoint(path=self.path, latitude=-34.98, longitude=-71.23 + i * 1e-4, order=i) for i in range(3)
+        ])
+        self.url = '/api/campus/Curico/snapshot/'
+
+    def test_not_modified_until_a_path_changes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual([len(path['points']) for path in response.json()['paths']], [3])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        # Escrituras de otro campus no cambian la versión
+        Path.objects.create(name='Otro', campus='Talca')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.patch(f'/api/caminos/{self.path.id}/', {'name': 'Renombrado'}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['paths'][0]['name'], 'Renombrado')
+
+    def test_deleting_a_point_invalidates_snapshot_and_routes(self):
+        ReceptionQR.objects.create(latitude=-34.9801, longitude=-71.2298, name='Norte', campus='Curico')
+        totem = TotemQR.objects.create(latitude=-34.9801, longitude=-71.2301, campus='Curico')
+        compute_totem_routes(totem)
+        etag = self.client.get(self.url)['ETag']
+
+        PathPoint.objects.get(pk=self.points[-1].pk).delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(path['points']) for path in response.json()['paths']], [2])
+        self.assertFalse(TotemRoute.objects.filter(totem=totem).exists())
+
+        # Al borrar el camino sus puntos no invalidan uno por uno
+        with CaptureQueriesContext(connection) as context:
+            self.path.delete()
+        self.assertEqual(len([query for query in context.captured_queries if 'tasks_dataversion' in query['sql']]), 1)
+        self.assertEqual(self.client.get(self.url).json()['paths'], [])
+
+
+class PathBulkWriteTests(TestCase):
+    # Las consultas por escritura de un camino no deben crecer con la cantidad de
+    # puntos salvo un INSERT por lote de PATH_POINT_BATCH_SIZE.
+    def setUp(self):
+        self.client = admin_client()
+        # La primera escritura del campus crea su DataVersion; no cuenta para la medición
+        self.client.post('/api/caminos/', path_payload(1), format='json')
+
+    def count_queries(self, method, url, payload):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, payload, format='json')
+        self.assertIn(response.status_code, (200, 201), response.content[:500])
+        return len(context.captured_queries), response
+
+    def batches(self, n):
+        # SQLite limita los parámetros por consulta y puede usar lotes más chicos
+        fields = [field for field in PathPoint._meta.concrete_fields if not field.primary_key]
+        batch_size = min(PATH_POINT_BATCH_SIZE, connection.ops.bulk_batch_size(fields, range(n)))
+        return -(-n // batch_size)
+
+    def test_create_query_count(self):
+        baseline, _ = self.count_queries('post', '/api/caminos/', path_payload(10))
+        for n in (1000, 10000):
+            queries, response = self.count_queries('post', '/api/caminos/', path_payload(n))
+            self.assertEqual(queries, baseline + self.batches(n) - 1, f"{n} puntos")
+            self.assertEqual(PathPoint.objects.filter(path_id=response.data['id']).count(), n)
+
+    def test_update_replaces_points(self):
+        _, response = self.count_queries('post', '/api/caminos/', path_payload(10))
+        url = f"/api/caminos/{response.data['id']}/"
+        baseline, _ = self.count_queries('put', url, path_payload(10, name='Nuevo'))
+        queries, response = self.count_queries('put', url, path_payload(10000, name='Nuevo'))
+        self.assertEqual(queries, baseline + self.batches(10000) - 1)
+        self.assertEqual(response.data['name'], 'Nuevo')
+        self.assertEqual(len(response.data['points']), 10000)
+
+        queries, response = self.count_queries('patch', url, {'name': 'Renombrado'})
+        self.assertEqual(len(response.data['points']), 10000)
+
+    def test_bulk_import_geojson(self):
+        features = [
+            {
+                'type': 'Feature',
+                'properties': {'name': f'Camino {i}'},
+                'geometry': {
+                    'type': 'LineString',
+                    'coordinates': [[-71.23, -34.98 + j * 1e-5] for j in range(100)],
+                },
+            }
+            for i in range(20)
+        ]
+        payload = {'type': 'FeatureCollection', 'features': features}
+        queries, response = self.count_queries('post', '/api/caminos/bulk_import/?campus=Curico', payload)
+        self.assertEqual(response.data['created'], 20)
+        self.assertEqual(Path.objects.filter(campus='Curico', name__startswith='Camino ').count(), 20)
+        self.assertEqual(PathPoint.objects.filter(path_id__in=response.data['ids']).count(), 2000)
+        self.assertLessEqual(queries, 10 + self.batches(2000))
+        first = PathPoint.objects.filter(path_id=response.data['ids'][0]).first()
+        self.assertEqual((first.latitude, first.longitude, first.order), (-34.98, -71.23, 1))
+
+    def test_bulk_import_rejects_other_geometries(self):
+        payload = {'type': 'FeatureCollection', 'features': [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [0, 0]}}]}
+        response = self.client.post('/api/caminos/bulk_import/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ListQueryBudgetTests(TestCase):
+    # Presupuesto de consultas por endpoint de listado: debe cumplirse igual con
+    # uno o con muchos registros, de lo contrario hay un N+1.
+    BUDGETS = {
+        'totems': 1,
+        'recepciones': 1,
+        'caminos': 2,
+        'denuncias': 1,
+        'images': 2,
+        'reportes-atencion': 1,
+    }
+
+    def setUp(self):
+        self.client = admin_client()
+        self.totem = TotemQR.objects.create(latitude=-34.98, longitude=-71.23, campus='Curico')
+
+    def create_rows(self, endpoint, n):
+        for i in range(n):
+            if endpoint == 'totems':
+                TotemQR.objects.create(latitude=-34.98, longitude=-71.23 + i * 1e-4, campus='Curico')
+            elif endpoint == 'recepciones':
+                ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23 + i * 1e-4, campus='Curico')
+            elif endpoint == 'caminos':
+                path = Path.objects.create(name=f'Camino {i}', campus='Curico')
+                PathPoint.objects.bulk_create([
+                    PathPoint(path=path, latitude=-34.98, longitude=-71.23 + j * 1e-4, order=j) for j in range(5)
+                ])
+            elif endpoint == 'denuncias':
+                Denuncia.objects.create(
+                    nombre='Ana', apellido='Pérez', tipo_incidente='Acoso_sexual', fecha_incidente='2025-01-01',
+                    lugar_incidente='Biblioteca', descripcion='Descripción', campus='Curico',
+                )
+            elif endpoint == 'images':
+                ImageUpload.objects.create(point_id=self.totem.id, point_type='totem', campus='Curico', image=f'images/points/{i}.png')
+            elif endpoint == 'reportes-atencion':
+                ReporteAtencion.objects.create(nombre='Ana', email='ana@example.com', motivos_no_atencion=['otro'], campus='Curico')
+
+    def url(self, endpoint):
+        if endpoint == 'images':
+            return f'/api/images/?point_id={self.totem.id}&point_type=totem&campus=Curico'
+        return f'/api/{endpoint}/?campus=Curico' if endpoint in ('totems', 'recepciones', 'caminos') else f'/api/{endpoint}/'
+
+    def test_list_endpoints_stay_within_budget(self):
+        for endpoint, budget in self.BUDGETS.items():
+            with self.subTest(endpoint=endpoint):
+                for n in (1, 25):
+                    self.create_rows(endpoint, n)
+                    with self.assertNumQueries(budget):
+                        response = self.client.get(self.url(endpoint))
+                    self.assertEqual(response.status_code, 200)
+
+
+class PathGeometryFormatTests(TestCase):
+    def setUp(self):
+        path = Path.objects.create(name='Recta', campus='Curico')
+        # Línea recta con un pequeño zigzag que la simplificación debe eliminar
+        PathPoint.objects.bulk_create([
+            PathPoint(path=path, latitude=-34.98 + i * 1e-4, longitude=-71.23 + (1e-7 if i % 2 else 0), order=i)
+            for i in range(50)
+        ])
+        self.client = APIClient()
+
+    def test_encoded_polyline(self):
+        response = self.client.get('/api/caminos/?campus=Curico&geometry=encoded')
+        coordinates = decode_polyline(response.data[0]['polyline'])
+        self.assertEqual(len(coordinates), 50)
+        self.assertEqual(coordinates[0], (-34.98, -71.23))
+        self.assertNotIn('points', response.data[0])
+
+        response = self.client.get('/api/caminos/?campus=Curico&geometry=encoded&tolerance=1')
+        self.assertEqual(len(decode_polyline(response.data[0]['polyline'])), 2)
+
+    def test_flat_coordinates_in_snapshot(self):
+        response = self.client.get('/api/campus/Curico/snapshot/?geometry=flat')
+        path = json.loads(response.content)['paths'][0]
+        self.assertEqual(len(path['coordinates']), 100)
+        plain = self.client.get('/api/campus/Curico/snapshot/')
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+
+    def test_invalid_format(self):
+        self.assertEqual(self.client.get('/api/caminos/?geometry=svg').status_code, 400)
+        self.assertEqual(self.client.get('/api/campus/Curico/snapshot/?geometry=flat&tolerance=x').status_code, 400)
+
+
+class GridIndexTests(TestCase):
+    def test_matches_linear_scan(self):
+        rng = random.Random(7)
+        points = [
+            (i, -34.98 + rng.uniform(-0.01, 0.01), -71.23 + rng.uniform(-0.01, 0.01), {'status': 'Operativo' if i % 3 else 'No Operativo'})
+            for i in range(500)
+        ]
+        # Un grupo denso y puntos aislados, para que haya celdas vacías entre ambos
+        points += [(1000 + i, -34.9 + i * 1e-5, -71.1, {'status': 'Operativo'}) for i in range(50)]
+        index = GridIndex.build(points)
+        operative = lambda data: data['status'] == 'Operativo'
+        for _ in range(50):
+            lat, lon = -34.98 + rng.uniform(-0.03, 0.03), -71.23 + rng.uniform(-0.03, 0.15)
+            for k in (1, 5):
+                self.assertEqual(index.nearest(lat, lon, k=k), linear_nearest(points, lat, lon, k=k))
+                self.assertEqual(index.nearest(lat, lon, k=k, predicate=operative), linear_nearest(points, lat, lon, k=k, predicate=operative))
+
+    def test_insert_and_remove(self):
+        index = GridIndex.build([(1, -34.98, -71.23, None), (2, -34.99, -71.24, None)])
+        index.insert(1, -34.999, -71.249)
+        self.assertEqual([key for _, key, _ in index.nearest(-34.999, -71.249, k=2)], [1, 2])
+        index.remove(1)
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.nearest(-34.98, -71.23)[0][1], 2)
+        self.assertEqual(GridIndex().nearest(-34.98, -71.23), [])
+
+    def test_nearest_receptions_endpoint(self):
+        _reception_indexes.clear()
+        totem = TotemQR.objects.create(latitude=-34.98, longitude=-71.23, campus='Curico')
+        for name, offset, status in (('Lejana', 0.002, 'Operativo'), ('Cerrada', 0.0005, 'No Operativo'), ('Cercana', 0.001, 'Operativo')):
+            ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23 + offset, name=name, campus='Curico', status=status)
+        ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23, name='Otro campus', campus='Talca')
+        url = f'/api/totems/{totem.id}/nearest_receptions/'
+        response = self.client.get(url)
+        self.assertEqual([reception['name'] for reception in response.json()], ['Cercana', 'Lejana'])
+        self.assertAlmostEqual(response.json()[0]['distance'], 91.2, delta=0.5)
+        response = self.client.get(url, {'status': 'all', 'k': 2})
+        self.assertEqual([reception['name'] for reception in response.json()], ['Cerrada', 'Cercana'])
+        self.assertEqual(self.client.get(url, {'k': 'x'}).status_code, 400)
+
+
+class ReceptionIndexTests(TestCase):
+    def setUp(self):
+        # La caché es del proceso y las versiones vuelven a 0 con cada test
+        _reception_indexes.clear()
+
+    def test_reception_changes_update_index_in_place(self):
+        near = ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23, name='Norte', campus='Curico')
+        index = reception_index('Curico')
+        with self.captureOnCommitCallbacks(execute=True):
+            closer = ReceptionQR.objects.create(latitude=-34.9801, longitude=-71.2301, name='Sur', campus='Curico')
+        # Misma instancia con la recepción nueva, sin reconstruir desde la base
+        with self.assertNumQueries(1):
+            self.assertIs(reception_index('Curico'), index)
+        self.assertEqual(index.nearest(-34.9801, -71.2301)[0][1], closer.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            closer.status = 'No Operativo'
+            closer.save()
+        self.assertIs(reception_index('Curico'), index)
+        self.assertEqual(index.nearest(-34.9801, -71.2301)[0][1], near.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            near.campus = 'Talca'
+            near.save()
+        self.assertEqual(len(reception_index('Curico')), 0)
+        self.assertEqual(len(reception_index('Talca')), 1)
+
+    def test_other_campus_changes_keep_index(self):
+        ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23, name='Norte', campus='Curico')
+        index = reception_index('Curico')
+        TotemQR.objects.create(latitude=-34.981, longitude=-71.231, campus='Curico')
+        Path.objects.create(name='Camino', campus='Curico')
+        self.assertIs(reception_index('Curico'), index)
+
+
+def offset(lat, lon, north=0, east=0):
+    # Coordenadas desplazadas en metros, para armar redes de prueba legibles
+    return (
+        lat + north / METERS_PER_DEGREE,
+        lon + east / (METERS_PER_DEGREE * math.cos(math.radians(lat))),
+    )
+
+
+class CampusGraphTests(TestCase):
+    # Totem en el origen. B queda a 300 m al este por un camino recto; A está a
+    # 250 m al oeste en línea recta pero solo se llega rodeando por el norte (~1050 m)
+    ORIGIN = (-34.98, -71.23)
+
+    def setUp(self):
+        # Cachés del proceso: las versiones vuelven a 0 con cada test
+        _reception_indexes.clear()
+        _graphs.clear()
+        lat, lon = self.ORIGIN
+        self.create_path('Este', [(lat, lon), offset(lat, lon, east=150), offset(lat, lon, east=300)])
+        # El rodeo se dibuja como dos caminos; su unión está a ~1 m y se funde en un nodo
+        self.create_path('Norte', [offset(lat, lon, east=1), offset(lat, lon, north=400)])
+        self.create_path('Oeste', [offset(lat, lon, north=400), offset(lat, lon, north=400, east=-250), offset(lat, lon, east=-250)])
+        self.east = ReceptionQR.objects.create(name='B', campus='Curico', **self.coordinates(east=300))
+        self.west = ReceptionQR.objects.create(name='A', campus='Curico', **self.coordinates(east=-250))
+        self.totem = TotemQR.objects.create(campus='Curico', **self.coordinates())
+
+    def coordinates(self, **meters):
+        lat, lon = offset(*self.ORIGIN, **meters)
+        return {'latitude': lat, 'longitude': lon}
+
+    def create_path(self, name, coordinates):
+        path = Path.objects.create(name=name, campus='Curico')
+        PathPoint.objects.bulk_create([
+            PathPoint(path=path, latitude=lat, longitude=lon, order=order) for order, (lat, lon) in enumerate(coordinates)
+        ])
+
+    def test_routes_are_ordered_by_walking_distance(self):
+        lat, lon = self.ORIGIN
+        # En línea recta A es la más cercana; caminando, B
+        self.assertEqual(reception_index('Curico').nearest(lat, lon)[0][2]['name'], 'A')
+        routes = campus_graph('Curico').routes(lat, lon, k=2)
+        self.assertEqual([route['reception']['name'] for route in routes], ['B', 'A'])
+        self.assertAlmostEqual(routes[0]['distance'], 300, delta=1)
+        self.assertAlmostEqual(routes[1]['distance'], 1050, delta=3)
+        # El rodeo pasa por la esquina norte: los caminos se unieron al ajustar vértices
+        self.assertEqual(len(routes[1]['coordinates']), 6)
+        self.assertEqual([route['reception']['name'] for route in campus_graph('Curico').routes(lat, lon, k=1)], ['B'])
+
+    def test_connector_limit_and_straight_line_fallback(self):
+        # A 200 m de cualquier vértice: no se conecta a la red
+        far = ReceptionQR.objects.create(name='C', campus='Curico', **self.coordinates(north=-200, east=150))
+        routes = campus_graph('Curico').routes(*self.ORIGIN, k=3)
+        self.assertEqual([route['reception']['name'] for route in routes], ['B', 'A'])
+
+        rows = compute_totem_routes(self.totem)
+        self.assertEqual([row.reception.name for row in rows], ['B', 'A', 'C'])
+        self.assertEqual(rows[2].coordinates, [[self.totem.latitude, self.totem.longitude], [far.latitude, far.longitude]])
+        self.assertAlmostEqual(rows[2].distance, 250, delta=1)
+
+        # Un punto lejos de la red no tiene ruta caminable
+        self.assertEqual(campus_graph('Curico').routes(*offset(*self.ORIGIN, north=-1000), k=3), [])
+
+    def test_nearby_reception_on_a_vertex(self):
+        # A menos de MAX_CONNECTOR_M: la ruta directa y la de la red pueden costar lo mismo
+        ReceptionQR.objects.create(name='D', campus='Curico', **self.coordinates(east=150))
+        routes = campus_graph('Curico').routes(*self.ORIGIN, k=3)
+        self.assertEqual([route['reception']['name'] for route in routes], ['D', 'B', 'A'])
+        self.assertAlmostEqual(routes[0]['distance'], 150, delta=1)
+
+    def test_nearest_path_uses_the_network(self):
+        response = self.client.get(f'/api/totems/{self.totem.id}/nearest_path/', {'status': 'all'})
+        self.assertEqual(response.json()['reception'], self.east.id)
+        Path.objects.filter(name='Este').delete()
+        response = self.client.get(f'/api/totems/{self.totem.id}/nearest_path/', {'status': 'all'})
+        self.assertEqual(response.json()['reception'], self.west.id)
+
+
+class TotemRouteTests(TestCase):
+    def setUp(self):
+        _reception_indexes.clear()
+        _graphs.clear()
+        self.reception = ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23, name='Norte', campus='Curico')
+        self.totem = TotemQR.objects.create(latitude=-34.981, longitude=-71.231, campus='Curico')
+
+    def test_first_scan_stores_routes(self):
+        response = self.client.get(f'/api/totems/{self.totem.id}/nearest_path/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['reception'], self.reception.id)
+        self.assertEqual(TotemRoute.objects.filter(totem=self.totem).count(), 1)
+
+    def test_recompute_replaces_rows(self):
+        # Un segundo cálculo (p. ej. otro escaneo simultáneo) reemplaza las filas sin error
+        first = compute_totem_routes(self.totem)
+        second = compute_totem_routes(self.totem)
+        self.assertEqual(first[0].reception.name, 'Norte')
+        self.assertEqual(len(second), 1)
+        self.assertEqual(TotemRoute.objects.filter(totem=self.totem).count(), 1)
+
+    def test_map_edits_recompute_routes_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            totem = TotemQR.objects.create(latitude=-34.9815, longitude=-71.2315, campus='Curico')
+        self.assertEqual(TotemRoute.objects.filter(totem=totem).count(), 1)
+
+        # Un camino y sus puntos en una transacción: un solo recálculo al confirmar
+        with mock.patch('tasks.routing.compute_totem_routes', wraps=compute_totem_routes) as compute:
+            with self.captureOnCommitCallbacks(execute=True):
+                admin_client().post('/api/caminos/', path_payload(5), format='json')
+        self.assertEqual(sorted(call.args[0].pk for call in compute.call_args_list), [self.totem.pk, totem.pk])
+        version = DataVersion.get(DataVersion.campus_key('Curico'))
+        self.assertEqual(set(TotemRoute.objects.values_list('version', flat=True)), {version})
+
+        # El escaneo siguiente lee la tabla sin calcular nada
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/totems/{self.totem.id}/nearest_path/')
+        self.assertEqual(response.json()['reception'], self.reception.id)
+
+    def test_moving_a_reception_only_recomputes_affected_totems(self):
+        # Dos grupos de TOP_K recepciones a 2 km: mover una no toca las rutas del otro grupo
+        far = TotemQR.objects.create(latitude=-34.981, longitude=-71.209, campus='Curico')
+        near = [self.reception] + [
+            ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23 + i * 1e-4, name=f'Norte {i}', campus='Curico') for i in (1, 2)
+        ]
+        for i in range(3):
+            ReceptionQR.objects.create(latitude=-34.98, longitude=-71.209 + i * 1e-4, name=f'Este {i}', campus='Curico')
+        compute_totem_routes(self.totem)
+        compute_totem_routes(far)
+        far_rows = set(TotemRoute.objects.filter(totem=far).values_list('pk', flat=True))
+
+        with mock.patch('tasks.routing.compute_totem_routes', wraps=compute_totem_routes) as compute:
+            with self.captureOnCommitCallbacks(execute=True):
+                near[1].latitude = -34.9805
+                near[1].save()
+        self.assertEqual([call.args[0].pk for call in compute.call_args_list], [self.totem.pk])
+        self.assertEqual(set(TotemRoute.objects.filter(totem=far).values_list('pk', flat=True)), far_rows)
+        self.assertEqual(TotemRoute.objects.filter(totem=self.totem).count(), 3)
+
+    def test_stale_routes_are_not_stored(self):
+        version = DataVersion.get(DataVersion.campus_key('Curico'))
+        DataVersion.bump(DataVersion.campus_key('Curico'))
+        with mock.patch.object(DataVersion, 'get', return_value=version):
+            rows = compute_totem_routes(self.totem)
+        self.assertEqual(len(rows), 1)
+        self.assertFalse(TotemRoute.objects.filter(totem=self.totem).exists())
+
+
+class DenunciaListTests(TestCase):
+    def setUp(self):
+        self.client = admin_client()
+        rows = [
+            ('Ana', 'Curico', 'pendiente', 'Acoso_sexual', 'Ocurrió en la biblioteca'),
+            ('Berta', 'Curico', 'tomada', 'Discriminacion', 'Comentarios en clase'),
+            ('Carla', 'Talca', 'pendiente', 'Acoso_sexual', 'En el casino'),
+        ]
+        for nombre, campus, estado, tipo, descripcion in rows:
+            Denuncia.objects.create(
+                nombre=nombre, apellido='Pérez', tipo_incidente=tipo, fecha_incidente='2025-01-01',
+                lugar_incidente='Campus', descripcion=descripcion, campus=campus, estado=estado,
+            )
+
+    def names(self, query):
+        response = self.client.get(f'/api/denuncias/?{query}')
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return [row['nombre'] for row in response.data]
+
+    def test_filters_and_search(self):
+        self.assertEqual(self.names(''), ['Carla', 'Berta', 'Ana'])
+        self.assertEqual(self.names('campus=Curico'), ['Berta', 'Ana'])
+        self.assertEqual(self.names('campus=Curico&estado=pendiente'), ['Ana'])
+        self.assertEqual(self.names('tipo_incidente=Acoso_sexual&ordering=created_at'), ['Ana', 'Carla'])
+        self.assertEqual(self.names('search=biblioteca'), ['Ana'])
+
+    def test_date_range(self):
+        Denuncia.objects.filter(nombre='Ana').update(created_at=timezone.make_aware(datetime(2024, 3, 10, 23, 0)))
+        self.assertEqual(self.names('desde=2024-03-10&hasta=2024-03-10'), ['Ana'])
+        self.assertEqual(self.names('desde=2024-03-11'), ['Carla', 'Berta'])
+        self.assertEqual(self.client.get('/api/denuncias/?desde=10-03-2024').status_code, 400)
+
+    def test_cursor_pagination(self):
+        response = self.client.get('/api/denuncias/?page_size=2')
+        self.assertEqual([row['nombre'] for row in response.data['results']], ['Carla', 'Berta'])
+        self.assertIsNone(response.data['previous'])
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual([row['nombre'] for row in response.data['results']], ['Ana'])
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_pagination_with_repeated_ordering_values(self):
+        # Las tres comparten fecha_incidente: el id desempata y ninguna se repite ni se salta
+        names = []
+        url = '/api/denuncias/?ordering=fecha_incidente&page_size=1'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertIn('ORDER BY "tasks_denuncia"."fecha_incidente" ASC, "tasks_denuncia"."id" ASC', context.captured_queries[-1]['sql'])
+            names += [row['nombre'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(names, ['Ana', 'Berta', 'Carla'])
+
+
+class DenunciaSearchTests(TestCase):
+    def setUp(self):
+        self.client = admin_client()
+        rows = [
+            ('Ana', 'Biblioteca', 'Un compañero me siguió hasta la biblioteca <b>central</b>'),
+            ('Berta', 'Casino', 'Comentarios ofensivos durante el almuerzo'),
+            ('Biblioteca', 'Gimnasio', 'Sin relación con el edificio'),
+        ]
+        for nombre, lugar, descripcion in rows:
+            Denuncia.objects.create(
+                nombre=nombre, apellido='Pérez', tipo_incidente='Acoso_sexual', fecha_incidente='2025-01-01',
+                lugar_incidente=lugar, descripcion=descripcion, campus='Curico',
+            )
+
+    def test_ranked_results_with_snippet(self):
+        response = self.client.get('/api/denuncias/search/?q=biblioteca')
+        self.assertEqual(response.status_code, 200)
+        # El nombre pesa más que el lugar y la descripción
+        self.assertEqual([row['nombre'] for row in response.data], ['Biblioteca', 'Ana'])
+        self.assertGreater(response.data[0]['rank'], 0)
+        self.assertIn('<mark>biblioteca</mark>', response.data[1]['snippet'])
+        self.assertIn('&lt;b&gt;', response.data[1]['snippet'])
+        self.assertNotIn('search_vector', response.data[0])
+
+    def test_all_terms_and_filters(self):
+        self.assertEqual(self.client.get('/api/denuncias/search/?q=comentarios almuerzo').data[0]['nombre'], 'Berta')
+        self.assertEqual(self.client.get('/api/denuncias/search/?q=comentarios biblioteca').data, [])
+        self.assertEqual(self.client.get('/api/denuncias/search/?q=biblioteca&campus=Talca').data, [])
+        self.assertEqual(self.client.get('/api/denuncias/search/').status_code, 400)
+
+
+class DenunciaStatsTests(TestCase):
+    def setUp(self):
+        self.client = admin_client()
+
+    def create_denuncia(self, campus='Curico', tipo='Acoso_sexual', **kwargs):
+        return Denuncia.objects.create(
+            nombre='Ana', apellido='Pérez', tipo_incidente=tipo, fecha_incidente='2025-01-01',
+            lugar_incidente='Biblioteca', descripcion='Descripción', campus=campus, **kwargs,
+        )
+
+    def stats(self, query=''):
+        response = self.client.get(f'/api/denuncias/stats/?{query}')
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response.data
+
+    def test_rollups_follow_writes(self):
+        first = self.create_denuncia()
+        self.create_denuncia(tipo='Discriminacion')
+        self.create_denuncia(campus='Talca')
+        ReporteAtencion.objects.create(nombre='Ana', email='ana@example.com', motivos_no_atencion=['otro'], campus='Curico')
+
+        data = self.stats()
+        self.assertEqual(data['denuncias']['total'], 3)
+        self.assertEqual(data['denuncias']['por_campus'], {'Curico': 2, 'Talca': 1})
+        self.assertEqual(data['denuncias']['por_estado'], {'pendiente': 3})
+        self.assertEqual(data['reportes']['por_tipo'], {'falta_atencion': 1})
+
+        first.estado = 'tomada'
+        first.save()
+        Denuncia.objects.get(campus='Talca').delete()
+        data = self.stats('campus=Curico')
+        self.assertEqual(data['denuncias']['por_estado'], {'pendiente': 1, 'tomada': 1})
+        self.assertEqual(data['denuncias']['total'], 2)
+
+        rollups = sorted(StatsRollup.objects.filter(count__gt=0).values_list('kind', 'campus', 'tipo', 'estado', 'count'))
+        call_command('rebuild_stats', stdout=open('/dev/null', 'w'))
+        self.assertEqual(sorted(StatsRollup.objects.values_list('kind', 'campus', 'tipo', 'estado', 'count')), rollups)
+
+    def test_buckets_and_range(self):
+        for day in (6, 8, 20):
+            denuncia = self.create_denuncia()
+            Denuncia.objects.filter(pk=denuncia.pk).update(created_at=timezone.make_aware(datetime(2025, 1, day, 12)))
+        call_command('rebuild_stats', stdout=open('/dev/null', 'w'))
+
+        series = self.stats('bucket=week')['denuncias']['series']
+        self.assertEqual(series, [{'periodo': '2025-01-06', 'total': 2}, {'periodo': '2025-01-20', 'total': 1}])
+        self.assertEqual(self.stats('bucket=month')['denuncias']['series'], [{'periodo': '2025-01-01', 'total': 3}])
+        self.assertEqual(self.stats('bucket=day&desde=2025-01-07&hasta=2025-01-20')['denuncias']['total'], 2)
+        with self.assertNumQueries(1):
+            self.client.get('/api/denuncias/stats/?bucket=day')
+        self.assertEqual(self.client.get('/api/denuncias/stats/?bucket=year').status_code, 400)
+
+
+class ReporteEventsTests(TestCase):
+    def test_changes_are_published_after_commit(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        subscription = broker.subscribe(loop=loop)
+        self.addCleanup(broker.unsubscribe, subscription)
+
+        def received():
+            events = []
+            while not subscription[1].empty():
+                events.append(subscription[1].get_nowait())
+            return events
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reporte = ReporteAtencion.objects.create(nombre='Ana', email='ana@example.com', motivos_no_atencion=['otro'], campus='Curico')
+            loop.run_until_complete(asyncio.sleep(0))
+            self.assertEqual(received(), [])
+        loop.run_until_complete(asyncio.sleep(0))
+        [event] = received()
+        self.assertEqual((event['event'], event['campus'], event['data']['id']), ('reporte', 'Curico', reporte.id))
+        self.assertEqual(event['version'], DataVersion.get(REPORTES_KEY))
+
+        reporte_id = reporte.id
+        with self.captureOnCommitCallbacks(execute=True):
+            reporte.estado = 'revisado'
+            reporte.save()
+            reporte.delete()
+        loop.run_until_complete(asyncio.sleep(0))
+        events = received()
+        self.assertEqual([event['event'] for event in events], ['reporte', 'reporte_eliminado'])
+        self.assertEqual(events[0]['data']['estado'], 'revisado')
+        self.assertEqual(events[1]['data'], {'id': reporte_id})
+
+    async def test_stream_filters_by_campus(self):
+        response = await self.async_client.get('/api/reportes-atencion/stream/?campus=Curico')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+            broker.publish({'event': 'reporte', 'campus': 'Talca', 'version': 1, 'data': {'id': 1}})
+            broker.publish({'event': 'reporte', 'campus': 'Curico', 'version': 2, 'data': {'id': 2}})
+            chunk = await asyncio.wait_for(anext(stream), 1)
+            self.assertEqual(chunk, b'id: 2\nevent: reporte\ndata: {"id": 2}\n\n')
+        finally:
+            await stream.aclose()
+
+    async def test_one_poll_detects_changes_from_other_processes(self):
+        subscriptions = [broker.subscribe() for _ in range(3)]
+        for subscription in subscriptions:
+            self.addCleanup(broker.unsubscribe, subscription)
+        broker.version, broker.published = await sync_to_async(DataVersion.get)(REPORTES_KEY), 0
+        self.addCleanup(setattr, broker, 'version', None)
+
+        # Cambio publicado en este proceso: nada que resincronizar
+        await sync_to_async(DataVersion.bump)(REPORTES_KEY)
+        broker.publish({'event': 'reporte', 'campus': 'Curico', 'version': 1, 'data': {'id': 1}})
+        await broker.poll()
+        await asyncio.sleep(0)
+        self.assertEqual([subscription[1].get_nowait()['event'] for subscription in subscriptions], ['reporte'] * 3)
+
+        # Cambio de otro proceso: una sola consulta avisa a todos los streams
+        await sync_to_async(DataVersion.bump)(REPORTES_KEY)
+        await broker.poll()
+        await asyncio.sleep(0)
+        self.assertEqual([subscription[1].get_nowait()['event'] for subscription in subscriptions], ['resync'] * 3)
+
+    async def test_reconnect_with_stale_id_asks_for_resync(self):
+        await sync_to_async(DataVersion.bump)(REPORTES_KEY)
+        response = await self.async_client.get('/api/reportes-atencion/stream/', headers={'Last-Event-ID': '0'})
+        stream = aiter(response.streaming_content)
+        try:
+            await anext(stream)
+            self.assertIn(b'event: resync', await anext(stream))
+        finally:
+            await stream.aclose()
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.client = admin_client()
+
+    def create_reporte(self, campus='Curico'):
+        return ReporteAtencion.objects.create(nombre='Ana', email='ana@example.com', motivos_no_atencion=['otro'], campus=campus)
+
+    def delta(self, endpoint, since, query=''):
+        response = self.client.get(f'/api/{endpoint}/', {'since': since, **dict(q.split('=') for q in query.split('&') if q)})
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response.data
+
+    def test_reportes_delta(self):
+        old = self.create_reporte()
+        gone = self.create_reporte(campus='Talca')
+        ReporteAtencion.objects.filter(pk__in=[old.pk, gone.pk]).update(updated_at=timezone.now() - timedelta(hours=1))
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+
+        new = self.create_reporte()
+        gone_id = gone.id
+        gone.delete()
+        data = self.delta('reportes-atencion', since)
+        self.assertEqual([row['id'] for row in data['results']], [new.id])
+        self.assertEqual(data['deleted'], [gone_id])
+
+        old.estado = 'revisado'
+        old.save()
+        data = self.delta('reportes-atencion', data['watermark'], 'campus=Curico')
+        self.assertEqual(sorted(row['id'] for row in data['results']), sorted([old.id, new.id]))
+        self.assertEqual(data['deleted'], [])
+
+    def test_denuncias_delta_and_invalid_since(self):
+        denuncia = Denuncia.objects.create(
+            nombre='Ana', apellido='Pérez', tipo_incidente='Acoso_sexual', fecha_incidente='2025-01-01',
+            lugar_incidente='Biblioteca', descripcion='Descripción', campus='Curico',
+        )
+        since = (timezone.now() - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S') + ' 00:00'
+        data = self.delta('denuncias', since)
+        self.assertEqual([row['id'] for row in data['results']], [denuncia.id])
+        self.assertEqual(self.client.get('/api/denuncias/?since=ayer').status_code, 400)
+        # Sin since la respuesta sigue siendo la lista completa
+        self.assertIsInstance(self.client.get('/api/denuncias/').data, list)
+
+    def test_delta_is_paginated(self):
+        reportes = [self.create_reporte() for _ in range(5)]
+        # Mismo updated_at para todas, como deja bulk_estado: el cursor desempata por id
+        ReporteAtencion.objects.update(updated_at=timezone.now())
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        gone = reportes.pop()
+        gone_id = gone.id
+        gone.delete()
+
+        received = []
+        url = '/api/reportes-atencion/'
+        params = {'since': since}
+        with mock.patch('tasks.views.DeltaSyncMixin.SYNC_PAGE_SIZE', 2):
+            while url:
+                data = self.client.get(url, params).data
+                url, params = data['next'], None
+                received.append([row['id'] for row in data['results']])
+        self.assertEqual(received, [[reportes[0].id, reportes[1].id], [reportes[2].id, reportes[3].id]])
+        # Eliminados y marca llegan con la última página
+        self.assertEqual(data['deleted'], [gone_id])
+        self.assertIn('watermark', data)
+        self.assertEqual(self.client.get('/api/reportes-atencion/', {'since': since, 'cursor': 'x'}).status_code, 400)
+
+    def test_tombstone_retention(self):
+        reporte = self.create_reporte()
+        reporte.delete()
+        old = timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS + 1)
+        response = self.client.get('/api/reportes-atencion/', {'since': old.isoformat()})
+        self.assertEqual(response.status_code, 410)
+
+        Tombstone.objects.update(deleted_at=old)
+        self.create_reporte().delete()
+        call_command('prune_tombstones', stdout=open('/dev/null', 'w'))
+        self.assertEqual(Tombstone.objects.count(), 1)
+
+
+class UnreadCountTests(TestCase):
+    def create_reporte(self, campus='Curico', estado='nuevo'):
+        return ReporteAtencion.objects.create(
+            nombre='Ana', email='ana@example.com', motivos_no_atencion=['otro'], campus=campus, estado=estado,
+        )
+
+    def test_counts_and_not_modified(self):
+        reporte = self.create_reporte()
+        self.create_reporte(campus='Talca')
+        self.create_reporte(estado='revisado')
+
+        response = self.client.get('/api/reportes-atencion/unread_count/')
+        self.assertEqual(response.data, {'total': 2, 'por_campus': {'Curico': 1, 'Talca': 1}})
+        response = self.client.get('/api/reportes-atencion/unread_count/?campus=Curico')
+        self.assertEqual(response.data['total'], 1)
+        etag = response['ETag']
+
+        # Sin cambios: 304 con una sola consulta (la versión)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/reportes-atencion/unread_count/?campus=Curico', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Un cambio en otro campus no invalida el contador de este
+        self.create_reporte(campus='Talca')
+        response = self.client.get('/api/reportes-atencion/unread_count/?campus=Curico', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        reporte.estado = 'revisado'
+        reporte.save()
+        response = self.client.get('/api/reportes-atencion/unread_count/?campus=Curico', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 0)
+
+
+class BulkEstadoTests(TestCase):
+    def setUp(self):
+        self.client = admin_client()
+
+    def create_denuncia(self, campus='Curico'):
+        return Denuncia.objects.create(
+            nombre='Ana', apellido='Pérez', tipo_incidente='Acoso_sexual', fecha_incidente='2025-01-01',
+            lugar_incidente='Biblioteca', descripcion='Descripción', campus=campus,
+        )
+
+    def rollups(self, kind):
+        return dict(StatsRollup.objects.filter(kind=kind, count__gt=0).values_list('estado', 'count'))
+
+    def test_denuncias_by_ids_with_comment(self):
+        denuncias = [self.create_denuncia() for _ in range(30)]
+        ids = [denuncia.id for denuncia in denuncias[:20]]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/denuncias/bulk_estado/', {'estado': 'tomada', 'ids': ids, 'comentarios': 'Revisado en lote'}, format='json')
+        self.assertEqual(response.data, {'updated': 20})
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "tasks_denuncia"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Denuncia.objects.filter(estado='tomada', comentarios='Revisado en lote').count(), 20)
+        self.assertEqual(self.rollups('denuncia'), {'pendiente': 10, 'tomada': 20})
+
+        # Repetirlo sin comentario no cambia nada
+        response = self.client.post('/api/denuncias/bulk_estado/', {'estado': 'tomada', 'ids': ids}, format='json')
+        self.assertEqual(response.data, {'updated': 0})
+
+    def test_reportes_by_filter(self):
+        for campus in ('Curico', 'Curico', 'Talca'):
+            ReporteAtencion.objects.create(nombre='Ana', email='ana@example.com', motivos_no_atencion=['otro'], campus=campus)
+        etag = self.client.get('/api/reportes-atencion/unread_count/?campus=Curico')['ETag']
+        since = timezone.now().isoformat()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post('/api/reportes-atencion/bulk_estado/', {'estado': 'revisado', 'filter': {'campus': 'Curico', 'estado': 'nuevo'}}, format='json')
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.rollups('reporte'), {'nuevo': 1, 'revisado': 2})
+        response = self.client.get('/api/reportes-atencion/unread_count/?campus=Curico', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['total'], 0)
+        self.assertEqual(len(self.client.get('/api/reportes-atencion/', {'since': since}).data['results']), 2)
+
+    def test_validation(self):
+        url = '/api/reportes-atencion/bulk_estado/'
+        self.assertEqual(self.client.post(url, {'estado': 'borrado', 'ids': [1]}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'estado': 'revisado'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'estado': 'revisado', 'filter': {'nombre': 'Ana'}}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'estado': 'revisado', 'ids': [1], 'comentarios': 'x'}, format='json').status_code, 400)
+        self.assertEqual(APIClient().post(url, {'estado': 'revisado', 'ids': [1]}, format='json').status_code, 401)
+
+    def test_filter_without_values_or_with_wrong_types(self):
+        for campus in ('Curico', 'Talca'):
+            ReporteAtencion.objects.create(nombre='Ana', email='ana@example.com', motivos_no_atencion=['otro'], campus=campus)
+        url = '/api/reportes-atencion/bulk_estado/'
+        for filter_values in ({'campus': ''}, {'campus': None, 'estado': ''}, {'campus': ['Curico']}, {'estado': 1}):
+            response = self.client.post(url, {'estado': 'revisado', 'filter': filter_values}, format='json')
+            self.assertEqual(response.status_code, 400, filter_values)
+        self.assertFalse(ReporteAtencion.objects.exclude(estado='nuevo').exists())
+
+        url = '/api/denuncias/bulk_estado/'
+        self.create_denuncia()
+        for filter_values in ({'desde': 20250101}, {'hasta': ['2025-01-01']}, {'desde': '2025-13-01'}):
+            response = self.client.post(url, {'estado': 'tomada', 'filter': filter_values}, format='json')
+            self.assertEqual(response.status_code, 400, filter_values)
+        self.assertFalse(Denuncia.objects.filter(estado='tomada').exists())
+
+
+class MediaTestCase(TestCase):
+    # MEDIA_ROOT temporal para no escribir archivos en el proyecto
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+
+    def media_files(self, directory=''):
+        root = os.path.join(self.media_root, directory)
+        return sorted(
+            os.path.relpath(os.path.join(path, name), self.media_root)
+            for path, _, names in os.walk(root) for name in names
+        )
+
+
+@override_settings(FRONTEND_BASE_URL='https://mapa.example.com/')
+class QRGenerationTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = admin_client()
+        self.totem = TotemQR.objects.create(latitude=-34.98, longitude=-71.23, campus='Curico')
+        self.reception = ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23, campus='Curico')
+
+    def test_repeat_generation_reuses_image(self):
+        url = f'/api/totems/{self.totem.id}/generate_qr/'
+        first = self.client.post(url)
+        self.assertEqual(first.status_code, 201)
+        second = self.client.post(url)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data['qr_image'], second.data['qr_image'])
+        self.assertEqual(ImageUpload.objects.filter(point_type='totem').count(), 1)
+        self.assertEqual(len(self.media_files('images/qr')), 1)
+
+        upload = ImageUpload.objects.get(point_type='totem')
+        expected = f'https://mapa.example.com/mapa2/Curico?pointId={self.totem.id}&pointType=totem'
+        self.assertEqual(point_url('totem', self.totem), expected)
+        self.assertEqual(upload.qr_hash, qr_digest(expected))
+        self.assertIn(upload.qr_hash, upload.image.name)
+
+    def test_reception_qr(self):
+        response = self.client.post(f'/api/recepciones/{self.reception.id}/generate_qr/')
+        self.assertEqual(response.status_code, 201)
+        upload = ImageUpload.objects.get(point_type='reception')
+        self.assertEqual(upload.qr_hash, qr_digest(point_url('reception', self.reception)))
+        self.reception.refresh_from_db()
+        self.assertEqual(self.reception.qr_image, response.data['qr_image'])
+
+    def test_gc_removes_stale_qrs(self):
+        url = f'/api/totems/{self.totem.id}/generate_qr/'
+        self.client.post(url)
+        old = ImageUpload.objects.get(point_type='totem')
+        self.totem.campus = 'Talca'
+        self.totem.save()
+        self.client.post(url)
+        # QR con el nombre antiguo, sin referencia desde el punto
+        legacy = ImageUpload.objects.create(point_id=self.totem.id, point_type='totem', campus='Curico', image='images/points/qr_totem_1_Curico.png')
+        os.makedirs(os.path.join(self.media_root, 'images/points'))
+        open(os.path.join(self.media_root, legacy.image.name), 'wb').close()
+        photo = ImageUpload.objects.create(point_id=self.totem.id, point_type='totem', campus='Talca', image='images/points/foto.png')
+        self.assertEqual(len(self.media_files('images/qr')), 2)
+
+        # Todo es reciente: dentro del período de gracia no se elimina nada
+        call_command('gc_qr_images', stdout=open('/dev/null', 'w'))
+        self.assertEqual(ImageUpload.objects.count(), 4)
+        self.assertEqual(len(self.media_files('images/qr')), 2)
+
+        call_command('gc_qr_images', dry_run=True, grace_minutes=0, stdout=open('/dev/null', 'w'))
+        self.assertEqual(ImageUpload.objects.count(), 4)
+        call_command('gc_qr_images', grace_minutes=0, stdout=open('/dev/null', 'w'))
+        current = ImageUpload.objects.get(qr_hash__isnull=False)
+        self.assertNotEqual(current.pk, old.pk)
+        self.assertEqual(set(ImageUpload.objects.values_list('pk', flat=True)), {current.pk, photo.pk})
+        self.assertEqual(self.media_files(), [current.image.name])
+
+    def test_qr_on_the_fly(self):
+        url = f'/api/totems/{self.totem.id}/qr/'
+        svg = APIClient().get(url, {'output': 'svg', 'size': 300})
+        self.assertEqual(svg.status_code, 200)
+        self.assertEqual(svg['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'width="300"', svg.content)
+        self.assertIn('max-age=86400', svg['Cache-Control'])
+
+        png = APIClient().get(url, {'size': 300}, HTTP_ACCEPT='image/png')
+        self.assertEqual(png['Content-Type'], 'image/png')
+        self.assertEqual(Image.open(BytesIO(png.content)).size, (300, 300))
+        self.assertNotEqual(png['ETag'], svg['ETag'])
+        # Nada se guarda en el storage
+        self.assertEqual(self.media_files(), [])
+
+        with self.assertNumQueries(1):
+            cached = APIClient().get(url, {'size': 300}, HTTP_IF_NONE_MATCH=png['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        self.totem.campus = 'Talca'
+        self.totem.save()
+        changed = APIClient().get(url, {'size': 300}, HTTP_IF_NONE_MATCH=png['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+        self.assertEqual(APIClient().get(url, {'output': 'gif'}).status_code, 400)
+        self.assertEqual(APIClient().get(url, {'size': 10}).status_code, 400)
+        self.assertEqual(APIClient().get(f'/api/recepciones/{self.reception.id}/qr/').status_code, 200)
+
+
+@override_settings(FRONTEND_BASE_URL='https://mapa.example.com')
+class QRBatchTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = admin_client()
+        for i in range(5):
+            TotemQR.objects.create(latitude=-34.98, longitude=-71.23 + i * 1e-4, campus='Curico', name=f'Totem {i}')
+        for i in range(3):
+            ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23 + i * 1e-4, campus='Curico', name=f'Recepción {i}')
+        TotemQR.objects.create(latitude=-35.4, longitude=-71.6, campus='Talca')
+
+    def test_campus_batch(self):
+        # Un QR ya generado se reutiliza en el lote
+        existing = TotemQR.objects.filter(campus='Curico').first()
+        self.client.post(f'/api/totems/{existing.id}/generate_qr/')
+
+        response = self.client.post('/api/qr-batches/', {'campus': 'Curico', 'include_pdf': True}, format='json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['id']
+        self.assertEqual(self.client.get(f'/api/qr-batches/{job_id}/download/').status_code, 409)
+
+        run_qr_batch(job_id, 'http://testserver/', workers=2)
+        data = self.client.get(f'/api/qr-batches/{job_id}/').data
+        self.assertEqual((data['status'], data['total'], data['completed'], data['progress']), ('done', 8, 8, 1.0))
+        self.assertEqual(ImageUpload.objects.filter(campus='Curico', qr_hash__isnull=False).count(), 8)
+        self.assertFalse(TotemQR.objects.filter(campus='Curico', qr_image__isnull=True).exists())
+
+        response = self.client.get(f'/api/qr-batches/{job_id}/download/')
+        names = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))).namelist()
+        self.assertEqual(len(names), 8)
+        self.assertIn(f'totem_{existing.id}_totem-0.png', names)
+        response = self.client.get(f'/api/qr-batches/{job_id}/download/?file=pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_jobs_are_claimed_once_and_expire_without_heartbeat(self):
+        first = self.client.post('/api/qr-batches/', {'campus': 'Curico'}, format='json').data['id']
+        second = self.client.post('/api/qr-batches/', {'campus': 'Talca'}, format='json').data['id']
+        # La petición solo encola: nada corre en el proceso web
+        self.assertEqual(QRBatchJob.objects.get(pk=first).status, 'pending')
+        self.assertEqual(QRBatchJob.objects.get(pk=first).base_url, 'http://testserver/')
+
+        self.assertEqual(claim_job().pk, first)
+        self.assertEqual(claim_job().pk, second)
+        self.assertIsNone(claim_job())
+
+        # El worker del primero murió: sin latido se marca como fallido
+        QRBatchJob.objects.filter(pk=first).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(expire_stale_jobs(), 1)
+        self.assertEqual(QRBatchJob.objects.get(pk=first).status, 'failed')
+        self.assertEqual(QRBatchJob.objects.get(pk=second).status, 'running')
+
+        run_qr_batch(second, workers=1)
+        job = QRBatchJob.objects.get(pk=second)
+        self.assertEqual(job.status, 'done')
+        self.assertTrue(TotemQR.objects.get(campus='Talca').qr_image.startswith('http://testserver/'))
+
+    def test_requires_admin(self):
+        self.assertEqual(APIClient().post('/api/qr-batches/', {'campus': 'Curico'}, format='json').status_code, 401)
+
+
+def photo_file(size=(2400, 1200), orientation=6, name='foto.jpg'):
+    # JPEG con orientación y GPS en EXIF, como las fotos tomadas con el teléfono
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x8825] = {1: 'S', 2: (34.0, 58.0, 0.0)}
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format='JPEG', exif=exif)
+    buffer.name = name
+    buffer.seek(0)
+    return buffer
+
+
+class ImageVariantTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = admin_client()
+        self.totem = TotemQR.objects.create(latitude=-34.98, longitude=-71.23, campus='Curico')
+
+    def upload(self, file):
+        return self.client.post('/api/image-upload/', {
+            'point_id': self.totem.id, 'point_type': 'totem', 'campus': 'Curico', 'file': file,
+        }, format='multipart')
+
+    def processed(self, response):
+        # Las variantes y el placeholder los genera el worker, fuera de la petición
+        call_command('process_images', once=True, stdout=open('/dev/null', 'w'))
+        upload = ImageUpload.objects.get(pk=response.data['id'])
+        return ImageUploadSerializer(upload, context={'request': response.wsgi_request}).data
+
+    def test_upload_generates_variants(self):
+        response = self.upload(photo_file())
+        self.assertEqual(response.status_code, 201)
+        # La petición no decodifica la imagen: se sirve el original hasta que estén las variantes
+        self.assertEqual((response.data['variants'], response.data['available']), ({}, True))
+        self.assertEqual((response.data['width'], response.data['height']), (1200, 2400))
+        data = self.processed(response)
+        variants = data['variants']
+        self.assertEqual(list(variants), ['thumb', 'medium', 'full'])
+        # Orientación aplicada: la foto girada queda vertical
+        self.assertEqual((variants['thumb']['width'], variants['thumb']['height']), (320, 640))
+        self.assertEqual((variants['full']['width'], variants['full']['height']), (1200, 2400))
+        self.assertTrue(data['srcset']['webp'].endswith('full.webp 1200w'))
+        self.assertIn('thumb.jpeg 320w', data['srcset']['jpeg'])
+
+        upload = ImageUpload.objects.get()
+        for entry in upload.variants.values():
+            for extension in ('webp', 'jpeg'):
+                with Image.open(os.path.join(self.media_root, entry[extension])) as variant:
+                    self.assertEqual(variant.size, (entry['width'], entry['height']))
+                    self.assertEqual(len(variant.getexif()), 0)
+        thumb = os.path.getsize(os.path.join(self.media_root, upload.variants['thumb']['webp']))
+        self.assertLess(thumb * 10, upload.image.size)
+
+        listed = APIClient().get('/api/images/', {'point_id': self.totem.id, 'point_type': 'totem', 'campus': 'Curico'})
+        self.assertEqual(listed.data[0]['srcset'], data['srcset'])
+
+        # Las variantes son del blob: se van con él al recolectarlo
+        upload.delete()
+        call_command('gc_image_blobs', grace_minutes=0, stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.media_files(), [])
+
+    def test_small_and_invalid_images(self):
+        small = self.processed(self.upload(photo_file(size=(200, 100), orientation=1)))
+        self.assertEqual(list(small['variants']), ['thumb'])
+        self.assertEqual(small['variants']['thumb']['width'], 200)
+
+        # Imágenes subidas antes del pipeline, una de ellas dañada
+        legacy = ImageUpload.objects.create(point_id=self.totem.id, point_type='totem', campus='Curico', image=ImageUpload.objects.get(pk=small['id']).image.name)
+        broken = ImageUpload.objects.create(point_id=self.totem.id, point_type='totem', campus='Curico', image=default_storage.save('images/points/rota.jpg', ContentFile(b'no es una imagen')))
+        with self.assertLogs('tasks.images', 'ERROR'):
+            call_command('generate_image_variants', stdout=open('/dev/null', 'w'))
+        self.assertEqual(list(ImageUpload.objects.get(pk=legacy.pk).variants), ['thumb'])
+        self.assertEqual(ImageUpload.objects.get(pk=broken.pk).variants, {})
+        listed = APIClient().get('/api/images/', {'campus': 'Curico'})
+        self.assertEqual(listed.data['points']['totem'][str(self.totem.id)][-1]['srcset'], {})
+
+    def test_rejects_invalid_and_oversized_files(self):
+        broken = BytesIO(b'no es una imagen')
+        broken.name = 'rota.jpg'
+        self.assertEqual(self.upload(broken).status_code, 400)
+        pdf = BytesIO(b'%PDF-1.4 documento')
+        pdf.name = 'foto.png'
+        self.assertEqual(self.upload(pdf).status_code, 400)
+        with override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000 * 1000):
+            response = self.upload(photo_file(size=(2000, 1000)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('píxeles', str(response.data['file']))
+        with override_settings(IMAGE_UPLOAD_MAX_BYTES=1024):
+            response = self.upload(photo_file())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ImageUpload.objects.count(), 0)
+        self.assertEqual(self.media_files(), [])
+
+    def test_batch_upload(self):
+        broken = BytesIO(b'no es una imagen')
+        broken.name = 'rota.jpg'
+        files = [photo_file(name='a.jpg'), photo_file(size=(300, 300), name='b.jpg'), broken]
+        response = self.client.post('/api/image-upload/batch/', {
+            'point_id': self.totem.id, 'point_type': 'totem', 'campus': 'Curico', 'files': files,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['uploaded']), 2)
+        self.assertEqual(response.data['rejected'], [{'file': 'rota.jpg', 'detail': 'El archivo no es una imagen válida.'}])
+        self.assertEqual(ImageUpload.objects.count(), 2)
+
+        with override_settings(IMAGE_UPLOAD_MAX_FILES=2):
+            response = self.client.post('/api/image-upload/batch/', {
+                'point_id': self.totem.id, 'point_type': 'totem', 'campus': 'Curico',
+                'files': [photo_file(name=f'{i}.jpg') for i in range(3)],
+            }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(APIClient().post('/api/image-upload/batch/', {}).status_code, 401)
+
+    def test_resumable_upload(self):
+        content = photo_file().getvalue()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        with override_settings(IMAGE_UPLOAD_CHUNK_SIZE=4096, IMAGE_UPLOAD_TEMP_DIR=temp_dir):
+            created = self.client.post('/api/image-upload/sessions/', {
+                'point_id': self.totem.id, 'point_type': 'totem', 'campus': 'Curico',
+                'filename': 'grande.jpg', 'size': len(content),
+            }, format='json')
+            self.assertEqual(created.status_code, 201)
+            url = f"/api/image-upload/sessions/{created.data['id']}/"
+
+            def put(offset, data):
+                return self.client.generic('PUT', url, data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+            self.assertEqual(put(0, content[:4096]).data['offset'], 4096)
+            # Reintento de una parte ya recibida: 409 con el offset desde donde seguir
+            retry = put(0, content[:4096])
+            self.assertEqual(retry.status_code, 409)
+            self.assertEqual(retry.data['offset'], 4096)
+            self.assertEqual(put(4096, content[4096:4096 * 3]).status_code, 413)
+            offset = self.client.get(url).data['offset']
+            while offset + 4096 < len(content):
+                offset = put(offset, content[offset:offset + 4096]).data['offset']
+            done = put(offset, content[offset:])
+            self.assertEqual(done.status_code, 201)
+            self.assertEqual(list(self.processed(done)['variants']), ['thumb', 'medium', 'full'])
+            self.assertEqual(self.client.get(url).data['image_upload'], done.data['id'])
+            self.assertEqual(os.listdir(temp_dir), [])
+            # Se perdió la respuesta y el cliente repite el último PUT: la misma imagen
+            repeated = put(len(content), b'')
+            self.assertEqual(repeated.status_code, 200, repeated.data)
+            self.assertEqual(repeated.data['id'], done.data['id'])
+            stored = ImageUpload.objects.get()
+            with stored.image.open('rb') as image:
+                self.assertEqual(image.read(), content)
+            stored.delete()
+            self.assertEqual(put(len(content), b'').status_code, 410)
+
+    def test_upload_metadata(self):
+        data = self.processed(self.upload(photo_file()))
+        self.assertTrue(data['available'])
+        self.assertEqual((data['width'], data['height']), (1200, 2400))
+        blob = ImageBlob.objects.get()
+        self.assertEqual((data['size'], data['sha256']), (blob.size, blob.sha256))
+        self.assertTrue(data['placeholder'].startswith('data:image/webp;base64,'))
+        with Image.open(BytesIO(base64.b64decode(data['placeholder'].split(',', 1)[1]))) as lqip:
+            self.assertEqual(lqip.size, (8, 16))
+
+        qr = self.client.post(f'/api/totems/{self.totem.id}/generate_qr/').data['image_upload']
+        self.assertTrue(qr['available'])
+        self.assertEqual(qr['variants'], {})
+        self.assertEqual(qr['width'], qr['height'])
+
+        # El archivo desaparece del storage: al reprocesar queda como no disponible
+        legacy = ImageUpload.objects.create(point_id=self.totem.id, point_type='totem', campus='Curico', image=default_storage.save('images/points/vieja.jpg', ContentFile(photo_file(size=(100, 100)).getvalue())))
+        call_command('generate_image_variants', stdout=open('/dev/null', 'w'))
+        legacy.refresh_from_db()
+        self.assertEqual((legacy.width, len(legacy.sha256)), (100, 64))
+        default_storage.delete(legacy.image.name)
+        with self.assertLogs('tasks.images', 'ERROR'):
+            call_command('generate_image_variants', all=True, stdout=open('/dev/null', 'w'))
+        listed = APIClient().get('/api/images/', {'point_id': self.totem.id, 'point_type': 'totem', 'campus': 'Curico'})
+        self.assertEqual([image['available'] for image in listed.data], [True, True, False])
+
+    def test_uploads_without_metadata_stay_available_until_processed(self):
+        # Subidas anteriores a los metadatos: la migración las deja en la cola del worker
+        content = photo_file(size=(100, 50), orientation=1).getvalue()
+        legacy = ImageUpload.objects.create(point_id=self.totem.id, point_type='totem', campus='Curico', image=default_storage.save('images/points/vieja.jpg', ContentFile(content)))
+        migration = importlib.import_module('tasks.migrations.0039_image_processing_queue')
+        migration.mark_existing_processed(apps, None)
+        legacy.refresh_from_db()
+        self.assertIsNone(legacy.processed_at)
+        listed = APIClient().get('/api/images/', {'point_id': self.totem.id, 'point_type': 'totem', 'campus': 'Curico'})
+        self.assertEqual([image['available'] for image in listed.data], [True])
+
+        call_command('process_images', once=True, stdout=open('/dev/null', 'w'))
+        legacy.refresh_from_db()
+        self.assertEqual((legacy.width, legacy.height), (100, 50))
+        self.assertIsNotNone(legacy.processed_at)
+
+    def test_large_photos_are_decoded_reduced(self):
+        response = self.upload(photo_file(size=(4000, 2000), orientation=1))
+        upload = ImageUpload.objects.get(pk=response.data['id'])
+        img, metadata = read_image(upload)
+        # El JPEG se decodifica a la mitad (draft) y los metadatos siguen siendo los del original
+        self.assertEqual(img.size, (2000, 1000))
+        self.assertEqual((metadata['width'], metadata['height']), (4000, 2000))
+        data = self.processed(response)
+        self.assertEqual((data['width'], data['variants']['full']['width']), (4000, 1920))
+
+    def test_existing_blob_variants_are_not_rewritten(self):
+        self.processed(self.upload(photo_file()))
+        files = self.media_files('images/variants')
+        mtimes = {name: os.stat(os.path.join(self.media_root, name)).st_mtime_ns for name in files}
+        # Se sirven como immutable: reprocesar no los borra ni los vuelve a escribir
+        with mock.patch.object(default_storage, 'save', side_effect=AssertionError('reescritura')):
+            call_command('generate_image_variants', all=True, stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.media_files('images/variants'), files)
+        self.assertEqual({name: os.stat(os.path.join(self.media_root, name)).st_mtime_ns for name in files}, mtimes)
+        self.assertEqual(ImageUpload.objects.get().variants['thumb']['webp'], next(name for name in files if name.endswith('thumb.webp')))
+
+    def test_duplicate_uploads_share_blob(self):
+        content = photo_file().getvalue()
+        first = self.processed(self.upload(BytesIO(content)))
+        # Sin volver a guardar el original ni esperar al worker: toma las variantes del primero
+        with self.assertNumQueries(13):
+            second = self.upload(BytesIO(content))
+        self.assertEqual(first['image'], second.data['image'])
+        self.assertEqual(first['srcset'], second.data['srcset'])
+        self.assertEqual(first['placeholder'], second.data['placeholder'])
+        self.assertIn('images/blobs/', first['image'])
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(len(self.media_files('images/blobs')), 1)
+        self.assertEqual(len(self.media_files('images/variants')), 6)
+
+        ImageUpload.objects.get(pk=first['id']).delete()
+        call_command('gc_image_blobs', grace_minutes=0, stdout=open('/dev/null', 'w'))
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+        self.assertEqual(len(self.media_files()), 7)
+
+        ImageUpload.objects.get(pk=second.data['id']).delete()
+        call_command('gc_image_blobs', stdout=open('/dev/null', 'w'))
+        self.assertEqual(ImageBlob.objects.count(), 1)
+        call_command('gc_image_blobs', grace_minutes=0, stdout=open('/dev/null', 'w'))
+        self.assertEqual(ImageBlob.objects.count(), 0)
+        self.assertEqual(self.media_files(), [])
+
+    def test_reused_blob_is_kept_by_gc(self):
+        content = photo_file().getvalue()
+        first = self.upload(BytesIO(content))
+        ImageUpload.objects.get(pk=first.data['id']).delete()
+        ImageBlob.objects.update(updated_at=timezone.now() - timedelta(hours=2))
+        # Se vuelve a subir el mismo archivo: antes de que la nueva fila lo referencie,
+        # el blob queda como recién usado
+        store_blob(ContentFile(content), 'JPEG')
+        call_command('gc_image_blobs', stdout=open('/dev/null', 'w'))
+        self.assertEqual(ImageBlob.objects.count(), 1)
+        self.assertEqual(len(self.media_files('images/blobs')), 1)
+
+    def test_gc_rechecks_references_before_deleting(self):
+        self.upload(photo_file())
+        blob = ImageBlob.objects.get()
+        cutoff = timezone.now() + timedelta(minutes=1)
+        # Se listó como sin referencias, pero al borrarlo una subida ya lo usa
+        self.assertFalse(GcImageBlobsCommand().delete_blob(blob, cutoff))
+        self.assertEqual(ImageBlob.objects.count(), 1)
+        ImageUpload.objects.all().delete()
+        self.assertTrue(GcImageBlobsCommand().delete_blob(blob, cutoff))
+        self.assertEqual(self.media_files('images/blobs'), [])
+
+    def test_adopt_legacy_uploads(self):
+        content = photo_file(size=(400, 200)).getvalue()
+        names = [default_storage.save(f'images/points/Curico/{i}_foto.jpg', ContentFile(content)) for i in range(2)]
+        for name in names:
+            ImageUpload.objects.create(point_id=self.totem.id, point_type='totem', campus='Curico', image=name)
+        call_command('gc_image_blobs', adopt=True, stdout=open('/dev/null', 'w'))
+        self.assertEqual(ImageBlob.objects.get().refcount, 2)
+        self.assertEqual(set(ImageUpload.objects.values_list('image', flat=True)), {ImageBlob.objects.get().file.name})
+        self.assertEqual(len(self.media_files('images/points')), 0)
+        self.assertEqual(len(self.media_files('images/blobs')), 1)
+
+
+class MediaServingTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 4
+        digest = 'ab' * 32
+        self.blob = default_storage.save(f'images/blobs/ab/{digest}.jpg', ContentFile(self.content))
+        self.legacy = default_storage.save('images/points/Curico/1_foto.jpg', ContentFile(self.content))
+
+    def get(self, name, **headers):
+        response = self.client.get(f'/media/{name}', **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_full_file_and_revalidation(self):
+        response = self.get(self.blob)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        self.assertEqual(self.get(self.blob, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(self.blob, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        legacy = self.get(self.legacy)
+        self.assertEqual(legacy['Cache-Control'], 'public, no-cache')
+        self.assertEqual(self.get('images/points/no-existe.jpg').status_code, 404)
+        self.assertEqual(self.get('../tasks/models.py').status_code, 404)
+        self.assertEqual(self.get('images/points').status_code, 404)
+
+    def test_range_requests(self):
+        partial = self.get(self.blob, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b''.join(partial.streaming_content), self.content[10:20])
+        self.assertEqual(partial['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(partial['Content-Length'], '10')
+
+        suffix = self.get(self.blob, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(suffix.streaming_content), self.content[-5:])
+        tail = self.get(self.blob, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(b''.join(tail.streaming_content), self.content[1000:])
+
+        invalid = self.get(self.blob, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(invalid.status_code, 416)
+        self.assertEqual(invalid['Content-Range'], f'bytes */{len(self.content)}')
+        # Si el archivo cambió (If-Range no coincide) se envía completo
+        self.assertEqual(self.get(self.blob, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"otro"').status_code, 200)
+        etag = self.get(self.blob)['ETag']
+        self.assertEqual(self.get(self.blob, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_sendfile_offload(self):
+        response = self.get(self.blob)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.blob}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+        with override_settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.get(self.legacy)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, self.legacy))
+
+    def test_uploaded_urls_are_immutable(self):
+        client = admin_client()
+        totem = TotemQR.objects.create(latitude=-34.98, longitude=-71.23, campus='Curico')
+        uploaded = client.post('/api/image-upload/', {
+            'point_id': totem.id, 'point_type': 'totem', 'campus': 'Curico', 'file': photo_file(),
+        }, format='multipart')
+        call_command('process_images', once=True, stdout=open('/dev/null', 'w'))
+        upload = ImageUpload.objects.get(pk=uploaded.data['id'])
+        for name in [upload.image.name, upload.variants['thumb']['webp']]:
+            response = self.get(name)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('immutable', response['Cache-Control'])
+
+
+class GroupedImageListTests(TestCase):
+    def setUp(self):
+        self.totems = [TotemQR.objects.create(latitude=-34.98, longitude=-71.23, campus='Curico') for _ in range(3)]
+        self.reception = ReceptionQR.objects.create(latitude=-34.98, longitude=-71.23, campus='Curico')
+        for i, totem in enumerate(self.totems):
+            for j in range(i + 1):
+                ImageUpload.objects.create(point_id=totem.id, point_type='totem', campus='Curico', image=f'images/points/t{i}_{j}.jpg')
+        ImageUpload.objects.create(point_id=self.reception.id, point_type='reception', campus='Curico', image='images/points/r.jpg')
+        ImageUpload.objects.create(point_id=self.totems[0].id, point_type='totem', campus='Talca', image='images/points/otro.jpg')
+
+    def test_campus_grouped_in_one_query(self):
+        with self.assertNumQueries(2):
+            response = APIClient().get('/api/images/', {'campus': 'Curico'})
+        self.assertEqual(response.status_code, 200)
+        totems = response.data['points']['totem']
+        self.assertEqual({key: len(images) for key, images in totems.items()}, {str(t.id): i + 1 for i, t in enumerate(self.totems)})
+        self.assertEqual(len(response.data['points']['reception'][str(self.reception.id)]), 1)
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            cached = APIClient().get('/api/images/', {'campus': 'Curico'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        ImageUpload.objects.create(point_id=self.reception.id, point_type='reception', campus='Curico', image='images/points/r2.jpg')
+        changed = APIClient().get('/api/images/', {'campus': 'Curico'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        # Otro campus no invalida este
+        ImageUpload.objects.create(point_id=1, point_type='totem', campus='Talca', image='images/points/otro2.jpg')
+        again = APIClient().get('/api/images/', {'campus': 'Curico'}, HTTP_IF_NONE_MATCH=changed['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_point_ids(self):
+        ids = f'{self.totems[0].id},{self.totems[2].id}'
+        response = APIClient().get('/api/images/', {'campus': 'Curico', 'point_type': 'totem', 'point_ids': ids})
+        self.assertEqual(sorted(response.data['points']['totem']), sorted([str(self.totems[0].id), str(self.totems[2].id)]))
+        self.assertEqual(response.data['points']['reception'], {})
+
+        self.assertEqual(APIClient().get('/api/images/', {'campus': 'Curico', 'point_ids': ids}).status_code, 400)
+        self.assertEqual(APIClient().get('/api/images/', {'campus': 'Curico', 'point_type': 'totem', 'point_ids': 'a,b'}).status_code, 400)
+        # El modo de un solo punto no cambia
+        single = APIClient().get('/api/images/', {'campus': 'Curico', 'point_type': 'totem', 'point_id': self.totems[1].id})
+        self.assertEqual(len(single.data), 2)
+
+
+class FakeJiraHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que el cliente pueda reutilizar la conexión
+    protocol_version = 'HTTP/1.1'
+    # Códigos a devolver, en orden; el último se repite
+    status_codes = [201]
+    # Índices que fallan dentro de una creación masiva
+    bulk_failures = set()
+    # Cuerpo fijo en lugar del JSON habitual (p. ej. una página de un proxy)
+    raw_body = None
+    received = []
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        FakeJiraHandler.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.received.append((self.path, body))
+        code = self.status_codes[min(len(self.received), len(self.status_codes)) - 1]
+        if code >= 400:
+            payload = {'errorMessages': ['fallo']}
+        elif self.path.endswith('/bulk'):
+            updates = body['issueUpdates']
+            ok = [i for i in range(len(updates)) if i not in self.bulk_failures]
+            payload = {
+                'issues': [{'id': str(i), 'key': f'SIG-{i + 1}'} for i in ok],
+                'errors': [{'status': 400, 'elementErrors': {'errors': {'summary': 'inválido'}}, 'failedElementNumber': i} for i in sorted(self.bulk_failures)],
+            }
+            code = 201 if not self.bulk_failures else 400
+        else:
+            payload = {'id': str(len(self.received)), 'key': f'SIG-{len(self.received)}'}
+        content = self.raw_body or json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class JiraOutboxTests(TestCase):
+    payload = {
+        'nombre': 'Ana', 'apellido': 'Pérez', 'email': 'ana@example.com', 'telefono': '123',
+        'tipo_incidente': 'Acoso_sexual', 'fecha_incidente': '2025-01-01',
+        'lugar_incidente': 'Biblioteca', 'descripcion': 'Descripción', 'campus': 'Curico',
+    }
+
+    def setUp(self):
+        FakeJiraHandler.received = []
+        FakeJiraHandler.connections = 0
+        FakeJiraHandler.bulk_failures = set()
+        FakeJiraHandler.raw_body = None
+        jira.breaker.reset()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeJiraHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        settings_override = override_settings(JIRA_API_URL=f'http://127.0.0.1:{self.server.server_port}')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = admin_client()
+
+    def test_denuncia_is_queued_and_delivered_by_worker(self):
+        FakeJiraHandler.status_codes = [201]
+        response = self.client.post('/api/denuncias/', self.payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        # La petición no llama a Jira
+        self.assertEqual(FakeJiraHandler.received, [])
+        self.assertEqual(JiraOutbox.objects.get().status, 'pending')
+
+        call_command('process_jira_outbox', once=True, stdout=open('/dev/null', 'w'))
+        entry = JiraOutbox.objects.get()
+        self.assertEqual(entry.status, 'sent')
+        self.assertEqual(Denuncia.objects.get().jira_key, 'SIG-1')
+        path, body = FakeJiraHandler.received[0]
+        self.assertEqual(path, '/rest/api/3/issue')
+        self.assertEqual(body['fields']['summary'], 'Caso de acogida: Ana Pérez')
+
+    def test_failures_back_off_and_dead_letter(self):
+        FakeJiraHandler.status_codes = [503]
+        self.client.post('/api/denuncias/', self.payload, format='json')
+        call_command('process_jira_outbox', once=True, max_attempts=2, stderr=open('/dev/null', 'w'))
+        entry = JiraOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ('pending', 1))
+        # Aún no vence el próximo intento
+        call_command('process_jira_outbox', once=True, max_attempts=2, stderr=open('/dev/null', 'w'))
+        self.assertEqual(len(FakeJiraHandler.received), 1)
+
+        JiraOutbox.objects.update(next_attempt_at=entry.created_at)
+        call_command('process_jira_outbox', once=True, max_attempts=2, stderr=open('/dev/null', 'w'))
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ('dead', 2))
+        self.assertIn('503', entry.last_error)
+        self.assertIsNone(Denuncia.objects.get().jira_key)
+
+    def test_connection_is_reused(self):
+        FakeJiraHandler.status_codes = [201]
+        for _ in range(3):
+            self.client.post('/api/denuncias/', self.payload, format='json')
+        call_command('process_jira_outbox', once=True, stdout=open('/dev/null', 'w'))
+        self.assertEqual(len(FakeJiraHandler.received), 3)
+        self.assertEqual(FakeJiraHandler.connections, 1)
+
+    def test_bulk_mode(self):
+        FakeJiraHandler.status_codes = [201]
+        FakeJiraHandler.bulk_failures = {1}
+        for _ in range(3):
+            self.client.post('/api/denuncias/', self.payload, format='json')
+        call_command('process_jira_outbox', once=True, bulk=True, stdout=open('/dev/null', 'w'), stderr=open('/dev/null', 'w'))
+        self.assertEqual(len(FakeJiraHandler.received), 1)
+        path, body = FakeJiraHandler.received[0]
+        self.assertEqual(path, '/rest/api/3/issue/bulk')
+        self.assertEqual(len(body['issueUpdates']), 3)
+        entries = list(JiraOutbox.objects.order_by('id'))
+        self.assertEqual([entry.status for entry in entries], ['sent', 'dead', 'sent'])
+        self.assertEqual(
+            list(Denuncia.objects.order_by('id').values_list('jira_key', flat=True)),
+            ['SIG-1', None, 'SIG-3'],
+        )
+
+    def test_circuit_breaker_stops_calls(self):
+        FakeJiraHandler.status_codes = [503]
+        self.addCleanup(setattr, jira.breaker, 'failure_threshold', jira.breaker.failure_threshold)
+        jira.breaker.failure_threshold = 2
+        for _ in range(4):
+            self.client.post('/api/denuncias/', self.payload, format='json')
+        call_command('process_jira_outbox', once=True, stderr=open('/dev/null', 'w'))
+        self.assertEqual(len(FakeJiraHandler.received), 2)
+        # Las entradas no enviadas conservan sus intentos para cuando Jira vuelva
+        self.assertEqual(
+            list(JiraOutbox.objects.order_by('id').values_list('attempts', flat=True)),
+            [1, 1, 0, 0],
+        )
+        self.assertEqual(set(JiraOutbox.objects.values_list('status', flat=True)), {'pending'})
+
+    def test_expired_lease_is_reclaimed(self):
+        FakeJiraHandler.status_codes = [201]
+        self.client.post('/api/denuncias/', self.payload, format='json')
+        # Reservada por un worker que sigue trabajando: no se toca
+        JiraOutbox.objects.update(status='processing', next_attempt_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(jira.process_outbox(), [])
+        # El worker murió y el lease venció: otro la retoma
+        JiraOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(jira.process_outbox()), 1)
+        self.assertEqual(JiraOutbox.objects.get().status, 'sent')
+
+    def test_crashing_entry_is_dead_lettered(self):
+        self.client.post('/api/denuncias/', self.payload, format='json')
+        # Cada intento hace caer al worker antes de guardar el resultado
+        for attempt in range(1, 3):
+            with mock.patch.object(jira, 'create_issue', side_effect=SystemExit):
+                with self.assertRaises(SystemExit):
+                    jira.process_outbox(max_attempts=2)
+            self.assertEqual(JiraOutbox.objects.get().attempts, attempt)
+            JiraOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jira.process_outbox(max_attempts=2), [])
+        entry = JiraOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ('dead', 2))
+        self.assertEqual(FakeJiraHandler.received, [])
+
+    def test_invalid_json_response_is_a_failed_attempt(self):
+        FakeJiraHandler.status_codes = [201]
+        FakeJiraHandler.raw_body = b'<html>Mantenimiento</html>'
+        self.client.post('/api/denuncias/', self.payload, format='json')
+        processed = jira.process_outbox()
+        self.assertEqual(len(processed), 1)
+        entry = JiraOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ('pending', 1))
+        self.assertIn('Respuesta inválida', entry.last_error)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import uuid
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from .images import copy_shared, oriented_size
+from .models import ImageBlob, ImageUpload
+
+# Formatos que se aceptan según el contenido real del archivo, no su extensión
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+BLOB_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+# Originales guardados por hash de contenido: un mismo nombre siempre tiene los mismos bytes
+BLOB_DIR = 'images/blobs'
+# Bloque de lectura y escritura al copiar el cuerpo de la petición a disco
+STREAM_BLOCK = 64 * 1024
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """Descarta mientras se recibe cada archivo que supera IMAGE_UPLOAD_MAX_BYTES.
+
+    Va primero en la lista de handlers: el resto del archivo se lee de la red pero
+    no llega al archivo temporal, y su nombre queda en `rejected`.
+    """
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or settings.IMAGE_UPLOAD_MAX_BYTES
+        self.rejected = []
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.rejected.append(self.file_name)
+            raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def validate_image(file):
+    """Verifica tamaño, formato real y dimensiones; deja el archivo al inicio.
+
+    Solo lee el encabezado: devuelve el formato y el tamaño ya orientado sin
+    decodificar la imagen.
+    """
+    if file.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(f"El archivo supera el máximo de {settings.IMAGE_UPLOAD_MAX_BYTES // (1024 * 1024)} MB.")
+    try:
+        file.seek(0)
+        with Image.open(file) as img:
+            format, (width, height) = img.format, oriented_size(img)
+            if format not in ALLOWED_FORMATS:
+                raise ValidationError(f"Formato no soportado; se aceptan {', '.join(ALLOWED_FORMATS)}.")
+            if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+                raise ValidationError(f"La imagen de {width}x{height} supera el máximo de {settings.IMAGE_UPLOAD_MAX_PIXELS} píxeles.")
+            img.verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise ValidationError('El archivo no es una imagen válida.')
+    finally:
+        file.seek(0)
+    return format, width, height
+
+
+def file_sha256(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def blob_name(digest, format):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}.{BLOB_EXTENSIONS[format]}"
+
+
+def store_blob(file, format):
+    """ImageBlob con el contenido de file; si ya existe uno igual no se vuelve a guardar."""
+    digest = file_sha256(file)
+    blob = ImageBlob.objects.filter(sha256=digest).first()
+    # Se marca como recién usado para que gc_image_blobs respete el período de gracia
+    # hasta que la nueva subida lo referencie; si lo eliminó entretanto, se vuelve a crear
+    if blob is not None and ImageBlob.objects.filter(pk=blob.pk).update(updated_at=timezone.now()):
+        return blob
+    name = blob_name(digest, format)
+    if not default_storage.exists(name):
+        # El storage copia el archivo por bloques (File.chunks), sin cargarlo entero en memoria
+        name = default_storage.save(name, file)
+    try:
+        with transaction.atomic():
+            return ImageBlob.objects.create(sha256=digest, file=name, size=file.size)
+    except IntegrityError:
+        # Otra subida del mismo archivo lo creó al mismo tiempo
+        return ImageBlob.objects.get(sha256=digest)
+
+
+def save_point_image(file, format, width, height, point_id, point_type, campus, user=None):
+    """Guarda la imagen ya validada; las variantes se generan después, fuera de la petición.
+
+    Queda disponible de inmediato con las dimensiones del encabezado y se sirve el
+    original hasta que `manage.py process_images` genera variantes y placeholder,
+    salvo que otra subida del mismo contenido ya los tenga.
+    """
+    blob = store_blob(file, format)
+    image_upload = ImageUpload.objects.create(
+        point_id=point_id,
+        point_type=point_type,
+        campus=campus,
+        image=blob.file.name,
+        blob=blob,
+        uploaded_by=user,
+        width=width,
+        height=height,
+        size=blob.size,
+        sha256=blob.sha256,
+    )
+    copy_shared(image_upload)
+    return image_upload
+
+
+def session_path(session):
+    return os.path.join(settings.IMAGE_UPLOAD_TEMP_DIR, f'{session.pk}.part')
+
+
+def receive_chunk(session, stream, length):
+    """Copia hasta length bytes de stream a un archivo propio de esta parte.
+
+    Se hace sin bloquear la sesión: lo lento es la red. Devuelve (ruta, recibidos).
+    """
+    path = os.path.join(settings.IMAGE_UPLOAD_TEMP_DIR, f'{session.pk}.{uuid.uuid4().hex}.chunk')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as chunk:
+        remaining = length
+        while remaining:
+            block = stream.read(min(STREAM_BLOCK, remaining))
+            if not block:
+                break
+            chunk.write(block)
+            remaining -= len(block)
+    return path, length - remaining
+
+
+def append_chunk(session, chunk_path):
+    """Agrega la parte recibida al archivo parcial de la sesión en session.offset.
+
+    Se llama con la fila de la sesión bloqueada; es una copia local de a lo sumo
+    IMAGE_UPLOAD_CHUNK_SIZE bytes. Devuelve los bytes agregados.
+    """
+    path = session_path(session)
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as partial, open(chunk_path, 'rb') as chunk:
+        partial.seek(session.offset)
+        written = 0
+        while block := chunk.read(STREAM_BLOCK):
+            partial.write(block)
+            written += len(block)
+        partial.truncate()
+    return written
+
+
+def complete_session(session, user=None):
+    """Valida el archivo reunido y lo guarda como imagen del punto."""
+    path = session_path(session)
+    try:
+        with open(path, 'rb') as partial:
+            file = File(partial, name=session.filename)
+            format, width, height = validate_image(file)
+            image_upload = save_point_image(file, format, width, height, session.point_id, session.point_type, session.campus, user)
+    finally:
+        discard_session_file(session)
+    return image_upload
+
+
+def discard_session_file(session):
+    discard_file(session_path(session))
+
+
+def discard_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
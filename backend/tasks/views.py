@@ -1,23 +1,280 @@
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework import permissions, status, viewsets
-from .models import TotemQR, ReceptionQR, Path, PathPoint, UserProfile, Denuncia, ImageUpload, ReporteAtencion
-from .serializers import TotemQRSerializer, ReceptionQRSerializer, PathSerializer, DenunciaSerializer, UserProfileSerializer, ImageUploadSerializer, ReporteAtencionSerializer
+from rest_framework import filters, permissions, status, viewsets
+from rest_framework.exceptions import ValidationError
+from .models import TotemQR, ReceptionQR, Path, PathPoint, UserProfile, Denuncia, ImageUpload, ReporteAtencion, DataVersion, TotemRoute, JiraOutbox, Tombstone, QRBatchJob, ImageUploadSession
+from .serializers import TotemQRSerializer, ReceptionQRSerializer, PathSerializer, DenunciaSerializer, UserProfileSerializer, ImageUploadSerializer, ReporteAtencionSerializer, QRBatchJobSerializer, geometry_options
 from .permissions import RoleBasedPermission
-from rest_framework.parsers import MultiPartParser, FormParser
+from .pagination import DenunciaCursorPagination
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from django.core.files.storage import default_storage
 from django.conf import settings
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
 from rest_framework.permissions import IsAuthenticated, AllowAny
-import math
-import requests
-import qrcode
-from io import BytesIO
-from django.core.files.base import ContentFile
+import os
+import re
+from datetime import datetime, time, timedelta
+from django.db.models import Count, Q
+from .snapshot import get_snapshot, snapshot_etag
+from .search import search_denuncias
+from .stats import BUCKETS, dashboard_stats, move_estado
+from .events import REPORTES_KEY, publish_reportes_estado, reporte_stream, reportes_campus_key
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.urls import replace_query_param
+from .geo import reception_index
+from .routing import campus_graph, compute_totem_routes
+from .qr import QR_MAX_SIZE, QR_MIN_SIZE, QR_OUTPUTS, point_url, qr_digest, render_qr, store_point_qr
+from .media import cache_headers, content_type, media_file, read_range, requested_range, sendfile_headers
+from .uploads import SizeLimitUploadHandler, append_chunk, complete_session, discard_file, discard_session_file, receive_chunk, save_point_image, validate_image
+
+def start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+class EventStreamRenderer(BaseRenderer):
+    # Solo para la negociación de contenido de los streams SSE; la respuesta ya viene armada
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+class QRImageRenderer(BaseRenderer):
+    # Permite pedir el QR con Accept: image/png o image/svg+xml; los errores siguen en JSON
+    media_type = 'image/*'
+    format = 'qr'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return JSONRenderer().render(data)
+
+class DeltaSyncMixin:
+    """Sincronización incremental para listados: ?since=<ISO 8601> devuelve solo
+    lo creado o modificado desde esa marca, los ids eliminados y una nueva marca.
+
+    La marca devuelta queda SYNC_LAG antes del momento de la consulta para no
+    perder filas de transacciones que aún no confirmaban; por eso una misma fila
+    puede llegar dos veces y el cliente debe aplicarlas por id.
+
+    Las filas llegan en páginas de SYNC_PAGE_SIZE ordenadas por (updated_at, id):
+    mientras haya más la respuesta trae 'next' y el cliente lo sigue; los
+    eliminados y la marca vienen en la última página. Las eliminaciones se
+    guardan TOMBSTONE_RETENTION_DAYS días (`manage.py prune_tombstones`): una
+    marca más antigua responde 410 y el cliente debe volver a cargar el listado.
+    """
+    tombstone_model = None
+    SYNC_LAG = timedelta(seconds=5)
+    SYNC_PAGE_SIZE = 500
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if not since:
+            return super().list(request, *args, **kwargs)
+        since = self.sync_timestamp('since', since)
+        if since < timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS):
+            return Response(
+                {'detail': 'La marca es anterior a la retención de eliminaciones; se requiere sincronización completa.'},
+                status=status.HTTP_410_GONE,
+            )
+
+        watermark = timezone.now() - self.SYNC_LAG
+        queryset = self.filter_queryset(self.get_queryset()).filter(updated_at__gte=since).order_by('updated_at', 'id')
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            # Posición tras la última fila de la página anterior
+            updated_at, _, pk = cursor.rpartition('_')
+            if not pk.isdigit():
+                raise ValidationError({'cursor': 'Cursor inválido.'})
+            updated_at = self.sync_timestamp('cursor', updated_at)
+            queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=int(pk)))
+        rows = list(queryset[:self.SYNC_PAGE_SIZE + 1])
+        if len(rows) > self.SYNC_PAGE_SIZE:
+            rows = rows[:self.SYNC_PAGE_SIZE]
+            last = rows[-1]
+            next_url = request.build_absolute_uri(replace_query_param(
+                request.get_full_path(), 'cursor', f"{last.updated_at.isoformat()}_{last.pk}",
+            ))
+            return Response({'results': self.get_serializer(rows, many=True).data, 'next': next_url})
+
+        deleted = Tombstone.objects.filter(model=self.tombstone_model, deleted_at__gte=since)
+        campus = request.query_params.get('campus')
+        if campus:
+            deleted = deleted.filter(campus=campus)
+        return Response({
+            'results': self.get_serializer(rows, many=True).data,
+            'deleted': sorted(set(deleted.values_list('object_id', flat=True))),
+            'watermark': watermark.isoformat(),
+            'next': None,
+        })
+
+    def sync_timestamp(self, name, value):
+        # Un "+00:00" sin codificar en la URL llega como " 00:00"
+        value = re.sub(r' (\d{2}:?\d{2})$', r'+\1', value)
+        try:
+            value = parse_datetime(value)
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValidationError({name: 'Marca inválida, se espera una fecha ISO 8601.'})
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+class BulkEstadoMixin:
+    """POST bulk_estado: cambia el estado (y opcionalmente el comentario) de muchas
+    filas con un solo UPDATE. Recibe {"estado", "ids": [...]} o {"estado",
+    "filter": {...}} con los mismos filtros que el listado.
+    """
+    bulk_estados = ()
+    bulk_comment_field = None
+    rollup_kind = None
+    BULK_MAX_IDS = 1000
+
+    @action(detail=False, methods=['post'], permission_classes=[RoleBasedPermission])
+    def bulk_estado(self, request):
+        estado = request.data.get('estado')
+        if estado not in self.bulk_estados:
+            raise ValidationError({'estado': f"Debe ser uno de: {', '.join(self.bulk_estados)}."})
+        queryset = self.bulk_queryset(request.data)
+        values = {'estado': estado, 'updated_at': timezone.now()}
+        if 'comentarios' in request.data:
+            if self.bulk_comment_field is None:
+                raise ValidationError({'comentarios': 'Este recurso no admite comentarios masivos.'})
+            values[self.bulk_comment_field] = request.data['comentarios']
+
+        with transaction.atomic():
+            # Se bloquean las filas para que los conteos del dashboard no se desfasen
+            # con una edición concurrente
+            pks = list(queryset.select_for_update().values_list('pk', flat=True))
+            queryset = queryset.model.objects.filter(pk__in=pks)
+            if self.bulk_comment_field not in values:
+                # Sin comentario, las filas que ya tienen el estado quedan intactas
+                queryset = queryset.exclude(estado=estado)
+            changed = list(queryset.values_list('pk', 'campus'))
+            move_estado(self.rollup_kind, queryset, estado)
+            updated = queryset.update(**values)
+            self.after_bulk_estado([pk for pk, _ in changed], {campus for _, campus in changed}, estado)
+        return Response({'updated': updated})
+
+    def bulk_queryset(self, data):
+        ids = data.get('ids')
+        filter_values = data.get('filter')
+        if (ids is None) == (filter_values is None):
+            raise ValidationError({'detail': 'Se requiere "ids" o "filter", no ambos.'})
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+                raise ValidationError({'ids': 'Debe ser una lista de ids numéricos.'})
+            if len(ids) > self.BULK_MAX_IDS:
+                raise ValidationError({'ids': f'Máximo {self.BULK_MAX_IDS} ids por petición.'})
+            return self.queryset.model.objects.filter(pk__in=ids)
+        if not isinstance(filter_values, dict):
+            raise ValidationError({'filter': 'Debe ser un objeto con al menos un filtro.'})
+        unknown = set(filter_values) - set(self.filter_params)
+        if unknown:
+            raise ValidationError({'filter': f"Filtros no soportados: {', '.join(sorted(unknown))}."})
+        # apply_filters ignora los valores vacíos: un filtro que solo tiene vacíos
+        # cambiaría la tabla completa
+        filter_values = {field: value for field, value in filter_values.items() if value not in (None, '')}
+        if not filter_values:
+            raise ValidationError({'filter': 'Debe ser un objeto con al menos un filtro.'})
+        invalid = sorted(field for field, value in filter_values.items() if not isinstance(value, str))
+        if invalid:
+            raise ValidationError({'filter': f"Los filtros deben ser texto: {', '.join(invalid)}."})
+        return self.apply_filters(self.queryset.model.objects.all(), filter_values)
+
+    def after_bulk_estado(self, pks, campuses, estado):
+        pass
+
+def generate_point_qr(request, point_type, point):
+    # El QR se identifica por el hash de su contenido: si la URL del punto no
+    # cambió se devuelve la imagen ya guardada sin volver a dibujarla
+    image_upload, created = store_point_qr(point_type, point, user=request.user)
+    qr_image = request.build_absolute_uri(default_storage.url(image_upload.image.name))
+    if point.qr_image != qr_image:
+        point.qr_image = qr_image
+        point.save(update_fields=['qr_image'])
+
+    serializer = ImageUploadSerializer(image_upload, context={'request': request})
+    return Response({
+        'qr_image': point.qr_image,
+        'image_upload': serializer.data
+    }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+# El contenido de un QR cambia solo si se edita el campus del punto; el ETag
+# permite revalidar sin volver a dibujarlo
+QR_CACHE_SECONDS = 24 * 60 * 60
+QR_CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+def point_qr_image(request, point_type, point):
+    # QR del punto dibujado al vuelo en el formato y tamaño pedidos, sin pasar por el storage
+    output = request.query_params.get('output', 'png')
+    if output not in QR_OUTPUTS:
+        raise ValidationError({'output': f"Debe ser uno de: {', '.join(QR_OUTPUTS)}."})
+    size = request.query_params.get('size')
+    if size is not None:
+        try:
+            size = int(size)
+        except ValueError:
+            raise ValidationError({'size': 'Debe ser un entero.'})
+        if not QR_MIN_SIZE <= size <= QR_MAX_SIZE:
+            raise ValidationError({'size': f'Debe estar entre {QR_MIN_SIZE} y {QR_MAX_SIZE} píxeles.'})
+
+    data = point_url(point_type, point)
+    etag = f'"{qr_digest(data, output=output, size=size)}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(render_qr(data, output, size), content_type=QR_CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'inline; filename="qr_{point_type}_{point.id}.{output}"'
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=QR_CACHE_SECONDS)
+    return response
 
 def home(request):
     return HttpResponse("Bienvenido al backend de mapas QR")
 
+@require_safe
+def serve_media(request, path):
+    """Archivos de MEDIA_ROOT en producción, en lugar de django.views.static.serve.
+
+    Con MEDIA_SENDFILE el envío lo hace el servidor web (X-Sendfile o
+    X-Accel-Redirect) y el worker solo arma los headers; sin él se atiende
+    Range y el archivo se envía por bloques. Los nombres por hash de contenido
+    se cachean como inmutables y el resto se revalida con ETag/Last-Modified.
+    """
+    full_path, stat = media_file(path)
+    headers = cache_headers(path, stat)
+    response = get_conditional_response(request, etag=headers['ETag'], last_modified=int(stat.st_mtime))
+    if response is None:
+        offload = sendfile_headers(path, full_path)
+        byte_range = None if offload else requested_range(request, stat.st_size, headers['ETag'], stat.st_mtime)
+        if offload:
+            response = HttpResponse(content_type=content_type(full_path))
+            for header, value in offload.items():
+                response[header] = value
+        elif byte_range == 'invalid':
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type(full_path))
+            response['Content-Length'] = stat.st_size
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(read_range(full_path, start, end), status=status.HTTP_206_PARTIAL_CONTENT, content_type=content_type(full_path))
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type(full_path))
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
 class TotemQRViewSet(viewsets.ModelViewSet):
     serializer_class = TotemQRSerializer
     permission_classes = [AllowAny]
@@ -35,73 +292,81 @@ class TotemQRViewSet(viewsets.ModelViewSet):
             return [RoleBasedPermission()]
         return [AllowAny()]  # Allow GET and nearest_path for all
 
+    def _route_response(self, totem, reception, coordinates, distance):
+        return Response({
+            "name": f"Camino desde {totem.name} a {reception['name']}",
+            "points": [
+                {"latitude": lat, "longitude": lon, "order": order}
+                for order, (lat, lon) in enumerate(coordinates, start=1)
+            ],
+            "campus": totem.campus,
+            "reception": reception['id'],
+            "distance": round(distance, 1),
+        })
+
     @action(detail=True, methods=['get'])
     def nearest_path(self, request, pk=None):
-        totem = self.get_object()
-        receptions = ReceptionQR.objects.filter(campus=totem.campus)
-        if not receptions:
-            return Response({"error": "No hay recepciones disponibles en este campus"}, status=404)
+        operative_only = request.query_params.get('status', 'Operativo') != 'all'
+        if operative_only and str(pk).isdigit():
+            # Camino habitual del escaneo: una sola consulta a la tabla precalculada
+            stored = TotemRoute.objects.filter(totem_id=pk, reception__status='Operativo')
+            campus = request.query_params.get('campus', None)
+            if campus is not None:
+                stored = stored.filter(totem__campus=campus)
+            stored = stored.select_related('totem', 'reception').first()
+            if stored is not None:
+                reception = {'id': stored.reception.id, 'name': stored.reception.name}
+                return self._route_response(stored.totem, reception, stored.coordinates, stored.distance)
 
-        nearest_reception = min(receptions, key=lambda r: math.sqrt(
-            (r.latitude - totem.latitude) ** 2 + (r.longitude - totem.longitude) ** 2
-        ))
+        totem = self.get_object()
+        if operative_only:
+            rows = compute_totem_routes(totem)
+            if not rows:
+                return Response({"error": "No hay recepciones disponibles en este campus"}, status=404)
+            reception = {'id': rows[0].reception.id, 'name': rows[0].reception.name}
+            return self._route_response(totem, reception, rows[0].coordinates, rows[0].distance)
+
+        version = DataVersion.get(DataVersion.campus_key(totem.campus))
+        # Ruta real sobre los caminos del campus; si el totem no está conectado a la
+        # red se vuelve a la línea recta hacia la recepción más cercana
+        route = campus_graph(totem.campus, operative_only=False, version=version).route(totem.latitude, totem.longitude)
+        if route is None:
+            nearest = reception_index(totem.campus, operative_only=False).nearest(totem.latitude, totem.longitude)
+            if not nearest:
+                return Response({"error": "No hay recepciones disponibles en este campus"}, status=404)
+            distance, reception_id, reception = nearest[0]
+            route = {
+                'reception': reception,
+                'distance': distance,
+                'coordinates': [(totem.latitude, totem.longitude), (reception['latitude'], reception['longitude'])],
+            }
+        return self._route_response(totem, route['reception'], route['coordinates'], route['distance'])
 
-        path = {
-            "name": f"Camino desde {totem.name} a {nearest_reception.name}",
-            "points": [
-                {"latitude": totem.latitude, "longitude": totem.longitude, "order": 1},
-                {"latitude": nearest_reception.latitude, "longitude": nearest_reception.longitude, "order": 2},
-            ],
-            "campus": totem.campus
-        }
-        serializer = PathSerializer(data=path)
-        serializer.is_valid(raise_exception=True)
-        return Response(serializer.data)
+    @action(detail=True, methods=['get'])
+    def nearest_receptions(self, request, pk=None):
+        totem = self.get_object()
+        try:
+            k = min(max(int(request.query_params.get('k', 5)), 1), 50)
+        except ValueError:
+            return Response({'detail': 'El parámetro k debe ser un entero.'}, status=status.HTTP_400_BAD_REQUEST)
+        # Por defecto solo se consideran recepciones operativas; ?status=all incluye todas
+        operative_only = request.query_params.get('status', 'Operativo') != 'all'
+        nearest = reception_index(totem.campus, operative_only=operative_only).nearest(totem.latitude, totem.longitude, k=k)
+        return Response([
+            {**reception, 'distance': round(distance, 1)}
+            for distance, reception_id, reception in nearest
+        ])
 
     @action(detail=True, methods=['post'], permission_classes=[RoleBasedPermission])
     def generate_qr(self, request, pk=None):
         totem = self.get_object()
         if not request.user.is_authenticated or request.user.userprofile.role not in ['admin', 'superuser']:
             return Response({'detail': 'Solo administradores pueden generar QRs.'}, status=status.HTTP_403_FORBIDDEN)
+        return generate_point_qr(request, 'totem', totem)
 
-        # Generar URL para el QR
-        qr_url = f"${process.env.REACT_APP_API_BASE_URL}/mapa2/{totem.campus}?pointId={totem.id}&pointType=totem"
-        
-        # Crear el QR
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_url)
-        qr.make(fit=True)
-        
-        # Convertir a imagen
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        file_name = f"qr_totem_{totem.id}_{totem.campus}.png"
-        file_content = ContentFile(buffer.getvalue(), name=file_name)
-
-        # Guardar en ImageUpload
-        image_upload = ImageUpload.objects.create(
-            point_id=totem.id,
-            point_type='totem',
-            campus=totem.campus,
-            image=file_content,
-            uploaded_by=request.user
-        )
-
-        # Actualizar el campo qr_image
-        totem.qr_image = request.build_absolute_uri(default_storage.url(image_upload.image.name))
-        totem.save()
-
-        serializer = ImageUploadSerializer(image_upload, context={'request': request})
-        return Response({
-            'qr_image': totem.qr_image,
-            'image_upload': serializer.data
-        }, status=status.HTTP_201_CREATED)
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, QRImageRenderer])
+    def qr(self, request, pk=None):
+        return point_qr_image(request, 'totem', self.get_object())
 
 class ReceptionQRViewSet(viewsets.ModelViewSet):
     serializer_class = ReceptionQRSerializer
@@ -125,62 +390,89 @@ class ReceptionQRViewSet(viewsets.ModelViewSet):
         reception = self.get_object()
         if not request.user.is_authenticated or request.user.userprofile.role not in ['admin', 'superuser']:
             return Response({'detail': 'Solo administradores pueden generar QRs.'}, status=status.HTTP_403_FORBIDDEN)
+        return generate_point_qr(request, 'reception', reception)
 
-        # Generar URL para el QR
-        qr_url = f"${process.env.REACT_APP_API_BASE_URL}/mapa2/{totem.campus}?pointId={totem.id}&pointType=totem"
-        # Crear el QR
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_url)
-        qr.make(fit=True)
-        
-        # Convertir a imagen
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        file_name = f"qr_reception_{reception.id}_{reception.campus}.png"
-        file_content = ContentFile(buffer.getvalue(), name=file_name)
-
-        # Guardar en ImageUpload
-        image_upload = ImageUpload.objects.create(
-            point_id=reception.id,
-            point_type='reception',
-            campus=reception.campus,
-            image=file_content,
-            uploaded_by=request.user
-        )
-
-        # Actualizar el campo qr_image
-        reception.qr_image = request.build_absolute_uri(default_storage.url(image_upload.image.name))
-        reception.save()
-
-        serializer = ImageUploadSerializer(image_upload, context={'request': request})
-        return Response({
-            'qr_image': reception.qr_image,
-            'image_upload': serializer.data
-        }, status=status.HTTP_201_CREATED)
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, QRImageRenderer])
+    def qr(self, request, pk=None):
+        return point_qr_image(request, 'reception', self.get_object())
 
 class PathViewSet(viewsets.ModelViewSet):
     serializer_class = PathSerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        queryset = Path.objects.all()
+        queryset = Path.objects.prefetch_related('points')
         campus = self.request.query_params.get('campus', None)
         if campus is not None:
             queryset = queryset.filter(campus=campus)
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None and self.action in ['list', 'retrieve']:
+            context.update(geometry_options(self.request.query_params))
+        return context
+
     def get_permissions(self):
         # Restrict POST, PUT, DELETE to authenticated users with appropriate roles
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk_import']:
             return [RoleBasedPermission()]
         return [AllowAny()]  # Allow GET for all
 
+    @action(detail=False, methods=['post'])
+    def bulk_import(self, request):
+        # Acepta una lista de caminos con el formato de PathSerializer o un
+        # FeatureCollection GeoJSON de LineString ([lon, lat]) con name/campus en properties
+        data = request.data
+        if isinstance(data, dict) and data.get('type') == 'FeatureCollection':
+            try:
+                data = [self._feature_to_path(feature, i) for i, feature in enumerate(data.get('features', []))]
+            except (KeyError, TypeError, ValueError, IndexError):
+                return Response({'detail': 'GeoJSON inválido: se esperan Features de tipo LineString.'}, status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(data, dict) and 'paths' in data:
+            data = data['paths']
+        if not isinstance(data, list) or not data:
+            return Response({'detail': 'Se esperaba una lista de caminos o un FeatureCollection.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=data, many=True)
+        serializer.is_valid(raise_exception=True)
+        paths = PathSerializer.bulk_create(serializer.validated_data)
+        return Response({'created': len(paths), 'ids': [path.id for path in paths]}, status=status.HTTP_201_CREATED)
+
+    def _feature_to_path(self, feature, index):
+        geometry = feature['geometry']
+        if geometry['type'] != 'LineString':
+            raise ValueError(geometry['type'])
+        properties = feature.get('properties') or {}
+        return {
+            'name': properties.get('name') or f"Camino {index + 1}",
+            'campus': properties.get('campus', self.request.query_params.get('campus')),
+            'points': [
+                {'latitude': coordinates[1], 'longitude': coordinates[0], 'order': order}
+                for order, coordinates in enumerate(geometry['coordinates'], start=1)
+            ],
+        }
+
+class CampusViewSet(viewsets.ViewSet):
+    permission_classes = [AllowAny]
+    lookup_field = 'campus'
+    lookup_value_regex = '[^/]+'
+
+    @action(detail=True, methods=['get'])
+    def snapshot(self, request, campus=None):
+        # Totems, recepciones y caminos del campus en una sola respuesta cacheada
+        options = geometry_options(request.query_params)
+        version = DataVersion.get(DataVersion.campus_key(campus))
+        etag = snapshot_etag(campus, version, options)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            etag, content = get_snapshot(campus, version, options)
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
 class UserProfileViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserProfileSerializer
@@ -231,130 +523,105 @@ class PerfilUsuarioViewSet(viewsets.GenericViewSet):
         except UserProfile.DoesNotExist:
             return Response({'detail': 'Perfil de usuario no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
-class DenunciaViewSet(viewsets.ModelViewSet):
+class DenunciaViewSet(DeltaSyncMixin, BulkEstadoMixin, viewsets.ModelViewSet):
+    tombstone_model = 'denuncia'
+    bulk_estados = ('pendiente', 'tomada')
+    bulk_comment_field = 'comentarios'
+    rollup_kind = 'denuncia'
     queryset = Denuncia.objects.all()
     serializer_class = DenunciaSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['nombre', 'apellido', 'descripcion', 'lugar_incidente']
+    ordering_fields = ['created_at', 'updated_at', 'fecha_incidente']
+    ordering = ['-created_at', '-id']
+    pagination_class = DenunciaCursorPagination
+
+    filter_params = ('campus', 'estado', 'tipo_incidente', 'desde', 'hasta')
+
+    def get_queryset(self):
+        return self.apply_filters(super().get_queryset(), self.request.query_params)
+
+    def apply_filters(self, queryset, params):
+        for field in ('campus', 'estado', 'tipo_incidente'):
+            value = params.get(field)
+            if value:
+                queryset = queryset.filter(**{field: value})
+        # Rango de fechas de creación (YYYY-MM-DD, ambos extremos inclusive). Se
+        # compara contra límites de día completos para que use el índice de created_at
+        desde = self.date_param('desde', params)
+        if desde is not None:
+            queryset = queryset.filter(created_at__gte=start_of_day(desde))
+        hasta = self.date_param('hasta', params)
+        if hasta is not None:
+            queryset = queryset.filter(created_at__lt=start_of_day(hasta + timedelta(days=1)))
+        return queryset
+
+    def date_param(self, name, params=None):
+        value = (self.request.query_params if params is None else params).get(name)
+        if not value:
+            return None
+        if not isinstance(value, str):
+            raise ValidationError({name: 'Fecha inválida, se espera YYYY-MM-DD.'})
+        try:
+            date = parse_date(value)
+        except ValueError:
+            date = None
+        if date is None:
+            raise ValidationError({name: 'Fecha inválida, se espera YYYY-MM-DD.'})
+        return date
 
     def perform_create(self, serializer):
-        denuncia = serializer.save(usuario=self.request.user)
-        # Crear issue en Jira
+        # El issue de Jira se crea en segundo plano desde la cola (process_jira_outbox)
+        with transaction.atomic():
+            denuncia = serializer.save(usuario=self.request.user)
+            JiraOutbox.objects.create(denuncia=denuncia)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        # Conteos del dashboard desde la tabla de rollups, sin recorrer las denuncias
+        bucket = request.query_params.get('bucket', 'week')
+        if bucket not in BUCKETS:
+            raise ValidationError({'bucket': f"Debe ser uno de: {', '.join(BUCKETS)}."})
+        stats = dashboard_stats(
+            bucket=bucket,
+            campus=request.query_params.get('campus') or None,
+            desde=self.date_param('desde'),
+            hasta=self.date_param('hasta'),
+        )
+        return Response({'bucket': bucket, **stats})
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        # Búsqueda de texto completo ordenada por relevancia; admite los mismos filtros que el listado
+        q = request.query_params.get('q', '').strip()
+        if not q:
+            raise ValidationError({'q': 'Este parámetro es requerido.'})
         try:
-            jira_response = self.create_jira_issue(serializer.validated_data)
-            print(f"Issue de Jira creado: {jira_response}")
-        except Exception as e:
-            print(f"No se pudo crear el issue en Jira: {e}")
-            # Opcional: decidir si fallar la creación de la denuncia si Jira falla
-            # raise e
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            raise ValidationError({'limit': 'Debe ser un número entero.'})
+        results = []
+        for denuncia, rank, snippet in search_denuncias(self.get_queryset(), q, limit):
+            data = self.get_serializer(denuncia).data
+            data['rank'] = rank
+            data['snippet'] = snippet
+            results.append(data)
+        return Response(results)
 
     def partial_update(self, request, *args, **kwargs):
         return super().partial_update(request, *args, **kwargs)
-            
-    def create_jira_issue(self, denuncia_data):
-        url = f"{settings.JIRA_API_URL}/rest/api/3/issue"
-        auth = (settings.JIRA_EMAIL, settings.JIRA_API_TOKEN)
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-        }
-        # Formatear todos los campos en la descripción
-        description_content = [
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Nombre: {denuncia_data.get('nombre', 'No especificado')}"}
-                ]
-            },
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Apellido: {denuncia_data.get('apellido', 'No especificado')}"}
-                ]
-            },
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Correo Electrónico: {denuncia_data.get('email', 'No especificado')}"}
-                ]
-            },
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Teléfono: {denuncia_data.get('telefono', 'No especificado')}"}
-                ]
-            },
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Tipo de Incidente: {denuncia_data.get('tipo_incidente', 'No especificado')}"}
-                ]
-            },
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Fecha del Incidente: {denuncia_data.get('fecha_incidente', 'No especificado')}"}
-                ]
-            },
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Lugar del Incidente: {denuncia_data.get('lugar_incidente', 'No especificado')}"}
-                ]
-            },
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Descripción: {denuncia_data.get('descripcion', 'No especificado')}"}
-                ]
-            },
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Campus: {denuncia_data.get('campus', 'No especificado')}"}
-                ]
-            },
-            {
-                "type": "paragraph",
-                "content": [
-                    {"type": "text", "text": f"Encargado de Acogida: {denuncia_data.get('encargado_acogida', 'No especificado')}"}
-                ]
-            },
-        ]
-        issue_data = {
-            "fields": {
-                "project": {"key": settings.JIRA_PROJECT_KEY},
-                "summary": f"Caso de acogida: {denuncia_data.get('nombre', '')} {denuncia_data.get('apellido', '')}",
-                "description": {
-                    "type": "doc",
-                    "version": 1,
-                    "content": description_content
-                },
-                "issuetype": {"name": "Task"},
-            }
-        }
-        print("Payload enviado a Jira:", issue_data)
-        try:
-            response = requests.post(url, json=issue_data, auth=auth, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            print(f"Error al crear issue en Jira: {e}")
-            print(f"Detalles del error: {response.text}")
-            error_details = response.text
-            raise Exception(f"Error de Jira: {error_details}")
 
 class ImageUploadView(viewsets.ViewSet):
     permission_classes = [RoleBasedPermission]
     parser_classes = (MultiPartParser, FormParser)
 
-    def create(self, request, *args, **kwargs):
+    def _admin_error(self, request):
         if not request.user.is_authenticated or request.user.userprofile.role != 'admin':
             return Response({'detail': 'Solo administradores pueden subir imágenes.'}, status=status.HTTP_403_FORBIDDEN)
+        return None
 
-        point_id = request.data.get('point_id')
-        point_type = request.data.get('point_type')
-        campus = request.data.get('campus')
-
+    def _point_error(self, point_id, point_type, campus):
         if not all([point_id, point_type, campus]):
             return Response({'detail': 'Faltan parámetros requeridos (point_id, point_type, campus).'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -365,31 +632,207 @@ class ImageUploadView(viewsets.ViewSet):
             return Response({'detail': 'TotemQR no encontrado o no pertenece a este campus.'}, status=status.HTTP_404_NOT_FOUND)
         if point_type == 'reception' and not ReceptionQR.objects.filter(id=point_id, campus=campus).exists():
             return Response({'detail': 'ReceptionQR no encontrado o no pertenece a este campus.'}, status=status.HTTP_404_NOT_FOUND)
+        return None
+
+    def _limit_upload_size(self, request):
+        # Debe instalarse antes de leer request.data/FILES
+        limiter = SizeLimitUploadHandler(request._request)
+        request.upload_handlers.insert(0, limiter)
+        return limiter
+
+    def create(self, request, *args, **kwargs):
+        error = self._admin_error(request)
+        if error:
+            return error
+        limiter = self._limit_upload_size(request)
+
+        point_id = request.data.get('point_id')
+        point_type = request.data.get('point_type')
+        campus = request.data.get('campus')
+        error = self._point_error(point_id, point_type, campus)
+        if error:
+            return error
 
         file_obj = request.FILES.get('file')
+        if limiter.rejected:
+            raise ValidationError({'file': f"El archivo supera el máximo de {settings.IMAGE_UPLOAD_MAX_BYTES // (1024 * 1024)} MB."})
         if not file_obj:
             return Response({'detail': 'No se proporcionó un archivo.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        file_path = default_storage.save(f'images/points/{campus}/{point_id}_{file_obj.name}', file_obj)
-        full_url = request.build_absolute_uri(default_storage.url(file_path))
+        try:
+            format, width, height = validate_image(file_obj)
+        except ValidationError as e:
+            raise ValidationError({'file': e.detail})
+        image_upload = save_point_image(file_obj, format, width, height, point_id, point_type, campus, request.user)
+
+        serializer = ImageUploadSerializer(image_upload, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Varias imágenes de un punto en una petición (campo `files` repetido).
+
+        Cada archivo se valida por separado: los válidos se guardan y los demás
+        vuelven en `rejected` con el motivo.
+        """
+        error = self._admin_error(request)
+        if error:
+            return error
+        limiter = self._limit_upload_size(request)
 
-        image_upload = ImageUpload.objects.create(
-            point_id=point_id,
-            point_type=point_type,
-            campus=campus,
-            image=file_path
+        point_id = request.data.get('point_id')
+        point_type = request.data.get('point_type')
+        campus = request.data.get('campus')
+        error = self._point_error(point_id, point_type, campus)
+        if error:
+            return error
+
+        files = request.FILES.getlist('files')
+        max_bytes = settings.IMAGE_UPLOAD_MAX_BYTES // (1024 * 1024)
+        rejected = [{'file': name, 'detail': f"El archivo supera el máximo de {max_bytes} MB."} for name in limiter.rejected]
+        if not files and not rejected:
+            return Response({'detail': 'No se proporcionaron archivos.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(files) + len(rejected) > settings.IMAGE_UPLOAD_MAX_FILES:
+            return Response({'detail': f'Se aceptan hasta {settings.IMAGE_UPLOAD_MAX_FILES} archivos por petición.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        uploaded = []
+        for file_obj in files:
+            try:
+                format, width, height = validate_image(file_obj)
+            except ValidationError as e:
+                rejected.append({'file': file_obj.name, 'detail': e.detail[0]})
+                continue
+            uploaded.append(save_point_image(file_obj, format, width, height, point_id, point_type, campus, request.user))
+
+        serializer = ImageUploadSerializer(uploaded, many=True, context={'request': request})
+        return Response(
+            {'uploaded': serializer.data, 'rejected': rejected},
+            status=status.HTTP_201_CREATED if uploaded else status.HTTP_400_BAD_REQUEST,
         )
 
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser])
+    def sessions(self, request):
+        """Inicia una subida reanudable: el archivo llega después por partes con PUT."""
+        error = self._admin_error(request)
+        if error:
+            return error
+        point_id = request.data.get('point_id')
+        point_type = request.data.get('point_type')
+        campus = request.data.get('campus')
+        error = self._point_error(point_id, point_type, campus)
+        if error:
+            return error
+
+        filename = os.path.basename(str(request.data.get('filename') or ''))
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            raise ValidationError({'size': 'Debe ser un entero.'})
+        if not filename:
+            raise ValidationError({'filename': 'Este campo es requerido.'})
+        if not 0 < size <= settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise ValidationError({'size': f"Debe estar entre 1 byte y {settings.IMAGE_UPLOAD_MAX_BYTES // (1024 * 1024)} MB."})
+
+        session = ImageUploadSession.objects.create(
+            point_id=point_id, point_type=point_type, campus=campus,
+            filename=filename[:255], size=size, created_by=request.user,
+        )
+        return Response(self._session_data(session), status=status.HTTP_201_CREATED)
+
+    def _session_data(self, session):
+        return {
+            'id': session.pk, 'offset': session.offset, 'size': session.size,
+            'chunk_size': settings.IMAGE_UPLOAD_CHUNK_SIZE, 'image_upload': session.image_upload_id,
+        }
+
+    def _completed_session(self, request, session):
+        # Repetición del último PUT (p. ej. se perdió la respuesta): misma imagen, sin volver a procesarla
+        if session.image_upload is None:
+            return Response({'detail': 'La imagen de esta subida ya fue eliminada.'}, status=status.HTTP_410_GONE)
+        serializer = ImageUploadSerializer(session.image_upload, context={'request': request})
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get', 'put', 'delete'], url_path=r'sessions/(?P<session_id>[0-9a-f-]{36})')
+    def session(self, request, session_id=None):
+        """Estado (GET), siguiente parte (PUT) o cancelación (DELETE) de una subida.
+
+        El PUT lleva los bytes crudos en el cuerpo y el header Upload-Offset con la
+        posición en que empiezan; debe coincidir con `offset`, si no se responde 409
+        con el offset actual para que el cliente retome desde ahí. Con el último
+        byte la imagen se valida y se guarda, y se devuelve como en create; si ese
+        PUT se repite se devuelve la misma imagen con 200.
+        """
+        error = self._admin_error(request)
+        if error:
+            return error
+        session = ImageUploadSession.objects.filter(pk=session_id).first()
+        if session is None:
+            return Response({'detail': 'Sesión de subida no encontrada.'}, status=status.HTTP_404_NOT_FOUND)
+        if request.method == 'GET':
+            return Response(self._session_data(session))
+        if request.method == 'DELETE':
+            discard_session_file(session)
+            session.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if session.completed_at is not None:
+            return self._completed_session(request, session)
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length', ''))
+        except ValueError:
+            raise ValidationError({'detail': 'Se requieren los headers Upload-Offset y Content-Length.'})
+        if length > settings.IMAGE_UPLOAD_CHUNK_SIZE:
+            return Response({'detail': f'Cada parte puede tener hasta {settings.IMAGE_UPLOAD_CHUNK_SIZE} bytes.'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        if offset != session.offset:
+            return Response({'detail': 'Offset incorrecto.', **self._session_data(session)}, status=status.HTTP_409_CONFLICT)
+        if offset + length > session.size:
+            raise ValidationError({'detail': 'La parte excede el tamaño declarado del archivo.'})
+
+        # La parte se recibe sin bloquear la sesión: un cliente lento no detiene
+        # a las demás peticiones sobre ella. El bloqueo solo cubre verificar y
+        # avanzar el offset, y completar la subida
+        chunk_path, _ = receive_chunk(session, request._request, length)
+        try:
+            with transaction.atomic():
+                session = ImageUploadSession.objects.select_for_update().filter(pk=session.pk).first()
+                if session is None:
+                    return Response({'detail': 'Sesión de subida no encontrada.'}, status=status.HTTP_404_NOT_FOUND)
+                if session.completed_at is not None:
+                    return self._completed_session(request, session)
+                if offset != session.offset:
+                    return Response({'detail': 'Offset incorrecto.', **self._session_data(session)}, status=status.HTTP_409_CONFLICT)
+                session.offset += append_chunk(session, chunk_path)
+                if session.offset < session.size:
+                    session.save(update_fields=['offset', 'updated_at'])
+                    return Response(self._session_data(session))
+
+                try:
+                    image_upload = complete_session(session, request.user)
+                except ValidationError as e:
+                    session.delete()
+                    return Response({'file': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+                session.image_upload = image_upload
+                session.completed_at = timezone.now()
+                session.save(update_fields=['offset', 'image_upload', 'completed_at', 'updated_at'])
+        finally:
+            discard_file(chunk_path)
         serializer = ImageUploadSerializer(image_upload, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class ImageListView(viewsets.ViewSet):
     permission_classes = [AllowAny]  # Allow unauthenticated access for GET
+    # Listado agrupado: cuántos ids acepta ?point_ids= y por cuánto tiempo se cachea
+    MAX_POINT_IDS = 500
+    CACHE_SECONDS = 60
 
     def list(self, request, *args, **kwargs):
         point_id = request.query_params.get('point_id')
         point_type = request.query_params.get('point_type')
         campus = request.query_params.get('campus')
+        if not point_id and campus:
+            return self.grouped(request, campus, point_type)
 
         if not all([point_id, point_type, campus]):
             return Response({'detail': 'Faltan parámetros requeridos (point_id, point_type, campus).'}, status=status.HTTP_400_BAD_REQUEST)
@@ -406,13 +849,136 @@ class ImageListView(viewsets.ViewSet):
         serializer = ImageUploadSerializer(images, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def grouped(self, request, campus, point_type):
+        """Imágenes de muchos puntos en una sola consulta, agrupadas por tipo e id.
+
+        ?campus=<c> devuelve todo el campus; ?point_type=<t> y ?point_ids=1,2,3
+        lo acotan. No se verifica que los puntos existan: el cliente busca en el
+        resultado solo los puntos que ya tiene cargados.
+        """
+        if point_type is not None and point_type not in ['totem', 'reception']:
+            return Response({'detail': 'Tipo de punto inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        point_ids = request.query_params.get('point_ids')
+        if point_ids is not None:
+            if point_type is None:
+                return Response({'detail': 'point_ids requiere point_type.'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                point_ids = sorted({int(value) for value in point_ids.split(',') if value.strip()})
+            except ValueError:
+                return Response({'detail': 'point_ids debe ser una lista de enteros separada por comas.'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(point_ids) > self.MAX_POINT_IDS:
+                return Response({'detail': f'Se aceptan hasta {self.MAX_POINT_IDS} puntos por consulta.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Las imágenes de un campus cambian solo al subir o eliminar; el ETag es su versión
+        etag = f'"images-{DataVersion.get(DataVersion.images_key(campus))}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            images = ImageUpload.objects.filter(campus=campus)
+            if point_type is not None:
+                images = images.filter(point_type=point_type)
+            if point_ids is not None:
+                images = images.filter(point_id__in=point_ids)
+            images = images.order_by('point_type', 'point_id', 'uploaded_at', 'id')
+            serializer = ImageUploadSerializer(images, many=True, context={'request': request})
+            points = {'totem': {}, 'reception': {}}
+            for image in serializer.data:
+                points[image['point_type']].setdefault(str(image['point_id']), []).append(image)
+            response = Response({'campus': campus, 'points': points})
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=self.CACHE_SECONDS)
+        return response
+
     def get_permissions(self):
         # Restrict any future non-GET actions (e.g., POST, DELETE) to authenticated users
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAuthenticated()]
         return [AllowAny()]  # Allow GET for all
 
-class ReporteAtencionViewSet(viewsets.ModelViewSet):
+class ReporteAtencionViewSet(DeltaSyncMixin, BulkEstadoMixin, viewsets.ModelViewSet):
+    tombstone_model = 'reporte'
+    bulk_estados = ('nuevo', 'revisado', 'resuelto')
+    rollup_kind = 'reporte'
     queryset = ReporteAtencion.objects.all()
     serializer_class = ReporteAtencionSerializer
     permission_classes = [AllowAny]
+
+    filter_params = ('campus', 'estado')
+
+    def get_queryset(self):
+        return self.apply_filters(super().get_queryset(), self.request.query_params)
+
+    def apply_filters(self, queryset, params):
+        for field in self.filter_params:
+            value = params.get(field)
+            if value:
+                queryset = queryset.filter(**{field: value})
+        return queryset
+
+    def after_bulk_estado(self, pks, campuses, estado):
+        # update() no dispara señales: se invalidan las versiones y se avisa al stream a mano
+        if not pks:
+            return
+        DataVersion.bump(REPORTES_KEY)
+        for campus in campuses:
+            DataVersion.bump(reportes_campus_key(campus))
+        transaction.on_commit(lambda: publish_reportes_estado(pks, estado))
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        # Reportes en estado 'nuevo', total y por campus. El ETag es la versión de
+        # los reportes, así un sondeo sin cambios responde 304 sin contar nada
+        campus = request.query_params.get('campus') or None
+        version = DataVersion.get(reportes_campus_key(campus) if campus else REPORTES_KEY)
+        etag = f'"unread-{version}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            unread = ReporteAtencion.objects.filter(estado='nuevo')
+            if campus:
+                unread = unread.filter(campus=campus)
+            por_campus = dict(unread.values('campus').annotate(total=Count('id')).order_by().values_list('campus', 'total'))
+            response = Response({'total': sum(por_campus.values()), 'por_campus': por_campus})
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    @action(detail=False, methods=['get'], renderer_classes=[EventStreamRenderer])
+    def stream(self, request):
+        # Server-Sent Events con los reportes nuevos y cambios de estado; requiere
+        # servir la app por ASGI (ver Procfile) para no ocupar un worker por cliente
+        version = DataVersion.get(REPORTES_KEY)
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        resync = last_event_id.isdigit() and int(last_event_id) < version
+        response = StreamingHttpResponse(
+            reporte_stream(campus=request.query_params.get('campus') or None, version=version, resync=resync),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Evita que nginx acumule el stream en su buffer
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class QRBatchJobViewSet(viewsets.ReadOnlyModelViewSet):
+    # Lotes de QRs por campus: POST encola el job y responde 202; GET muestra el progreso
+    queryset = QRBatchJob.objects.order_by('-created_at')
+    serializer_class = QRBatchJobSerializer
+    permission_classes = [RoleBasedPermission]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Queda 'pending' hasta que lo tome `manage.py process_qr_batches`
+        serializer.save(created_by=request.user, base_url=request.build_absolute_uri('/'))
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        # ?file=zip (por defecto) o ?file=pdf
+        job = self.get_object()
+        if job.status != 'done':
+            return Response({'detail': 'El lote aún no termina.'}, status=status.HTTP_409_CONFLICT)
+        file_field = job.pdf if request.query_params.get('file') == 'pdf' else job.archive
+        if not file_field:
+            return Response({'detail': 'El lote no incluye ese archivo.'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(file_field.open('rb'), as_attachment=True, filename=os.path.basename(file_field.name))